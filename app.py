@@ -5,8 +5,9 @@
 # - Ship status lights
 # - True Command Palette dropdown (one-tap commands)
 # - Random ship events (solar flare / debris field / comms drop / micro-meteoroids)
+#   per message and on a clock; fuel burns and comms/alerts recover over time
 # - Crew Log (short-term memory) toggle
-# - Export “Captain’s Log” (chat + events) as .txt
+# - Export “Captain’s Log” (chat + events) as .txt / .jsonl, optionally gzipped
 # - Optional OpenAI LLM (OPENAI_API_KEY); otherwise offline toy brain fallback
 #
 # Run:
@@ -16,15 +17,41 @@
 # Optional (LLM):
 #   export OPENAI_API_KEY="..."
 #   export OPENAI_MODEL="gpt-4o-mini"
+#   export OPENAI_BASE_URL="http://127.0.0.1:8009/v1"   # any OpenAI-compatible server, e.g.
+#       python benchmarks/stub_server.py --profile flaky   # local stub with latency/fault profiles
+#   export COSMOBOT_STREAM=0   # disable token streaming (default: on)
+#   export COSMOBOT_ASYNC_LLM=0   # blocking LLM calls instead of the async dispatcher (default: on)
+#   export COSMOBOT_HISTORY_LIVE=20   # newest messages rendered as chat bubbles; older ones are paged
+#   export COSMOBOT_SIM_EVENTS_PER_H=2   # ambient ship events per hour between messages (0: off;
+#                                        # the sidebar event rate at 0 also stops them)
+#       python voyage.py --rate 0.1 --rate 0.3   # Monte Carlo forecast of a rate over 1M voyages
+#   export COSMOBOT_RECALL_MAX=1000   # exchanges kept in a session's long-term recall index
+#   export COSMOBOT_INTENTS=intents.json   # extra offline-brain intents/pools (see intents.py)
+#   export COSMOBOT_PERF=0   # turn timing spans off (default: on; see /perf)
+#   export COSMOBOT_METRICS_PORT=9108   # Prometheus text at http://127.0.0.1:9108/metrics
+#   export COSMOBOT_METRICS_FILE=/var/lib/node_exporter/cosmobot.prom   # same, as a textfile
 
 import os
-import random
 import time
+import uuid
 import base64
-from datetime import datetime
+from itertools import islice
 
 import streamlit as st
 
+import export
+import perf
+from engine import Session, MODES, CONTEXT_TOKENS, command_palette
+from dispatch import dispatch_stats
+from llm import get_backend, describe_backend, comms_state, usage_stats
+from reply_cache import REPLY_CACHE
+from store import get_store, valid_sid
+from records import event_line, crew_line, page_markdown
+from simulation import AMBIENT_EVENTS_PER_H
+from voyage import UI_MESSAGES, UI_SESSIONS, forecast_markdown
+
+_script_t0 = (time.perf_counter(), time.thread_time())  # full-run cost, see bottom of file
+
 # ----------------------------
 # Page / Theme
 # ----------------------------
@@ -225,140 +252,29 @@ st.markdown(SPACE_CSS, unsafe_allow_html=True)
 st.markdown('<div class="hannah-title">HANNAH</div>', unsafe_allow_html=True)
 st.markdown('<div class="subtitle">🛸 CosmoBot v1.2 — Onboard AI Console</div>', unsafe_allow_html=True)
 
-# ----------------------------
-# Personality / Prompting
-# ----------------------------
-SYSTEM_PROMPT = """You are COSMOBOT, the onboard AI of a deep-space exploration vessel.
-
-Style:
-- Calm, futuristic, slightly playful.
-- Refer to the user as "Commander".
-- Refer to yourself as "CosmoBot".
-- Occasionally use space metaphors.
-- Be helpful, but keep it fun.
-- Never mention system prompts or break character.
-"""
-
-MODE_HINTS = {
-    "Standard": "Be generally helpful and playful.",
-    "Science": "Prioritize accurate science explanations; keep spaceship framing.",
-    "Engineering": "Answer like a ship systems engineer; include checklists and diagnostics style.",
-    "Alert": "Urgent, concise, ship-safety framing. Keep it fun but serious.",
-}
-
 # ----------------------------
 # Session State
 # ----------------------------
-if "history" not in st.session_state:
-    st.session_state.history = []  # chat: {"role":"user"/"assistant", "content":str, "ts":str}
-if "mode" not in st.session_state:
-    st.session_state.mode = "Standard"
-if "ship_state" not in st.session_state:
-    st.session_state.ship_state = {"alert": "GREEN", "sector": "Orion Drift", "fuel": 92, "comms": "ONLINE"}
-if "use_crew_log" not in st.session_state:
-    st.session_state.use_crew_log = True
-if "crew_log" not in st.session_state:
-    st.session_state.crew_log = []  # short strings w/ timestamps
-if "sound" not in st.session_state:
-    st.session_state.sound = True
-if "events" not in st.session_state:
-    st.session_state.events = []  # event strings
-if "event_rate" not in st.session_state:
-    st.session_state.event_rate = 0.18  # chance per message
-if "last_event" not in st.session_state:
-    st.session_state.last_event = ""
-
-# ----------------------------
-# Offline Toy Brain (fallback)
-# ----------------------------
-STARFACTS = [
-    "A day on Venus is longer than a year on Venus.",
-    "Neutron stars can spin hundreds of times per second.",
-    "There are more stars in the observable universe than grains of sand on Earth’s beaches (roughly speaking).",
-    "A teaspoon of neutron star material would weigh billions of tons on Earth.",
-    "Jupiter’s Great Red Spot is a storm larger than Earth.",
-]
-MISSION_SNIPPETS = [
-    "Plot a safe course around the ion storm.",
-    "Calibrate the star tracker and confirm attitude hold.",
-    "Run diagnostics on the thermal shielding.",
-    "Scan for biosignatures in the target sector.",
-    "Map asteroid fragments for resource harvesting.",
-]
-SCAN_RESULTS = [
-    "No anomalies detected. Cosmic background radiation within expected parameters.",
-    "Minor electromagnetic interference. Suggest shielding check on bay 2.",
-    "Spectral spike observed. Possible ion pocket ahead — recommend course adjustment.",
-    "Debris field detected at medium range. Activating avoidance guidance.",
-]
-ENGINEERING_CHECKS = [
-    "Run propulsion coil impedance check.",
-    "Verify thermal loop pressure and radiator duty cycle.",
-    "Confirm inertial nav bias estimates are within tolerance.",
-    "Inspect comms antenna gimbal limits and cable strain relief.",
-]
-
-def offline_response(user_text: str) -> str:
-    u = user_text.strip().lower()
-    if any(k in u for k in ["hello", "hi", "hey", "yo"]):
-        return "Greetings, Commander. CosmoBot online. Instruments are nominal. What’s our mission?"
-    if "mission" in u or "quest" in u:
-        return f"Commander, mission packet generated: **{random.choice(MISSION_SNIPPETS)}**. Awaiting confirmation."
-    if "scan" in u or "sweep" in u:
-        return f"Initiating sensor sweep… ✅  \n**Scan:** {random.choice(SCAN_RESULTS)}"
-    if "joke" in u:
-        return "Commander, a joke from the cosmic archives: Why don’t stars ever get lost? Because they always *follow their constellation.*"
-    if "fact" in u or "space" in u:
-        return f"Scanning cosmic archives… ✅  \n**Space Fact:** {random.choice(STARFACTS)}"
-    if "status" in u or "diagnostic" in u:
-        return "Ship status: **Green across all systems**. Propulsion stable. Comms clear. Coffee… unfortunately not installed."
-    if "checklist" in u or "engineering" in u:
-        items = "\n".join([f"- {random.choice(ENGINEERING_CHECKS)}" for _ in range(3)])
-        return f"🛠️ Commander, engineering checklist queued:\n{items}"
-    if "who are you" in u or "your name" in u:
-        return "I am **CosmoBot**, the ship’s onboard intelligence. You are the Commander. Together, we keep the void politely organized."
-    return ("Understood, Commander. I’m running a quick simulation… "
-            "If you want richer responses, add an API key in settings. Otherwise, try /mission, /scan, /status, or /joke.")
-
-# ----------------------------
-# Optional OpenAI Chat Completions
-# ----------------------------
-def try_openai_chat(messages):
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    if not api_key:
-        return None
-
-    # New SDK
-    try:
-        from openai import OpenAI  # type: ignore
-        client = OpenAI(api_key=api_key)
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=messages,
-            temperature=0.8,
-        )
-        return resp.choices[0].message.content
-    except Exception:
-        pass
-
-    # Legacy SDK
-    try:
-        import openai  # type: ignore
-        openai.api_key = api_key
-        resp = openai.ChatCompletion.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=messages,
-            temperature=0.8,
-        )
-        return resp["choices"][0]["message"]["content"]
-    except Exception:
-        return None
+# All chat state lives in one engine.Session (see engine.py); the UI below
+# only reads it and calls into it. Optional persistence (COSMOBOT_STORE_PATH):
+# the session id rides in the URL, so a refresh or a pod restart reloads the
+# same console from the store. The id is the console's only key (a random
+# uuid); anything else in ?sid= gets a fresh console.
+STORE = get_store()
+perf.start_exporter()  # once per process; no-op unless metrics env vars are set
+if "session" not in st.session_state:
+    sid = st.query_params.get("sid", "")
+    if not valid_sid(sid):
+        sid = uuid.uuid4().hex
+    st.query_params["sid"] = sid
+    st.session_state.session = Session.attach(sid, STORE)
+S = st.session_state.session
 
 # ----------------------------
 # Tiny Sound Beep (optional)
 # ----------------------------
 def beep():
-    if not st.session_state.sound:
+    if not S.sound:
         return
     # super tiny placeholder wav (may not play everywhere; harmless if blocked)
     wav_b64 = "UklGRiQAAABXQVZFZm10IBAAAAABAAEAIlYAAESsAAACABAAZGF0YQAAAAA="
@@ -370,52 +286,7 @@ def beep():
 # ----------------------------
 # Helpers
 # ----------------------------
-def ts():
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-def short_ts():
-    return datetime.now().strftime("%H:%M:%S")
-
-def add_event(text: str):
-    st.session_state.events.append(f"[{ts()}] {text}")
-    st.session_state.events = st.session_state.events[-40:]
-    st.session_state.last_event = text
-
-def push_history(role: str, content: str):
-    st.session_state.history.append({"role": role, "content": content, "ts": ts()})
-    st.session_state.history = st.session_state.history[-120:]
-
-def push_crew_log(user_text: str, bot_text: str):
-    if not st.session_state.use_crew_log:
-        return
-    def clip(s: str, n: int = 90):
-        s = s.strip().replace("\n", " ")
-        return s if len(s) <= n else (s[:n] + "…")
-    st.session_state.crew_log.append(f"[{short_ts()}] Commander: {clip(user_text)}")
-    st.session_state.crew_log.append(f"[{short_ts()}] CosmoBot: {clip(bot_text)}")
-    st.session_state.crew_log = st.session_state.crew_log[-30:]
-
-def build_system_prompt():
-    ship = st.session_state.ship_state
-    crew = ""
-    if st.session_state.use_crew_log and st.session_state.crew_log:
-        crew = "\n\nCrew Log (short-term memory):\n- " + "\n- ".join(st.session_state.crew_log[-10:])
-    ev = ""
-    if st.session_state.last_event:
-        ev = f"\n\nRecent ship event:\n- {st.session_state.last_event}\n"
-    return (
-        SYSTEM_PROMPT
-        + "\n\nCurrent ship context:\n"
-          f"- Alert level: {ship['alert']}\n"
-          f"- Sector: {ship['sector']}\n"
-          f"- Fuel: {ship['fuel']}%\n"
-          f"- Comms: {ship['comms']}\n"
-        + f"\nMode directive: {st.session_state.mode} — {MODE_HINTS[st.session_state.mode]}\n"
-        + ev
-        + crew
-    )
-
-def ship_lights_html(alert: str, fuel: int, comms: str):
+def ship_lights_html(alert: str, fuel: int, comms: str, llm_comms: str = "OFFLINE"):
     if alert == "GREEN":
         a_color, a_pulse = "var(--good)", "pulse"
     elif alert == "AMBER":
@@ -437,6 +308,16 @@ def ship_lights_html(alert: str, fuel: int, comms: str):
     else:
         c_color, c_pulse = "var(--bad)", "pulse"
 
+    # LLM uplink, from the circuit breaker (llm.comms_state)
+    if llm_comms == "CLOSED":
+        l_color, l_pulse = "var(--cyan)", "pulse"
+    elif llm_comms == "HALF_OPEN":
+        l_color, l_pulse = "var(--warn)", "pulse"
+    elif llm_comms == "OPEN":
+        l_color, l_pulse = "var(--bad)", "pulse"
+    else:
+        l_color, l_pulse = "var(--muted)", ""
+
     return f"""
     <div class="lights">
       <div class="light-dot {a_pulse}" style="background:{a_color};"></div><span class="small">ALERT</span>
@@ -444,418 +325,387 @@ def ship_lights_html(alert: str, fuel: int, comms: str):
       <div class="light-dot {f_pulse}" style="background:{f_color};"></div><span class="small">FUEL</span>
       <div style="width:10px;"></div>
       <div class="light-dot {c_pulse}" style="background:{c_color};"></div><span class="small">COMMS</span>
+      <div style="width:10px;"></div>
+      <div class="light-dot {l_pulse}" style="background:{l_color};" title="LLM link: {llm_comms}"></div><span class="small">LLM COMMS</span>
     </div>
     """
 
-def format_status():
-    s = st.session_state.ship_state
-    return (
-        f"**Ship Status**  \n"
-        f"- Alert: **{s['alert']}**  \n"
-        f"- Sector: **{s['sector']}**  \n"
-        f"- Fuel: **{s['fuel']}%**  \n"
-        f"- Comms: **{s['comms']}**  \n"
-        f"- Mode: **{st.session_state.mode}**  \n"
-        f"- Crew Log: **{'ON' if st.session_state.use_crew_log else 'OFF'}**  \n"
-        f"- Event Rate: **{int(st.session_state.event_rate * 100)}% / message**"
-    )
-
-def command_help():
-    return (
-        "**Command Palette**  \n"
-        "- <kbd>/status</kbd> — show ship readout  \n"
-        "- <kbd>/mission</kbd> — generate a mission packet  \n"
-        "- <kbd>/scan</kbd> — run a sensor sweep  \n"
-        "- <kbd>/mode science</kbd> | <kbd>/mode engineering</kbd> | <kbd>/mode alert</kbd> | <kbd>/mode standard</kbd>  \n"
-        "- <kbd>/event</kbd> — force a ship event (demo)  \n"
-        "- <kbd>/clear</kbd> — clear chat  \n"
-        "- <kbd>/help</kbd> — show this list  \n"
-        "\nTip: Ask normal questions too — CosmoBot stays in character."
-    )
-
-# ----------------------------
-# Random Ship Events
-# ----------------------------
-def maybe_trigger_event(force: bool = False) -> str | None:
-    if not force and random.random() > st.session_state.event_rate:
-        return None
-
-    ship = st.session_state.ship_state
-    # Keep events fun, not annoying: small state changes
-    event = random.choice([
-        "SOLAR_FLARE",
-        "DEBRIS_FIELD",
-        "COMMS_DROP",
-        "MICROMETEOROIDS",
-        "ION_DISTURBANCE",
-    ])
-
-    if event == "SOLAR_FLARE":
-        ship["alert"] = "AMBER" if ship["alert"] == "GREEN" else ship["alert"]
-        ship["comms"] = "DEGRADED" if ship["comms"] == "ONLINE" else ship["comms"]
-        ship["fuel"] = max(0, ship["fuel"] - random.randint(0, 2))
-        msg = "🌞 **Solar flare** detected. Radiation levels elevated. Switching sensors to hardened mode; comms may degrade."
-        add_event("Solar flare detected; comms degraded; alert AMBER.")
-        return msg
-
-    if event == "DEBRIS_FIELD":
-        ship["alert"] = "AMBER" if ship["alert"] == "GREEN" else ship["alert"]
-        ship["fuel"] = max(0, ship["fuel"] - random.randint(1, 4))
-        msg = "🛰️ **Debris field** ahead. Running evasive nav burn and tightening collision envelope."
-        add_event("Debris field encountered; evasive burn executed.")
-        return msg
-
-    if event == "COMMS_DROP":
-        ship["comms"] = "OFFLINE" if ship["comms"] != "OFFLINE" else "DEGRADED"
-        ship["alert"] = "AMBER" if ship["alert"] == "GREEN" else ship["alert"]
-        msg = "📡 **Comms anomaly.** Signal lock lost. Attempting reacquisition via backup antenna array."
-        add_event(f"Comms anomaly: {ship['comms']}.")
-        return msg
-
-    if event == "MICROMETEOROIDS":
-        ship["alert"] = "RED" if random.random() < 0.25 else ("AMBER" if ship["alert"] == "GREEN" else ship["alert"])
-        ship["fuel"] = max(0, ship["fuel"] - random.randint(0, 3))
-        msg = "☄️ **Micro-meteoroid ping** on outer hull. Sealing microfractures; running structural integrity scan."
-        add_event(f"Micro-meteoroid impact; alert now {ship['alert']}.")
-        return msg
-
-    if event == "ION_DISTURBANCE":
-        ship["comms"] = "DEGRADED" if ship["comms"] == "ONLINE" else ship["comms"]
-        msg = "🧲 **Ion disturbance** in local space-time. Navigation filters retuned; expect minor sensor jitter."
-        add_event("Ion disturbance; nav filters retuned.")
-        return msg
-
-    return None
-
-# ----------------------------
-# Command Runner
-# ----------------------------
-def run_command(text: str) -> str:
-    parts = text.strip().split()
-    cmd = parts[0].lower()
-
-    if cmd == "/help":
-        return command_help()
-
-    if cmd == "/clear":
-        st.session_state.history = []
-        st.session_state.last_event = ""
-        return "Crew channel wiped clean, Commander. Fresh console ready."
-
-    if cmd == "/status":
-        return f"Commander, reporting in.  \n{format_status()}"
-
-    if cmd == "/mission":
-        return f"Commander, mission packet generated: **{random.choice(MISSION_SNIPPETS)}**. Awaiting confirmation."
-
-    if cmd == "/scan":
-        return f"Initiating sensor sweep… ✅  \n**Scan:** {random.choice(SCAN_RESULTS)}"
-
-    if cmd == "/event":
-        ev = maybe_trigger_event(force=True)
-        return ev if ev else "Event generator idle, Commander."
-
-    if cmd == "/mode":
-        if len(parts) < 2:
-            return f"Commander, current mode is **{st.session_state.mode}**. Try: `/mode science`."
-        target = parts[1].strip().lower()
-        mapping = {"standard": "Standard", "science": "Science", "engineering": "Engineering", "alert": "Alert"}
-        if target not in mapping:
-            return "Mode not recognized, Commander. Valid: standard | science | engineering | alert."
-        st.session_state.mode = mapping[target]
-        return f"Mode shift complete, Commander. **{st.session_state.mode}** engaged."
-
-    return "Command not recognized, Commander. Try `/help`."
-
 # ----------------------------
 # Core Reply
 # ----------------------------
-def cosmobot_reply(user_text: str) -> str:
-    # Commands
-    if user_text.strip().startswith("/"):
-        return run_command(user_text)
-
-    sys = build_system_prompt()
-    messages = [{"role": "system", "content": sys}]
-
-    # Include recent chat
-    for m in st.session_state.history[-18:]:
-        messages.append({"role": m["role"], "content": m["content"]})
+STREAM_REFRESH_S = 0.05  # min seconds between placeholder repaints while streaming
 
-    messages.append({"role": "user", "content": user_text})
-
-    llm = try_openai_chat(messages)
-    if llm:
-        return llm
-
-    base = offline_response(user_text)
-    if st.session_state.mode == "Alert":
-        return "🚨 **ALERT MODE ACTIVE**  \n" + base
-    if st.session_state.mode == "Engineering":
-        return "🛠️ **ENGINEERING CONSOLE**  \n" + base
-    if st.session_state.mode == "Science":
-        return "🌌 **SCIENCE ARRAY ONLINE**  \n" + base
-    return base
+@perf.timed("render_reply")
+def render_reply(placeholder, user_text: str) -> str:
+    reply = S.reply(user_text)
+    if isinstance(reply, str):
+        placeholder.markdown(reply)
+        return reply
+
+    # Token stream: repaint at most every STREAM_REFRESH_S so a fast stream
+    # doesn't flood the websocket with one delta per token. Async dispatch
+    # also yields "" while the provider is quiet; repainting on those lets a
+    # new message interrupt this run (and so cancel the call) without delay.
+    parts = []
+    last_paint = 0.0
+    for delta in reply:
+        parts.append(delta)
+        now = time.monotonic()
+        if now - last_paint >= STREAM_REFRESH_S:
+            text = "".join(parts)
+            placeholder.markdown(text + "▌" if text else "*Scanning...*")
+            last_paint = now
+    text = "".join(parts) or S.offline_reply(user_text)
+    placeholder.markdown(text)
+    return text
 
 # ----------------------------
 # Export Captain’s Log
 # ----------------------------
-def build_captains_log() -> str:
-    s = st.session_state.ship_state
-    header = [
-        "HANNAH — Captain’s Log",
-        "======================",
-        f"Generated: {ts()}",
-        "",
-        "Ship Snapshot",
-        "-------------",
-        f"Alert: {s['alert']}",
-        f"Sector: {s['sector']}",
-        f"Fuel: {s['fuel']}%",
-        f"Comms: {s['comms']}",
-        f"Mode: {st.session_state.mode}",
-        "",
-    ]
-
-    events = ["Events", "------"]
-    if st.session_state.events:
-        events.extend(st.session_state.events[-40:])
-    else:
-        events.append("(none)")
-    events.append("")
-
-    convo = ["Conversation", "------------"]
-    if st.session_state.history:
-        for m in st.session_state.history:
-            role = "Commander" if m["role"] == "user" else "CosmoBot"
-            convo.append(f"[{m.get('ts','')}] {role}: {m['content']}")
-    else:
-        convo.append("(empty)")
-    convo.append("")
+EXPORT_FORMATS = {  # label -> (format, gzip)
+    ".txt": ("txt", False),
+    ".jsonl": ("jsonl", False),
+    ".txt.gz": ("txt", True),
+    ".jsonl.gz": ("jsonl", True),
+}
 
-    crew = ["Crew Log", "--------"]
-    if st.session_state.use_crew_log and st.session_state.crew_log:
-        crew.extend(st.session_state.crew_log[-30:])
-    else:
-        crew.append("(disabled or empty)")
-    crew.append("")
+def captains_log_exporter(fmt: str, gzip: bool):
+    # Returns a zero-arg callable for st.download_button: nothing is built
+    # until the Commander clicks, and then it runs off the script thread, so
+    # it captures the session's records here instead of reading session_state.
+    ship = dict(S.ship_state)
+    mode = S.mode
+    events, history = S.events, S.history
+    crew = S.crew_log if S.use_crew_log else None
+    lines = export.iter_jsonl if fmt == "jsonl" else export.iter_txt
+
+    def build():
+        # tuple(): a shallow snapshot, so a message landing mid-export can't
+        # invalidate the iteration
+        with perf.span("export"):
+            return export.to_buffer(export.encode(
+                lines(ship, mode, tuple(events), tuple(history), tuple(crew) if crew is not None else None),
+                gzip,
+            ))
+    return build
 
-    return "\n".join(header + events + convo + crew)
+# ----------------------------
+# Fragments
+# ----------------------------
+# The page is split into fragments so an interaction only reruns the part it
+# touches: sending a message reruns the console (status lights + chat +
+# logs), a sidebar toggle reruns the sidebar. CSS, title and footer only
+# render on full runs. When one fragment changes state the other one shows,
+# it asks for a full rerun instead of leaving stale widgets on screen.
+def sidebar_view_state():
+    return (S.mode, tuple(S.ship_state.items()))
+
+def console_view_state():
+    return (
+        sidebar_view_state(),
+        S.use_crew_log,
+        len(S.history),
+        len(S.events),
+        S.last_event,
+    )
 
 # ----------------------------
 # Sidebar Controls
 # ----------------------------
-with st.sidebar:
+@st.fragment
+@perf.timed("sidebar")
+def sidebar_panel():
+    before = console_view_state()
+    S.tick()
+
     st.markdown("### ⚙️ Console Settings")
 
-    st.session_state.mode = st.selectbox(
+    S.mode = st.selectbox(
         "CosmoBot Mode",
-        ["Standard", "Science", "Engineering", "Alert"],
-        index=["Standard", "Science", "Engineering", "Alert"].index(st.session_state.mode),
+        MODES,
+        index=MODES.index(S.mode),
         help="Changes CosmoBot’s voice and response style.",
     )
 
-    st.session_state.use_crew_log = st.toggle(
+    S.use_crew_log = st.toggle(
         "Crew Log (short-term memory)",
-        value=st.session_state.use_crew_log,
+        value=S.use_crew_log,
         help="When ON, CosmoBot stores small snippets to keep continuity.",
     )
 
-    st.session_state.sound = st.toggle(
+    S.sound = st.toggle(
         "Console Sounds (beep)",
-        value=st.session_state.sound,
+        value=S.sound,
         help="Plays a tiny beep on response (may be blocked on some devices).",
     )
 
     st.markdown("### 🎲 Ship Events")
-    st.session_state.event_rate = st.slider(
+    S.event_rate = st.slider(
         "Event rate (% per message)",
         min_value=0,
         max_value=60,
-        value=int(st.session_state.event_rate * 100),
+        value=int(S.event_rate * 100),
         step=1,
-        help="Chance that a ship event triggers after each message.",
+        help=(f"Chance that a ship event triggers after each message. Above 0, about "
+              f"{AMBIENT_EVENTS_PER_H:g} more per hour also arrive between messages "
+              "(COSMOBOT_SIM_EVENTS_PER_H); 0 stops all events."),
     ) / 100.0
+    with st.expander("📈 Forecast this rate", expanded=False):
+        st.caption(f"{UI_SESSIONS:,} simulated {UI_MESSAGES}-message voyages from a fresh ship, "
+                   "a minute apart (voyage.py).")
+        # Off by default: the run costs well under a second, cached per rate.
+        if st.toggle("Run forecast", key="voyage_forecast"):
+            st.markdown(forecast_markdown(round(S.event_rate, 2)))
 
     st.markdown("### 🛰️ Ship Readout")
-    st.session_state.ship_state["sector"] = st.text_input("Sector", st.session_state.ship_state["sector"])
-    st.session_state.ship_state["fuel"] = st.slider("Fuel %", 0, 100, int(st.session_state.ship_state["fuel"]))
-    st.session_state.ship_state["alert"] = st.selectbox(
+    S.ship_state["sector"] = st.text_input("Sector", S.ship_state["sector"])
+    S.ship_state["fuel"] = st.slider("Fuel %", 0, 100, int(S.ship_state["fuel"]))
+    S.ship_state["alert"] = st.selectbox(
         "Alert Level", ["GREEN", "AMBER", "RED"],
-        index=["GREEN", "AMBER", "RED"].index(st.session_state.ship_state["alert"])
+        index=["GREEN", "AMBER", "RED"].index(S.ship_state["alert"])
     )
-    st.session_state.ship_state["comms"] = st.selectbox(
+    S.ship_state["comms"] = st.selectbox(
         "Comms", ["ONLINE", "DEGRADED", "OFFLINE"],
-        index=["ONLINE", "DEGRADED", "OFFLINE"].index(st.session_state.ship_state["comms"])
+        index=["ONLINE", "DEGRADED", "OFFLINE"].index(S.ship_state["comms"])
     )
 
     st.markdown("### 📓 Export")
-    log_txt = build_captains_log()
+    export_label = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key="export_format")
+    fmt, gz = EXPORT_FORMATS[export_label]
     st.download_button(
-        "⬇️ Download Captain’s Log (.txt)",
-        data=log_txt.encode("utf-8"),
-        file_name="hannah_captains_log.txt",
-        mime="text/plain",
+        f"⬇️ Download Captain’s Log ({export_label})",
+        data=captains_log_exporter(fmt, gz),
+        file_name=export.file_name("hannah_captains_log", fmt, gz),
+        mime=export.mime_type(fmt, gz),
+        on_click="ignore",
         use_container_width=True,
     )
 
     st.markdown("### 🔑 Optional LLM")
     st.caption("Set `OPENAI_API_KEY` to enable full LLM chat.")
     st.caption("Optional: `OPENAI_MODEL` (default: gpt-4o-mini).")
+    st.caption("Optional: `OPENAI_BASE_URL` for an OpenAI-compatible server, e.g. the local "
+               "stub `python benchmarks/stub_server.py --profile flaky`.")
+    st.caption(f"Backend: {describe_backend(get_backend())}")
+    if S.prompt_tokens:
+        st.caption(f"Last prompt: ~{S.prompt_tokens} / {CONTEXT_TOKENS} tokens")
+    usage = usage_stats()
+    if usage["calls"]:
+        st.caption(
+            f"Provider prompt cache: {usage['cached_ratio']:.0%} of prompt tokens cached "
+            f"(warm {usage['warm_latency_s']:.2f}s vs cold {usage['cold_latency_s']:.2f}s)"
+        )
+    calls = dispatch_stats()
+    if calls["submitted"]:
+        st.caption(
+            f"LLM calls: {calls['running']} running · {calls['queued']} queued "
+            f"({calls['queued_alert']} alert) · wait p95 {calls['wait_p95_s']:.1f}s · "
+            f"{calls['cancelled']} cancelled · {calls['timed_out']} timed out of {calls['submitted']} · "
+            f"{calls['coalesced']} shared"
+        )
+    cache_stats = REPLY_CACHE.stats()
+    st.caption(
+        f"Reply cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['entries']} entries)"
+    )
 
     colA, colB = st.columns(2)
     with colA:
         if st.button("🧹 Clear chat"):
-            st.session_state.history = []
-            st.session_state.last_event = ""
-            st.success("Chat cleared.")
+            S.clear_history()
+            st.toast("Chat cleared.")
     with colB:
         if st.button("🧠 Clear crew log"):
-            st.session_state.crew_log = []
-            st.success("Crew log cleared.")
+            S.clear_crew_log()
+            st.toast("Crew log cleared.")
+
+    st.caption(
+        f"Session memory: {S.memory_bytes() / 1024:.1f} KB "
+        f"({len(S.history)} msgs · {len(S.events)} events · "
+        f"{len(S.crew_log)} crew lines · {len(S.recall)} recalled exchanges)"
+    )
 
     if st.button("⚡ Trigger event (demo)", use_container_width=True):
-        ev = maybe_trigger_event(force=True)
+        ev = S.maybe_trigger_event(force=True)
         if ev:
-            st.session_state.events = st.session_state.events  # keep state
-            st.success("Event triggered.")
+            st.toast("Event triggered.")
         else:
-            st.info("No event.")
+            st.toast("No event.")
+
+    S.persist_settings()
+    if console_view_state() != before:
+        st.rerun()
 
 # ----------------------------
 # Command Palette (dropdown)
 # ----------------------------
-COMMANDS = {
-    "— Select a command —": "",
-    "/help — show commands": "/help",
-    "/status — ship readout": "/status",
-    "/mission — generate mission": "/mission",
-    "/scan — sensor sweep": "/scan",
-    "/mode standard": "/mode standard",
-    "/mode science": "/mode science",
-    "/mode engineering": "/mode engineering",
-    "/mode alert": "/mode alert",
-    "/event — force ship event": "/event",
-    "/clear — clear chat": "/clear",
-}
-
-st.markdown('<div class="console">', unsafe_allow_html=True)
+COMMANDS = {"— Select a command —": "", **command_palette()}  # label -> command text
 
-# top row: badges + lights
-lights = ship_lights_html(
-    st.session_state.ship_state["alert"],
-    int(st.session_state.ship_state["fuel"]),
-    st.session_state.ship_state["comms"],
-)
-badges_html = (
-    f'<div class="badges">'
-    f'<span class="badge">MODE: {st.session_state.mode}</span>'
-    f'<span class="badge">ALERT: {st.session_state.ship_state["alert"]}</span>'
-    f'<span class="badge">SECTOR: {st.session_state.ship_state["sector"]}</span>'
-    f'<span class="badge">FUEL: {st.session_state.ship_state["fuel"]}%</span>'
-    f'<span class="badge">COMMS: {st.session_state.ship_state["comms"]}</span>'
-    f'</div>'
-)
-st.markdown(f'<div class="console-top">{badges_html}{lights}</div>', unsafe_allow_html=True)
-st.markdown('<div class="hr-soft"></div>', unsafe_allow_html=True)
-
-# Command palette row
-c1, c2 = st.columns([3, 1], gap="small")
-with c1:
-    choice = st.selectbox("Command Palette", list(COMMANDS.keys()), label_visibility="collapsed")
-with c2:
-    run_cmd = st.button("RUN", use_container_width=True)
-
-if run_cmd and COMMANDS.get(choice):
-    cmd_text = COMMANDS[choice]
-    push_history("user", cmd_text)
-    with st.chat_message("user"):
-        st.markdown(cmd_text)
-    with st.chat_message("assistant"):
-        placeholder = st.empty()
-        for dot in ["Scanning", "Scanning.", "Scanning..", "Scanning..."]:
-            placeholder.markdown(f"*{dot}*")
-            time.sleep(0.07)
-        reply = cosmobot_reply(cmd_text)
-        placeholder.markdown(reply)
-        beep()
-    push_history("assistant", reply)
-    push_crew_log(cmd_text, reply)
-
-# show last event card if exists
-if st.session_state.last_event:
-    st.markdown(
-        f"<div class='eventbox'><b>Recent Event</b><br/>{st.session_state.last_event}</div>",
-        unsafe_allow_html=True
+# ----------------------------
+# Console (status header + chat + logs)
+# ----------------------------
+HISTORY_LIVE = int(os.getenv("COSMOBOT_HISTORY_LIVE", "20"))  # newest messages rendered as bubbles
+HISTORY_PAGE = 20  # older messages per collapsed page
+
+@perf.timed("history")
+def history_panel():
+    # Windowed history: only the newest HISTORY_LIVE messages are live chat
+    # bubbles. Older ones are split into pages behind a picker, and only the
+    # picked page is rendered (as one memoized markdown block), so a rerun
+    # costs the same at 20 messages as at HISTORY_MAX.
+    history = S.history
+    n_older = max(0, len(history) - HISTORY_LIVE)
+    if n_older:
+        starts = list(range(0, n_older, HISTORY_PAGE))
+        with st.expander(f"🗂️ Earlier transmissions ({n_older})", expanded=False):
+            start = st.selectbox(
+                "Page",
+                starts,
+                index=None,
+                format_func=lambda i: f"Messages {i + 1}–{min(i + HISTORY_PAGE, n_older)}",
+                placeholder="Select a page to load…",
+                label_visibility="collapsed",
+                key="history_page",
+            )
+            if start is not None:
+                st.markdown(page_markdown(islice(history, start, min(start + HISTORY_PAGE, n_older))))
+
+    for msg in islice(history, n_older, None):
+        with st.chat_message("assistant" if msg.role == "assistant" else "user"):
+            st.markdown(msg.content)
+
+@st.fragment
+@perf.timed("console")
+def console():
+    before = sidebar_view_state()
+    S.tick()  # the ship kept flying since the last rerun
+
+    st.markdown('<div class="console">', unsafe_allow_html=True)
+
+    # top row: badges + lights
+    lights = ship_lights_html(
+        S.ship_state["alert"],
+        int(S.ship_state["fuel"]),
+        S.ship_state["comms"],
+        comms_state(),
     )
-    st.markdown('<div class="hr-soft"></div>', unsafe_allow_html=True)
-
-# Welcome hint if empty
-if not st.session_state.history:
-    st.markdown(
-        "🧭 Try <kbd>/help</kbd> or use the Command Palette. Or type: **mission**, **status**, **scan**, **space fact**, **joke**.",
-        unsafe_allow_html=True
+    badges_html = (
+        f'<div class="badges">'
+        f'<span class="badge">MODE: {S.mode}</span>'
+        f'<span class="badge">ALERT: {S.ship_state["alert"]}</span>'
+        f'<span class="badge">SECTOR: {S.ship_state["sector"]}</span>'
+        f'<span class="badge">FUEL: {S.ship_state["fuel"]}%</span>'
+        f'<span class="badge">COMMS: {S.ship_state["comms"]}</span>'
+        f'</div>'
     )
+    st.markdown(f'<div class="console-top">{badges_html}{lights}</div>', unsafe_allow_html=True)
     st.markdown('<div class="hr-soft"></div>', unsafe_allow_html=True)
 
-# Display chat history
-for msg in st.session_state.history:
-    with st.chat_message("assistant" if msg["role"] == "assistant" else "user"):
-        st.markdown(msg["content"])
-
-# Input
-user_text = st.chat_input("Type a command (/help) or message…")
-
-if user_text:
-    # Add user message
-    push_history("user", user_text)
+    # Command palette row
+    c1, c2 = st.columns([3, 1], gap="small")
+    with c1:
+        choice = st.selectbox("Command Palette", list(COMMANDS.keys()), label_visibility="collapsed")
+    with c2:
+        run_cmd = st.button("RUN", use_container_width=True)
+
+    if run_cmd and COMMANDS.get(choice):
+        cmd_text = COMMANDS[choice]
+        S.push_history("user", cmd_text)
+        with st.chat_message("user"):
+            st.markdown(cmd_text)
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("*Scanning...*")
+            reply = render_reply(placeholder, cmd_text)
+            beep()
+        S.finish_turn(cmd_text, reply)
+
+    # show last event card if exists
+    if S.last_event:
+        st.markdown(
+            f"<div class='eventbox'><b>Recent Event</b><br/>{S.last_event}</div>",
+            unsafe_allow_html=True
+        )
+        st.markdown('<div class="hr-soft"></div>', unsafe_allow_html=True)
 
-    # Random ship event (after user message, before bot reply)
-    event_msg = maybe_trigger_event(force=False)
+    # Welcome hint if empty
+    if not S.history:
+        st.markdown(
+            "🧭 Try <kbd>/help</kbd> or use the Command Palette. Or type: **mission**, **status**, **scan**, **space fact**, **joke**.",
+            unsafe_allow_html=True
+        )
+        st.markdown('<div class="hr-soft"></div>', unsafe_allow_html=True)
 
-    # Show user bubble
-    with st.chat_message("user"):
-        st.markdown(user_text)
+    # Display chat history
+    history_panel()
 
-    # Show event bubble (as assistant) if triggered
-    if event_msg:
-        with st.chat_message("assistant"):
-            st.markdown(event_msg)
-        push_history("assistant", event_msg)
+    # Input
+    user_text = st.chat_input("Type a command (/help) or message…")
 
-    # Bot reply
-    with st.chat_message("assistant"):
-        placeholder = st.empty()
-        for dot in ["Scanning", "Scanning.", "Scanning..", "Scanning..."]:
-            placeholder.markdown(f"*{dot}*")
-            time.sleep(0.10)
+    if user_text:
+        # Add user message
+        S.push_history("user", user_text)
 
-        reply = cosmobot_reply(user_text)
-        placeholder.markdown(reply)
-        beep()
+        # Random ship event (after user message, before bot reply)
+        event_msg = S.maybe_trigger_event(force=False)
 
-    push_history("assistant", reply)
-    push_crew_log(user_text, reply)
+        # Show user bubble
+        with st.chat_message("user"):
+            st.markdown(user_text)
 
-st.markdown("</div>", unsafe_allow_html=True)
+        # Show event bubble (as assistant) if triggered
+        if event_msg:
+            with st.chat_message("assistant"):
+                st.markdown(event_msg)
+            S.push_history("assistant", event_msg)
 
-# Crew log viewer (optional)
-if st.session_state.use_crew_log:
-    with st.expander("📓 Crew Log (short-term memory)", expanded=False):
-        if st.session_state.crew_log:
-            st.markdown("\n".join([f"- {x}" for x in st.session_state.crew_log[-30:]]))
+        # Bot reply
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("*Scanning...*")
+            reply = render_reply(placeholder, user_text)
+            beep()
+
+        S.finish_turn(user_text, reply)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    logs_panel()
+
+    S.persist_settings()
+    # A ship event or /mode moved something the sidebar widgets display.
+    if sidebar_view_state() != before:
+        st.rerun()
+
+def logs_panel():
+    # Crew log viewer (optional)
+    if S.use_crew_log:
+        with st.expander("📓 Crew Log (short-term memory)", expanded=False):
+            if S.crew_log:
+                st.markdown("\n".join([f"- {crew_line(x)}" for x in S.crew_log]))
+            else:
+                st.caption("Crew log is empty. It will populate after a few exchanges.")
+
+    # Events viewer (optional)
+    with st.expander("🛰️ Ship Events", expanded=False):
+        if S.events:
+            st.markdown("\n".join([f"- {event_line(x)}" for x in S.events]))
         else:
-            st.caption("Crew log is empty. It will populate after a few exchanges.")
+            st.caption("No events yet. Increase event rate in the sidebar or run /event.")
 
-# Events viewer (optional)
-with st.expander("🛰️ Ship Events", expanded=False):
-    if st.session_state.events:
-        st.markdown("\n".join([f"- {x}" for x in st.session_state.events[-40:]]))
-    else:
-        st.caption("No events yet. Increase event rate in the sidebar or run /event.")
+# ----------------------------
+# Page
+# ----------------------------
+S.tick()
+with st.sidebar:
+    sidebar_panel()
+
+console()
 
 st.markdown(
     "<div class='small'>Commands: <kbd>/help</kbd> • <kbd>/status</kbd> • <kbd>/mission</kbd> • <kbd>/scan</kbd> • "
     "<kbd>/mode science</kbd> • <kbd>/event</kbd> • <kbd>/clear</kbd> — Export from sidebar.</div>",
     unsafe_allow_html=True
 )
+
+perf.record("script", time.perf_counter() - _script_t0[0], time.thread_time() - _script_t0[1])
@@ -0,0 +1,118 @@
+# benchmarks/bench_async.py — 200 concurrent sessions: blocking vs async dispatch
+#
+#   python benchmarks/bench_async.py [--sessions 200] [--turns 3] [--concurrency 32]
+#
+# Each session is a thread (as Streamlit gives each session a script thread)
+# running engine.Session turns against the local stub server. Reports, for
+# the blocking llm.py path and for dispatch.py:
+#   - turns/s, per-turn latency p50/p99, peak threads alive in the process;
+# then a supersede run for dispatch.py: every session sends a message and,
+# mid-reply, a second one (what a Commander does when they change their mind)
+# — the first call is cancelled, and the stub counts the tokens it no longer
+# has to generate.
+# Every session asks something different, so dispatch.py's single-flight
+# coalescing never kicks in here (bench_coalesce.py measures that).
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import REPLY_TOKENS, start_stub  # noqa: E402
+
+
+def run_sessions(n, fn):
+    lat, lock = [], threading.Lock()
+    peak = [threading.active_count()]
+
+    def worker(i):
+        for t in fn(i):
+            with lock:
+                lat.append(t)
+                peak[0] = max(peak[0], threading.active_count())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, sorted(lat), peak[0]
+
+
+def report(label, elapsed, lat, peak):
+    print(f"{label:<28} {len(lat) / elapsed:7.1f} turns/s   p50 {lat[len(lat) // 2]:6.2f}s   "
+          f"p99 {lat[int(0.99 * (len(lat) - 1))]:6.2f}s   peak threads {peak}")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sessions", type=int, default=200)
+    p.add_argument("--turns", type=int, default=3, help="turns per session")
+    p.add_argument("--concurrency", type=int, default=32, help="scheduler in-flight cap")
+    p.add_argument("--first-token-s", type=float, default=0.4)
+    p.add_argument("--token-interval-s", type=float, default=0.02)
+    args = p.parse_args()
+
+    server, base_url = start_stub(first_token_s=args.first_token_s, token_interval_s=args.token_interval_s)
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    # Measure concurrency, not the per-minute budgets (bench_scheduler.py covers those).
+    os.environ.setdefault("OPENAI_RPM", "1000000")
+    os.environ.setdefault("OPENAI_TPM", "1000000000")
+
+    import dispatch
+    from engine import Session
+
+    dispatch.SCHEDULER.max_concurrency = args.concurrency
+
+    def turns(async_llm):
+        def fn(i):
+            # Engineering mode: not in the reply cache's modes, so every turn is a real call.
+            s = Session(f"load-{async_llm}-{i}", rng=random.Random(i), async_llm=async_llm)
+            s.mode, s.event_rate = "Engineering", 0.0
+            for _ in range(args.turns):
+                t0 = time.perf_counter()
+                s.turn(f"engineering status of thermal loop {i}")
+                yield time.perf_counter() - t0
+        return fn
+
+    ideal = args.first_token_s + args.token_interval_s * (len(REPLY_TOKENS) - 1)
+    print(f"{args.sessions} sessions x {args.turns} turns, stub reply ~{ideal:.2f}s, "
+          f"dispatch concurrency {args.concurrency}")
+    report("blocking (llm.py)", *run_sessions(args.sessions, turns(False)))
+    report("async (dispatch.py)", *run_sessions(args.sessions, turns(True)))
+
+    # Supersede: half a reply in, the Commander sends something else.
+    def supersede(i):
+        s = Session(f"supersede-{i}", rng=random.Random(i))
+        s.mode, s.event_rate = "Engineering", 0.0
+        first = s.reply(f"plot a course around debris field {i}")
+        t0 = time.perf_counter()
+        for _ in first:
+            if time.perf_counter() - t0 > ideal / 2:
+                break
+        t0 = time.perf_counter()
+        s.turn(f"belay that, engineering status of bay {i} instead")
+        yield time.perf_counter() - t0
+
+    tokens0 = server.tokens_sent
+    stats0 = dispatch.dispatch_stats()
+    elapsed, lat, peak = run_sessions(args.sessions, supersede)
+    stats = dispatch.dispatch_stats()
+    sent = server.tokens_sent - tokens0
+    full = 2 * args.sessions * len(REPLY_TOKENS)
+    report("async, superseded mid-reply", elapsed, lat, peak)
+    print(f"  cancelled {stats['cancelled'] - stats0['cancelled']} calls; stub streamed {sent} of {full} "
+          f"tokens ({1 - sent / full:.0%} never generated), {server.streams_aborted} streams aborted")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_breaker.py — drive the LLM circuit breaker with a fault-injecting stub
+#
+#   python benchmarks/bench_breaker.py
+#
+# Phases: healthy -> 503 storm -> slow endpoint -> recovery. Exits non-zero
+# if the breaker doesn't trip/recover as expected or if a refused call
+# (the instant offline path) takes 1 ms or more.
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import start_stub  # noqa: E402
+import llm  # noqa: E402
+from breaker import CLOSED, OPEN, CircuitBreaker  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "status"}]
+failures = []
+
+
+def turn():
+    t0 = time.perf_counter()
+    text = llm.try_openai_chat(MESSAGES)
+    return text, (time.perf_counter() - t0) * 1000
+
+
+def check(cond, msg):
+    print(("ok    " if cond else "FAIL  ") + msg)
+    if not cond:
+        failures.append(msg)
+
+
+def wait_for_probe():
+    time.sleep(llm.BREAKER.snapshot()["retry_in_s"] + 0.01)
+
+
+def main():
+    server, base_url = start_stub(first_token_s=0.01, token_interval_s=0.0)
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    llm.BREAKER = CircuitBreaker(window=10, min_calls=5, slow_call_s=0.25, open_s=0.3, max_open_s=1.0)
+
+    # 1. healthy
+    lat = [turn()[1] for _ in range(10)]
+    check(llm.BREAKER.state == CLOSED, f"healthy: CLOSED, p50 {statistics.median(lat):.1f} ms")
+
+    # 2. 503 storm: trips on failure rate
+    server.profile["error_rate"] = 1.0
+    n = 0
+    while llm.BREAKER.state != OPEN and n < 50:
+        turn()
+        n += 1
+    check(llm.BREAKER.state == OPEN, f"503 storm: OPEN after {n} turns")
+
+    refused = [turn() for _ in range(1000)]
+    worst = max(ms for _, ms in refused)
+    check(all(t is None for t, _ in refused) and worst < 1.0,
+          f"open: 1000 refusals, p50 {statistics.median(ms for _, ms in refused) * 1000:.1f} us, max {worst * 1000:.1f} us")
+
+    # 3. half-open probe fails -> re-open with longer backoff
+    wait_for_probe()
+    turn()
+    check(llm.BREAKER.state == OPEN, f"failed probe: re-OPEN, next probe in {llm.BREAKER.snapshot()['retry_in_s']:.2f} s")
+
+    # 4. recovery: probe succeeds -> CLOSED
+    server.profile["error_rate"] = 0.0
+    wait_for_probe()
+    text, ms = turn()
+    check(text is not None and llm.BREAKER.state == CLOSED, f"recovery: probe ok in {ms:.1f} ms, CLOSED")
+
+    # 5. slow endpoint: trips on latency
+    server.profile["first_token_s"] = 0.3
+    n = 0
+    while llm.BREAKER.state != OPEN and n < 20:
+        turn()
+        n += 1
+    check(llm.BREAKER.state == OPEN, f"slow endpoint: OPEN after {n} slow turns")
+
+    snap = llm.BREAKER.snapshot()
+    print(f"trips={snap['trips']} rejected={snap['rejected']}")
+    llm.reset_clients()
+    server.shutdown()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_client_pool.py — per-turn cost of a fresh OpenAI client vs the shared pool
+#
+#   python benchmarks/bench_client_pool.py [--turns 200]
+#
+# The stub answers instantly, so the numbers are pure client setup +
+# connection cost. Against the real API a new client also pays DNS + TLS,
+# which a local plain-HTTP stub can't show; the connection counts can.
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import start_stub  # noqa: E402
+import llm  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "status"}]
+
+
+def fresh_client_turn(base_url):
+    # What try_openai_chat did before the pool: new client every message.
+    from openai import OpenAI
+    client = OpenAI(api_key="sk-stub", base_url=base_url)
+    client.chat.completions.create(model=llm.DEFAULT_MODEL, messages=MESSAGES, temperature=llm.TEMPERATURE)
+    client.close()
+
+
+def run(label, turns, fn, server):
+    before = server.connections
+    lat = []
+    for _ in range(turns):
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    p50 = statistics.median(lat)
+    p95 = lat[int(0.95 * (len(lat) - 1))]
+    print(f"{label:<22} p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   connections {server.connections - before}")
+    return p50
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--turns", type=int, default=200)
+    args = p.parse_args()
+
+    server, base_url = start_stub(first_token_s=0.0, token_interval_s=0.0)
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    fresh_client_turn(base_url)  # warm imports
+    llm.try_openai_chat(MESSAGES)
+
+    fresh = run("fresh client per turn", args.turns, lambda: fresh_client_turn(base_url), server)
+    pooled = run("shared pooled client", args.turns, lambda: llm.try_openai_chat(MESSAGES), server)
+    print(f"saved per turn (p50): {fresh - pooled:.2f} ms")
+
+    llm.reset_clients()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
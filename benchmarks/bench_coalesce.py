@@ -0,0 +1,93 @@
+# benchmarks/bench_coalesce.py — single-flight coalescing of identical LLM calls
+#
+#   python benchmarks/bench_coalesce.py [--sessions 100] [--spread-s 0.3]
+#
+# A classroom moment: N fresh sessions in the same mode ask the same thing
+# within --spread-s of each other (everyone clicks "tell me a space fact").
+# Their prompts are identical, so dispatch.py should make one provider call
+# per reply and fan its stream out. Reports stub completions, calls saved,
+# turn latency, and checks every session got the full reply. Then the same
+# load with distinct questions, where nothing may be shared.
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import REPLY_TOKENS, start_stub  # noqa: E402
+
+
+def run(server, sessions, spread_s, text_for):
+    import dispatch
+    from engine import Session
+    from reply_cache import REPLY_CACHE
+
+    REPLY_CACHE.clear()
+    calls0, stats0 = server.completions, dispatch.dispatch_stats()
+    replies, lat, lock = [], [], threading.Lock()
+
+    def worker(i):
+        time.sleep(random.Random(i).uniform(0, spread_s))
+        # Engineering mode: not cached by the reply cache, so only coalescing can save the call.
+        s = Session(f"coalesce-{time.monotonic_ns()}-{i}", rng=random.Random(i))
+        s.mode, s.event_rate = "Engineering", 0.0
+        t0 = time.perf_counter()
+        _, reply = s.turn(text_for(i))
+        with lock:
+            replies.append(reply)
+            lat.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat.sort()
+    full = " ".join(REPLY_TOKENS)
+    stats = dispatch.dispatch_stats()
+    return {
+        "calls": server.completions - calls0,
+        "coalesced": stats["coalesced"] - stats0["coalesced"],
+        "complete": sum(r == full for r in replies),
+        "p50": lat[len(lat) // 2],
+        "p99": lat[int(0.99 * (len(lat) - 1))],
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sessions", type=int, default=100)
+    p.add_argument("--spread-s", type=float, default=0.3, help="arrival window of the identical requests")
+    args = p.parse_args()
+
+    server, base_url = start_stub(first_token_s=0.4, token_interval_s=0.02)
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_RPM", "1000000")
+    os.environ.setdefault("OPENAI_TPM", "1000000000")
+
+    print(f"{args.sessions} fresh sessions, arrivals spread over {args.spread_s:.2f}s")
+    ok = True
+    for label, text_for, expect_shared in (
+        ("identical question", lambda i: "tell me a space fact", True),
+        ("distinct questions", lambda i: f"status of bay {i}", False),
+    ):
+        r = run(server, args.sessions, args.spread_s, text_for)
+        print(f"{label:<20} {r['calls']:4d} provider calls, {r['coalesced']:4d} saved   "
+              f"turn p50 {r['p50']:.2f}s p99 {r['p99']:.2f}s   "
+              f"{r['complete']}/{args.sessions} full replies")
+        ok &= r["complete"] == args.sessions
+        ok &= (r["calls"] < args.sessions) if expect_shared else (r["coalesced"] == 0)
+    print("ok" if ok else "FAIL")
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_engine.py — headless chat throughput (no Streamlit)
+#
+#   python benchmarks/bench_engine.py [--turns 20000] [--sessions 50] [--store]
+#
+# Drives engine.Session directly with a fixed seed, ship events, crew log
+# and recall on. With no OPENAI_API_KEY every chat turn still builds the full
+# prompt (context packing + telemetry + BM25 recall) before the offline
+# fallback answers; --offline skips that too. Reports turns/s and per-turn
+# latency, optionally with the SQLite session store in the loop.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.pop("OPENAI_API_KEY", None)
+
+from engine import Session  # noqa: E402
+from store import SessionStore  # noqa: E402
+
+PROMPTS = [
+    "hello there", "give me a mission", "run a scan of the sector", "tell me a space fact",
+    "status report", "engineering checklist please", "tell me a joke", "who are you",
+    "what about the ion storm we saw earlier", "/status", "/mode science", "/mode standard",
+]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--turns", type=int, default=20000)
+    p.add_argument("--sessions", type=int, default=50)
+    p.add_argument("--store", action="store_true", help="persist every turn to a temp SQLite store")
+    p.add_argument("--offline", action="store_true", help="skip prompt building too (llm=False)")
+    p.add_argument("--seed", type=int, default=7)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(os.path.join(tmp, "bench.db")) if args.store else None
+        sessions = [Session(f"bench-{i}", store, rng=random.Random(args.seed + i), llm=not args.offline)
+                    for i in range(args.sessions)]
+        lat = []
+        t_start = time.perf_counter()
+        for _ in range(args.turns):
+            s = rng.choice(sessions)
+            t0 = time.perf_counter()
+            s.turn(rng.choice(PROMPTS))
+            lat.append((time.perf_counter() - t0) * 1e6)
+        elapsed = time.perf_counter() - t_start
+        if store:
+            store.close()
+
+    lat.sort()
+    print(f"{args.turns} turns over {args.sessions} sessions{' (store on)' if args.store else ''}: "
+          f"{args.turns / elapsed:,.0f} turns/s")
+    print(f"per turn: mean {statistics.fmean(lat):.1f} us  p50 {lat[len(lat) // 2]:.1f} us  "
+          f"p99 {lat[int(0.99 * (len(lat) - 1))]:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
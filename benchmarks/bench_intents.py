@@ -0,0 +1,117 @@
+# benchmarks/bench_intents.py — compiled intent matcher vs the old if-chain
+#
+#   python benchmarks/bench_intents.py [--messages 20000] [--words 12]
+#
+# Times engine.offline_response (intents.IntentMatcher) against a copy of
+# the substring if-chain it replaced, on short palette-style lines and on
+# longer free-text messages, and lists where the two disagree (the old
+# chain's false hits: "hi" in "this", "yo" in "your", ...). Then grows the
+# table with synthetic intents (what COSMOBOT_INTENTS files do) to show how
+# each approach scales with the number of keywords.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import INTENT_POOLS, OFFLINE_BRAIN, OFFLINE_INTENTS, offline_response  # noqa: E402
+from intents import IntentMatcher  # noqa: E402
+from gen_transcripts import LINES  # noqa: E402
+
+FILLER = ("the a of to and we is this your ship crew sector course fuel power bay orbit "
+          "nebula signal reactor hull shields deck sensors thanks please now what how").split()
+
+
+def legacy_intent(user_text: str) -> str | None:
+    # engine.offline_response before intents.py, reduced to which branch fired.
+    u = user_text.strip().lower()
+    if any(k in u for k in ["hello", "hi", "hey", "yo"]):
+        return "greeting"
+    if "mission" in u or "quest" in u:
+        return "mission"
+    if "scan" in u or "sweep" in u:
+        return "scan"
+    if "joke" in u:
+        return "joke"
+    if "fact" in u or "space" in u:
+        return "fact"
+    if "status" in u or "diagnostic" in u:
+        return "status"
+    if "checklist" in u or "engineering" in u:
+        return "engineering"
+    if "who are you" in u or "your name" in u:
+        return "identity"
+    return None
+
+
+def compiled_intent(user_text: str) -> str | None:
+    intent = OFFLINE_BRAIN.match(user_text)
+    return intent["name"] if intent else None
+
+
+def synthetic_intents(n: int, rng) -> list:
+    syllables = ["ka", "lo", "mi", "ven", "tor", "qu", "zel", "ax", "ri", "dun", "pha", "os"]
+    return [{"name": f"x{i}", "stems": ["".join(rng.choice(syllables) for _ in range(3)) for _ in range(3)],
+             "replies": ["ok"]} for i in range(n)]
+
+
+def chain_for(table: list):
+    # The if-chain generalised to a table: substring tests, in order.
+    tests = [(i["name"], [k for f in ("words", "stems", "phrases") for k in i.get(f, ())]) for i in table]
+
+    def classify(user_text):
+        u = user_text.strip().lower()
+        for name, keys in tests:
+            if any(k in u for k in keys):
+                return name
+        return None
+    return classify
+
+
+def per_call_us(fn, msgs) -> float:
+    t0 = time.perf_counter()
+    for m in msgs:
+        fn(m)
+    return (time.perf_counter() - t0) / len(msgs) * 1e6
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=20000)
+    p.add_argument("--words", type=int, default=12, help="mean length of free-text messages")
+    args = p.parse_args()
+
+    rng = random.Random(7)
+    corpora = {
+        "palette lines": [rng.choice(LINES) for _ in range(args.messages)],
+        "free text": [" ".join(rng.choice(FILLER + [rng.choice(LINES)]) for _ in range(max(1, int(rng.expovariate(1 / args.words)))))
+                      for _ in range(args.messages)],
+    }
+    for label, msgs in corpora.items():
+        legacy = per_call_us(legacy_intent, msgs)
+        compiled = per_call_us(compiled_intent, msgs)
+        full = per_call_us(lambda m: offline_response(m, rng), msgs)
+        greet = [sum(f(m) == "greeting" for m in msgs) / len(msgs) for f in (legacy_intent, compiled_intent)]
+        print(f"{label:<14} if-chain {legacy:5.2f} us   compiled match {compiled:5.2f} us   "
+              f"offline_response {full:5.2f} us   greeting share {greet[0]:.0%} -> {greet[1]:.0%}")
+
+    print("\nkeyword table size (free text):")
+    for extra in (0, 56, 248):
+        table = OFFLINE_INTENTS + synthetic_intents(extra, random.Random(extra))
+        matcher = IntentMatcher(table, INTENT_POOLS)
+        chain = per_call_us(chain_for(table), corpora["free text"])
+        compiled = per_call_us(matcher.match, corpora["free text"])
+        print(f"  {len(table):4d} intents   if-chain {chain:6.2f} us   compiled {compiled:5.2f} us")
+
+    changed = sorted({m for m in LINES + FILLER if legacy_intent(m) != compiled_intent(m)})
+    print(f"\n{len(changed)} of {len(LINES) + len(FILLER)} sample lines/words classified differently:")
+    for m in changed:
+        print(f"  {m!r:48} {legacy_intent(m)!s:>10} -> {compiled_intent(m)}")
+
+
+if __name__ == "__main__":
+    main()
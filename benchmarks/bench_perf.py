@@ -0,0 +1,77 @@
+# benchmarks/bench_perf.py — cost of perf.py instrumentation per call
+#
+#   python benchmarks/bench_perf.py [--calls 200000]
+#
+# Times an empty function bare, under perf.timed() and under perf.span(),
+# with spans on and off (COSMOBOT_PERF=0 is read at import, so "off" runs
+# in a child process), then offline engine turns/s both ways.
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def ns_per_call(fn, calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e9
+
+
+def measure(calls: int) -> dict:
+    import perf
+    from engine import Session
+
+    def bare():
+        pass
+
+    timed = perf.timed("bench")(bare)
+
+    def spanned():
+        with perf.span("bench"):
+            pass
+
+    lines = ["tell me a space fact", "status report", "/scan", "who are you", "plot a course"]
+    turns = 0.0
+    for rep in range(3):  # best of 3: this is a shared box
+        s = Session(f"bench-{rep}", rng=random.Random(1), llm=False)
+        s.event_rate = 0.0
+        t0 = time.perf_counter()
+        for i in range(calls // 60):
+            s.turn(lines[i % len(lines)])
+        turns = max(turns, (calls // 60) / (time.perf_counter() - t0))
+
+    base = ns_per_call(bare, calls)
+    return {
+        "timed": ns_per_call(timed, calls) - base,
+        "span": ns_per_call(spanned, calls) - base,
+        "turns": turns,
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--calls", type=int, default=200_000)
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        print(repr(measure(args.calls)))
+        return
+    for label, flag in (("spans on", "1"), ("spans off", "0")):
+        out = subprocess.run([sys.executable, __file__, "--child", "--calls", str(args.calls)],
+                             env={**os.environ, "COSMOBOT_PERF": flag, "OPENAI_API_KEY": ""},
+                             capture_output=True, text=True, check=True).stdout
+        r = eval(out.strip().splitlines()[-1])
+        print(f"{label:<10} timed() +{r['timed']:6.0f} ns/call   span() +{r['span']:6.0f} ns/call   "
+              f"offline engine {r['turns']:8,.0f} turns/s")
+
+
+if __name__ == "__main__":
+    main()
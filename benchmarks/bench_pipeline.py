@@ -0,0 +1,60 @@
+# benchmarks/bench_pipeline.py — scripted commands: one rerun each vs one pipeline
+#
+#   python benchmarks/bench_pipeline.py [--batches 10]
+#
+# Drives app.py headlessly with streamlit.testing (LLM off, events off) and
+# sends the same batch of palette commands two ways: one chat input per
+# command, and one ";"-chained input. Reports script runs, wall time and
+# script CPU per batch (perf spans), and checks both ways end in the same
+# ship mode.
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.pop("OPENAI_API_KEY", None)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import perf  # noqa: E402
+
+BATCH = ["/scan", "/status", "/mission", "/mode alert", "/status", "/mode standard"]
+
+
+def run_batch(at, inputs):
+    perf.reset()
+    t0 = time.perf_counter()
+    for text in inputs:
+        at.chat_input[0].set_value(text).run()
+    return time.perf_counter() - t0, perf.STATS["script"][0], perf.STATS["script"][2] * 1000
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--batches", type=int, default=10)
+    args = p.parse_args()
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.run()
+    at.sidebar.slider[0].set_value(0).run()  # event rate 0: no surprise full reruns
+
+    print(f"batch of {len(BATCH)} commands: {'; '.join(BATCH)}")
+    for label, inputs in (("one input per command", BATCH), ("one pipeline", ["; ".join(BATCH)])):
+        wall, runs, cpu = [], [], []
+        for _ in range(args.batches):
+            at.chat_input[0].set_value("/clear").run()
+            w, n, c = run_batch(at, inputs)
+            wall.append(w * 1000)
+            runs.append(n)
+            cpu.append(c)
+        print(f"{label:<24} {statistics.median(runs):4.0f} script runs   "
+              f"wall {statistics.median(wall):7.1f} ms   script cpu {statistics.median(cpu):6.1f} ms   "
+              f"mode after: {at.session_state.session.mode}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_prefix.py — provider prompt-cache hits over a long session
+#
+#   python benchmarks/bench_prefix.py [--turns 40] [--words 60] [--budget 3000]
+#
+# One engine Session talks to benchmarks/stub_server.py (which caches prompt
+# prefixes like a provider: 128-token blocks, 1024-token minimum) with
+# messages of --words words, long enough to fill the context budget. Reports,
+# for the turns after the budget first fills, the share of prompt tokens
+# served from the cache, how many turns hit at all, and how often the
+# history window was trimmed (context.py drops it in coarse blocks so the
+# prefix holds between trims).
+
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import start_stub  # noqa: E402
+
+WORDS = "plasma conduit nebula vector thruster lattice beacon orbit telemetry relay gyro hull".split()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--turns", type=int, default=40)
+    p.add_argument("--words", type=int, default=60, help="words per Commander message")
+    p.add_argument("--budget", type=int, default=3000, help="COSMOBOT_CONTEXT_TOKENS")
+    p.add_argument("--warmup", type=int, default=10, help="turns not counted (budget filling up)")
+    args = p.parse_args()
+
+    server, base_url = start_stub(first_token_s=0.0, token_interval_s=0.0)
+    os.environ.update(OPENAI_API_KEY="sk-stub", OPENAI_BASE_URL=base_url,
+                      COSMOBOT_CONTEXT_TOKENS=str(args.budget), COSMOBOT_CACHE_MODES="")
+    import llm
+    from engine import Session
+
+    rng = random.Random(3)
+    s = Session("prefix", rng=random.Random(1), async_llm=False)
+    s.event_rate = 0.0
+    rows, trims = [], 0
+    for i in range(args.turns):
+        before, start = dict(llm.USAGE), s.context_start
+        s.turn(f"Report {i}: " + " ".join(rng.choice(WORDS) for _ in range(args.words)))
+        rows.append((llm.USAGE["prompt_tokens"] - before["prompt_tokens"],
+                     llm.USAGE["cached_tokens"] - before["cached_tokens"]))
+        trims += i >= args.warmup and s.context_start != start
+    server.shutdown()
+
+    counted = rows[args.warmup:]
+    prompt, cached = sum(p for p, _ in counted), sum(c for _, c in counted)
+    print(f"{args.turns} turns of {args.words} words, budget {args.budget} tokens")
+    print(f"turns {args.warmup}-{args.turns - 1}: {cached / max(1, prompt):.0%} of prompt tokens cached, "
+          f"{sum(1 for _, c in counted if c)}/{len(counted)} turns hit, {trims} window trims, "
+          f"mean prompt {prompt / max(1, len(counted)):,.0f} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_profiles.py — the LLM path under each stub server profile
+#
+#   python benchmarks/bench_profiles.py [--sessions 16] [--turns 5] [--profiles fast,flaky]
+#
+# One child process per stub_server.PROFILES preset (fresh breaker, dispatch
+# loop and perf spans; OPENAI_READ_TIMEOUT is read at import), each running
+# engine.Session turns through dispatch.py against an in-process stub. The
+# stub's hang time is cut to just past the read timeout so "timeouts" cost
+# seconds, not minutes. Reports per profile:
+#   - turns/s and turn latency p50/p95, time to first token p50/p95;
+#   - how replies ended: full, cut short (stream dropped mid-reply) or offline;
+#   - breaker trips, dispatch rate_limited/failed, and what the stub injected.
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import PROFILES, REPLY_TOKENS, start_stub, stub_stats  # noqa: E402
+
+READ_TIMEOUT_S = 1.0
+
+
+def measure(profile_name: str, sessions: int, turns: int) -> dict:
+    import dispatch
+    import llm
+    import perf
+    from engine import Session
+
+    server, base_url = start_stub(**{**PROFILES[profile_name], "hang_s": READ_TIMEOUT_S + 0.5})
+    os.environ["OPENAI_BASE_URL"] = base_url
+    full = list(REPLY_TOKENS)
+    lat, ends, lock = [], {"full": 0, "cut short": 0, "offline": 0}, threading.Lock()
+
+    def worker(i):
+        # Engineering mode: not in the reply cache's modes, so every turn is a real call.
+        s = Session(f"{profile_name}-{i}", rng=random.Random(i))
+        s.mode, s.event_rate = "Engineering", 0.0
+        for t in range(turns):
+            t0 = time.perf_counter()
+            _, reply = s.turn(f"engineering status of bay {i}, check {t}")
+            dt = time.perf_counter() - t0
+            words = reply.split()
+            end = "full" if words == full else "cut short" if words == full[:len(words)] else "offline"
+            with lock:
+                lat.append(dt)
+                ends[end] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    result = {
+        "turns_s": len(lat) / elapsed,
+        "p50": lat[len(lat) // 2],
+        "p95": lat[int(0.95 * (len(lat) - 1))],
+        "ttft_p50": perf.percentile("llm_ttft", 0.5),
+        "ttft_p95": perf.percentile("llm_ttft", 0.95),
+        "ends": ends,
+        "trips": llm.BREAKER.snapshot()["trips"],
+        "dispatch": {k: dispatch.STATS[k] for k in ("completed", "failed", "rate_limited", "timed_out")},
+        "stub": stub_stats(server),
+    }
+    server.shutdown()
+    return result
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sessions", type=int, default=16)
+    p.add_argument("--turns", type=int, default=5, help="turns per session")
+    p.add_argument("--profiles", default=",".join(PROFILES))
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        print(repr(measure(args.child, args.sessions, args.turns)))
+        return
+    print(f"{args.sessions} sessions x {args.turns} turns per profile, read timeout {READ_TIMEOUT_S:g}s")
+    env = {**os.environ, "OPENAI_API_KEY": "sk-stub", "OPENAI_READ_TIMEOUT": str(READ_TIMEOUT_S),
+           "COSMOBOT_PERF": "1", "COSMOBOT_ASYNC_LLM": "1"}
+    for name in args.profiles.split(","):
+        out = subprocess.run([sys.executable, __file__, "--child", name, "--sessions", str(args.sessions),
+                              "--turns", str(args.turns)], env=env, capture_output=True, text=True, check=True).stdout
+        r = eval(out.strip().splitlines()[-1])
+        print(f"\n{name:<11} {r['turns_s']:6.1f} turns/s   turn p50 {r['p50']:5.2f}s p95 {r['p95']:5.2f}s   "
+              f"ttft p50 {r['ttft_p50']:5.2f}s p95 {r['ttft_p95']:5.2f}s")
+        print("  replies: " + " · ".join(f"{k} {v}" for k, v in r["ends"].items())
+              + f"   breaker trips {r['trips']}")
+        print("  dispatch: " + " · ".join(f"{k} {v}" for k, v in r["dispatch"].items()))
+        print("  stub: " + " · ".join(f"{k} {v}" for k, v in r["stub"].items() if k != "connections"))
+
+
+if __name__ == "__main__":
+    main()
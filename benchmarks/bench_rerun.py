@@ -0,0 +1,70 @@
+# benchmarks/bench_rerun.py — per-message rerun cost: full script vs console fragment
+#
+#   python benchmarks/bench_rerun.py [--messages 10]
+#
+# Drives app.py headlessly with streamlit.testing (LLM off, events off) and,
+# for growing history sizes, reports per message:
+#   - CPU time of the whole script body (what every message cost before
+#     fragments) vs the console fragment (what a message reruns now), from
+#     the perf spans in app.py;
+#   - delta bytes of the whole page vs the console fragment's block, summed
+#     from the rendered elements' protobufs (approximate wire size).
+# AppTest always executes the full script, so both numbers come from the
+# same run; in a live session only the fragment would execute.
+
+import argparse
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.pop("OPENAI_API_KEY", None)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import perf  # noqa: E402
+
+
+def tree_bytes(node) -> int:
+    total = node.proto.ByteSize() if getattr(node, "proto", None) is not None else 0
+    for child in getattr(node, "children", {}).values():
+        total += tree_bytes(child)
+    return total
+
+
+def console_block(at):
+    # The console fragment renders into the only Block directly under main.
+    main = at._tree.children[0]
+    return next(c for c in main.children.values() if type(c).__name__ == "Block")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=10, help="measured messages per history size")
+    p.add_argument("--sizes", default="10,50,120", help="history lengths to measure at")
+    args = p.parse_args()
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.run()
+    at.sidebar.slider[0].set_value(0).run()  # event rate 0: no surprise full reruns
+
+    print(f"{'history':>7}  {'script cpu':>10}  {'console cpu':>11}  {'page bytes':>10}  {'console bytes':>13}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        while len(at.session_state.session.history) < size:
+            at.chat_input[0].set_value("tell me a space fact").run()
+        script_cpu, console_cpu, page_b, console_b = [], [], [], []
+        for _ in range(args.messages):
+            perf.reset()
+            at.chat_input[0].set_value("status report").run()
+            script_cpu.append(perf.STATS["script"][2] * 1000)
+            console_cpu.append(perf.STATS["console"][2] * 1000)
+            page_b.append(tree_bytes(at._tree))
+            console_b.append(tree_bytes(console_block(at)))
+        print(f"{len(at.session_state.session.history):>7}  {statistics.median(script_cpu):>8.2f}ms  "
+              f"{statistics.median(console_cpu):>9.2f}ms  {statistics.median(page_b):>10.0f}  "
+              f"{statistics.median(console_b):>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_scheduler.py — FairScheduler under a bursty load, on a simulated clock
+#
+#   python benchmarks/bench_scheduler.py
+#
+# Discrete-event run, no network, no sleeping: a chatty session dumps 60
+# calls at t=0 and another 60 at t=30s, 30 ordinary sessions ask twice each
+# over the first 90 s, and one Alert-mode session asks 3 times from t=31s,
+# in the middle of the second burst. Each call holds its slot for 2 s.
+# Run once with per-session fair queuing and once as a
+# single global FIFO (every ticket under one session key), then check:
+#   - admissions never exceed the request bucket (capacity + rate * t);
+#   - fair queuing cuts ordinary sessions' p95 wait vs FIFO;
+#   - Alert calls jump the backlog: they wait at most for the next free slot.
+# Exits non-zero if a check fails.
+
+import heapq
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, FairScheduler  # noqa: E402
+
+RPM, TPM, CONCURRENCY = 120, 120_000, 8
+SERVICE_S = 2.0
+failures = []
+
+
+class SimClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def workload():
+    # (arrival time, session, tokens, priority)
+    calls = [(t, "chatty", 800, PRIORITY_NORMAL) for t in (0.0, 30.0) for _ in range(60)]
+    for i in range(30):
+        for k in range(2):
+            calls.append((i * 2.0 + k * 30.0, f"cmdr-{i:02d}", 800, PRIORITY_NORMAL))
+    calls += [(31.0 + k * 5.0, "alert", 800, PRIORITY_HIGH) for k in range(3)]
+    return sorted(calls, key=lambda c: c[0])
+
+
+def simulate(fair: bool):
+    clock = SimClock()
+    sched = FairScheduler(rpm=RPM, tpm=TPM, max_concurrency=CONCURRENCY, clock=clock)
+    arrivals = workload()
+    done = []  # heap of (finish time, seq, ticket)
+    waits = {}  # session -> [seconds queued]
+    admitted_at = []
+    owner = {}  # ticket -> real session (the FIFO run files everyone under one key)
+    seq = 0
+    i = 0
+    while i < len(arrivals) or done or sched.stats()["queued"]:
+        while i < len(arrivals) and arrivals[i][0] <= clock.t:
+            _, session, tokens, prio = arrivals[i]
+            owner[sched.enqueue(session if fair else "everyone", tokens, prio)] = session
+            i += 1
+        while done and done[0][0] <= clock.t:
+            _, _, ticket = heapq.heappop(done)
+            sched.release(ticket, used_tokens=ticket.tokens)
+        for ticket in sched.admit():
+            waits.setdefault(owner[ticket], []).append(clock.t - ticket.enqueued)
+            admitted_at.append(clock.t)
+            seq += 1
+            heapq.heappush(done, (clock.t + SERVICE_S, seq, ticket))
+        # Next thing that can change anything.
+        nxt = [arrivals[i][0]] if i < len(arrivals) else []
+        if done:
+            nxt.append(done[0][0])
+        wake = sched.next_wakeup()
+        if wake is not None:
+            nxt.append(clock.t + max(wake, 1e-6))
+        if not nxt:
+            break
+        clock.t = max(clock.t, min(nxt))
+    return waits, admitted_at, clock.t
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def check(cond, msg):
+    print(("ok    " if cond else "FAIL  ") + msg)
+    if not cond:
+        failures.append(msg)
+
+
+def main():
+    results = {}
+    for label, fair in (("fair", True), ("fifo", False)):
+        waits, admitted_at, end = simulate(fair)
+        ordinary = [w for s, ws in waits.items() if s.startswith("cmdr-") for w in ws]
+        results[label] = (waits, ordinary)
+        print(f"{label}: {len(admitted_at)} calls in {end:.0f}s simulated   "
+              f"ordinary p50 {pct(ordinary, 0.5):5.1f}s p95 {pct(ordinary, 0.95):5.1f}s   "
+              f"chatty p95 {pct(waits['chatty'], 0.95):5.1f}s   alert max {max(waits['alert']):5.1f}s")
+        # Request bucket: at most capacity (RPM) + rate * t admissions by time t.
+        over = [t for n, t in enumerate(admitted_at, 1) if n > RPM + RPM / 60.0 * t + 1e-6]
+        check(not over, f"{label}: admissions stay within {RPM} rpm (burst {RPM})")
+
+    fair_w, fair_ord = results["fair"]
+    _, fifo_ord = results["fifo"]
+    check(pct(fair_ord, 0.95) < pct(fifo_ord, 0.95),
+          f"fair queuing: ordinary p95 wait {pct(fair_ord, 0.95):.1f}s vs FIFO {pct(fifo_ord, 0.95):.1f}s")
+    check(max(fair_w["alert"]) <= SERVICE_S,
+          f"alert priority: alert max wait {max(fair_w['alert']):.1f}s (next free slot) "
+          f"while the chatty backlog waits up to {max(fair_w['chatty']):.1f}s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
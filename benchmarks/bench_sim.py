@@ -0,0 +1,101 @@
+# benchmarks/bench_sim.py — long voyages through simulation.py
+#
+#   python benchmarks/bench_sim.py [--days 365] [--rerun-s 300] [--events-per-h 6]
+#
+# Flies one ship for --days of simulated time, advanced the way the UI does
+# it (a rerun every ~--rerun-s, exponential gaps), and reports wall time,
+# timers processed and cost per advance; the cost of a rerun with nothing
+# due; a fixed-step 1 s ticker (what a polling loop would do) over one day
+# for comparison; and a replay check: two engine Sessions with the same seed
+# and a fake clock, 200 messages apart by minutes, must log the same events
+# and end in the same ship state.
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from simulation import Simulation  # noqa: E402
+
+
+def new_ship() -> dict:
+    return {"alert": "GREEN", "sector": "Orion Drift", "fuel": 92, "comms": "ONLINE"}
+
+
+def voyage(seed: int, days: float, rerun_s: float, events_per_h: float):
+    rng = random.Random(seed)
+    sim = Simulation(rng, 0.0, events_per_h=events_per_h)
+    gaps = random.Random(seed + 10_000)  # rerun times independent of the ship's rng
+    ship, log, t, advances = new_ship(), hashlib.blake2b(digest_size=8), 0.0, 0
+    end = days * 86400.0
+    t0 = time.perf_counter()
+    while t < end:
+        t += gaps.expovariate(1 / rerun_s)
+        for ts, event in sim.advance(ship, t):
+            log.update(f"{ts:.3f}{event['name']}".encode())
+        ship["fuel"] = 100 if ship["fuel"] < 5 else ship["fuel"]  # refuel at a station
+        advances += 1
+    return time.perf_counter() - t0, advances, sim.fired, log.hexdigest()
+
+
+def polling_day(seed: int, events_per_h: float) -> float:
+    # The alternative: wake every second and roll for everything.
+    rng, ship = random.Random(seed), new_ship()
+    p = events_per_h / 3600.0
+    t0 = time.perf_counter()
+    for _ in range(86400):
+        if rng.random() < p:
+            ship["alert"] = "AMBER"
+        if ship["comms"] != "ONLINE" and rng.random() < 1 / 165:
+            ship["comms"] = "ONLINE"
+    return time.perf_counter() - t0
+
+
+def replay(seed: int) -> tuple:
+    from engine import Session
+
+    clock = [0.0]
+    s = Session(f"replay-{seed}", rng=random.Random(seed), llm=False, clock=lambda: clock[0])
+    for i in range(200):
+        clock[0] += 60.0 * (1 + i % 7)
+        s.turn("status report" if i % 3 else "tell me a space fact")
+    return tuple(e.text for e in s.events), tuple(s.ship_state.items())
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=float, default=365)
+    p.add_argument("--rerun-s", type=float, default=300, help="mean gap between reruns")
+    p.add_argument("--events-per-h", type=float, default=6)
+    p.add_argument("--seed", type=int, default=7)
+    args = p.parse_args()
+
+    wall, advances, fired, digest = voyage(args.seed, args.days, args.rerun_s, args.events_per_h)
+    again = voyage(args.seed, args.days, args.rerun_s, args.events_per_h)[3]
+    other = voyage(args.seed + 1, args.days, args.rerun_s, args.events_per_h)[3]
+    print(f"{args.days:g} days, {advances:,} reruns, {fired:,} timers: {wall * 1000:.0f} ms "
+          f"({wall / advances * 1e6:.2f} us/advance)")
+    print(f"same seed replays the same voyage: {digest == again}   another seed differs: {digest != other}")
+
+    sim, ship = Simulation(random.Random(1), 0.0, events_per_h=0), new_ship()
+    n = 200_000
+    t0 = time.perf_counter()
+    for i in range(n):
+        sim.advance(ship, i * 1e-3)
+    print(f"rerun with nothing due: {(time.perf_counter() - t0) / n * 1e9:.0f} ns")
+
+    day = polling_day(args.seed, args.events_per_h)
+    print(f"1 s polling ticker, 1 day: {day * 1000:.0f} ms -> {args.days:g} days ~{day * args.days:.1f} s "
+          f"(and a thread per ship)")
+
+    a, b = replay(args.seed), replay(args.seed)
+    print(f"engine replay, 200 messages: {len(a[0])} events logged, identical: {a == b}, ship {dict(a[1])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/bench_store.py — per-message cost of the SQLite session store
+#
+#   python benchmarks/bench_store.py [--messages 2000]
+#
+# One chat message writes three rows (user history, assistant history,
+# crew-log exchange). Reports the added latency per message for a few
+# batch / synchronous settings, plus the cost of reloading a session.
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import SessionStore  # noqa: E402
+
+CONFIGS = [
+    ("batch=1  sync=FULL", 1, "FULL"),
+    ("batch=1  sync=NORMAL", 1, "NORMAL"),
+    ("batch=8  sync=NORMAL", 8, "NORMAL"),
+    ("batch=32 sync=NORMAL", 32, "NORMAL"),
+]
+REPLY = "Commander, sensors report the sector is quiet. " * 6
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=2000)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, batch, sync in CONFIGS:
+            store = SessionStore(os.path.join(tmp, f"{batch}-{sync}.db"), batch_size=batch, synchronous=sync)
+            lat = []
+            for i in range(args.messages):
+                t0 = time.perf_counter()
+                store.append("bench", "history", {"role": "user", "content": f"question {i}", "ts": "00:00:00"})
+                store.append("bench", "history", {"role": "assistant", "content": REPLY, "ts": "00:00:00"})
+                store.append("bench", "exchange", {"user": f"question {i}", "bot": REPLY, "ts": "00:00:00", "crew": True,
+                                                   "user_clip": f"question {i}", "bot_clip": REPLY[:90]})
+                lat.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            store.load("bench")
+            load_ms = (time.perf_counter() - t0) * 1000
+            store.close()
+
+            lat.sort()
+            print(f"{label:<22} mean {statistics.fmean(lat):6.3f} ms  p50 {lat[len(lat) // 2]:6.3f} ms  "
+                  f"p99 {lat[int(0.99 * (len(lat) - 1))]:6.3f} ms  reload {load_ms:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
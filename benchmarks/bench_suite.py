@@ -0,0 +1,279 @@
+# benchmarks/bench_suite.py — multi-session rerun benchmark suite (AppTest)
+#
+#   python benchmarks/bench_suite.py [--sessions 8] [--steps 60] [--llm off|stub] [--store]
+#                                    [--repeat 3] [--out run.json] [--baseline old.json] [--tolerance 0.2]
+#
+# Drives the real app.py through streamlit.testing. Every session follows a
+# seeded script of chat messages, palette commands (select + RUN), sidebar
+# changes (mode, toggles, ship readout) and forced ship events, so history,
+# events and crew log grow as they would live. The LLM is off (no key) or
+# answered by benchmarks/stub_server.py.
+#
+# Sessions are interleaved round-robin in one process: each keeps its own
+# session state while sharing the process-wide pieces (reply cache, store,
+# dispatch loop), as on one server. AppTest installs a global runtime per
+# run, so two scripts never execute at the same instant; on a one-core box
+# that is also what the server does.
+#
+# Per rerun: wall time, script CPU (app.py's perf "script" span, i.e. the
+# script thread) and, in a second replay of the same scripts, peak and
+# retained traced memory (tracemalloc; kept out of the timing pass because
+# tracing slows Python down). Summarised per step kind and history band as
+# p50/p95/max; the timing pass runs --repeat times and each figure keeps its
+# best, which is what makes two runs comparable on a noisy box. --out saves
+# the summary with the commit id and environment; --baseline compares a run
+# against an earlier --out and exits 1 when a p50 regressed past
+# --tolerance (and by more than the noise floor) in a group with at least
+# MIN_SAMPLES reruns.
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gen_transcripts import LINES  # noqa: E402
+
+APP = os.path.join(ROOT, "app.py")
+BANDS = (0, 20, 60, 120)  # history length bands (lower bounds)
+STEP_WEIGHTS = {"chat": 0.6, "palette": 0.15, "sidebar": 0.15, "event": 0.1}
+SKIP_PALETTE = ("— ", "/clear", "/perf")  # placeholder; resets history; grows with the run itself
+NOISE_FLOOR = {"wall_p50_ms": 1.0, "cpu_p50_ms": 1.0, "peak_p50_kib": 64.0}
+MIN_SAMPLES = 10  # smaller groups are printed but never judged
+
+
+def make_script(rng: random.Random, steps: int) -> list[tuple]:
+    # (kind, choice seed) pairs; widget choices are resolved against the live page.
+    kinds, weights = zip(*STEP_WEIGHTS.items())
+    return [(rng.choices(kinds, weights)[0], rng.random()) for _ in range(steps)]
+
+
+def by_label(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def do_step(at, kind: str, r: float):
+    if kind == "chat":
+        at.chat_input[0].set_value(LINES[int(r * len(LINES))]).run()
+    elif kind == "palette":
+        palette = by_label(at.main.selectbox, "Command Palette")
+        options = [o for o in palette.options if not o.startswith(SKIP_PALETTE)]
+        palette.set_value(options[int(r * len(options))])
+        by_label(at.main.button, "RUN").click().run()
+    elif kind == "sidebar":
+        choice = int(r * 6)
+        if choice < 2:
+            toggle = at.sidebar.toggle[choice]  # crew log, sound
+            toggle.set_value(not toggle.value).run()
+        elif choice == 2:
+            box = by_label(at.sidebar.selectbox, "CosmoBot Mode")
+            box.set_value(box.options[int(r * 100) % len(box.options)]).run()
+        elif choice == 3:
+            by_label(at.sidebar.slider, "Fuel %").set_value(int(r * 1000) % 101).run()
+        else:
+            box = by_label(at.sidebar.selectbox, "Alert Level" if choice == 4 else "Comms")
+            box.set_value(box.options[int(r * 100) % len(box.options)]).run()
+    else:
+        by_label(at.sidebar.button, "⚡ Trigger event (demo)").click().run()
+
+
+def new_session():
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    by_label(at.sidebar.slider, "Event rate (% per message)").set_value(0).run()  # events only when scripted
+    return at
+
+
+def replay(scripts: list, memory: bool) -> list[dict]:
+    import perf
+    from reply_cache import REPLY_CACHE
+
+    REPLY_CACHE.clear()
+    sessions = [new_session() for _ in scripts]
+    rows = []
+    if memory:
+        tracemalloc.start()
+    for step in range(max(len(s) for s in scripts)):
+        for at, script in zip(sessions, scripts):
+            if step >= len(script):
+                continue
+            kind, r = script[step]
+            history = len(at.session_state.session.history)
+            calls0, _, cpu0 = perf.STATS.get("script", (0, 0.0, 0.0))
+            if memory:
+                tracemalloc.reset_peak()
+                mem0 = tracemalloc.get_traced_memory()[0]
+            t0 = time.perf_counter()
+            do_step(at, kind, r)
+            row = {"kind": kind, "history": history, "wall_ms": (time.perf_counter() - t0) * 1000}
+            calls1, _, cpu1 = perf.STATS.get("script", (0, 0.0, 0.0))
+            row["runs"], row["cpu_ms"] = calls1 - calls0, (cpu1 - cpu0) * 1000
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                row["peak_kib"], row["retained_kib"] = (peak - mem0) / 1024, (current - mem0) / 1024
+            rows.append(row)
+    if memory:
+        tracemalloc.stop()
+    return rows
+
+
+def pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def band(history: int) -> str:
+    lo = max(b for b in BANDS if b <= history)
+    nxt = [b for b in BANDS if b > lo]
+    return f"{lo}-{nxt[0] - 1}" if nxt else f"{lo}+"
+
+
+def best_of(summaries: list[dict]) -> dict:
+    # Per key and metric, the lowest value across repeated passes: noise on a
+    # shared box only ever adds time, so the minimum is the stable number.
+    out = {}
+    for key in summaries[0]:
+        rows = [s[key] for s in summaries if key in s]
+        out[key] = {m: min(r[m] for r in rows if m in r) for m in rows[0]}
+    return out
+
+
+def summarize(timing: list[dict], memory: list[dict]) -> dict:
+    groups = {}
+    for rows, fields in ((timing, ("wall_ms", "cpu_ms")), (memory, ("peak_kib", "retained_kib"))):
+        for row in rows:
+            for key in (f"{row['kind']}/{band(row['history'])}", f"all/{band(row['history'])}", "all/all"):
+                g = groups.setdefault(key, {})
+                for f in fields:
+                    g.setdefault(f, []).append(row[f])
+    out = {}
+    for key in sorted(groups):
+        g, s = groups[key], {}
+        s["n"] = len(g.get("wall_ms", ()))
+        for f, vals in g.items():
+            name = f.rsplit("_", 1)
+            s[f"{name[0]}_p50_{name[1]}"] = round(pct(vals, 0.5), 3)
+            s[f"{name[0]}_p95_{name[1]}"] = round(pct(vals, 0.95), 3)
+            s[f"{name[0]}_max_{name[1]}"] = round(max(vals), 3)
+        out[key] = s
+    return out
+
+
+def print_summary(summary: dict):
+    print(f"{'step/history':<18} {'n':>5}  {'wall p50':>9} {'p95':>8}  {'cpu p50':>8} {'p95':>8}  "
+          f"{'peak p50':>9} {'max':>9}  {'retained p50':>12}")
+    for key, s in summary.items():
+        print(f"{key:<18} {s['n']:>5}  {s.get('wall_p50_ms', 0):>7.1f}ms {s.get('wall_p95_ms', 0):>6.1f}ms  "
+              f"{s.get('cpu_p50_ms', 0):>6.1f}ms {s.get('cpu_p95_ms', 0):>6.1f}ms  "
+              f"{s.get('peak_p50_kib', 0):>6.0f}KiB {s.get('peak_max_kib', 0):>6.0f}KiB  "
+              f"{s.get('retained_p50_kib', 0):>9.1f}KiB")
+
+
+def compare(summary: dict, baseline_path: str, tolerance: float) -> int:
+    with open(baseline_path, encoding="utf-8") as fp:
+        base = json.load(fp)
+    print(f"\nvs baseline {base['meta'].get('commit', '?')} ({baseline_path}), tolerance {tolerance:.0%}:")
+    regressions = 0
+    for key, s in summary.items():
+        b = base["summary"].get(key)
+        if b is None or min(b["n"], s["n"]) < MIN_SAMPLES:
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            old, new = b.get(metric), s.get(metric)
+            if not old or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions += 1
+                print(f"  REGRESSION {key:<18} {metric:<13} {old:9.2f} -> {new:9.2f} ({new / old - 1:+.0%})")
+    print(f"  {regressions} regressions")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return head + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    p = argparse.ArgumentParser(description="Rerun cost of app.py across many scripted sessions.")
+    p.add_argument("--sessions", type=int, default=8)
+    p.add_argument("--steps", type=int, default=60, help="steps per session")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--llm", choices=("off", "stub"), default="off")
+    p.add_argument("--store", action="store_true", help="persist to a temporary SQLite store")
+    p.add_argument("--repeat", type=int, default=3, help="timing passes; each metric keeps its best")
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc replay")
+    p.add_argument("--out", help="write the summary here (JSON; use as a later --baseline)")
+    p.add_argument("--baseline", help="compare against a previous --out")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    args = p.parse_args()
+
+    os.environ["COSMOBOT_PERF"] = "1"  # the CPU column comes from perf spans
+    server = None
+    if args.llm == "stub":
+        from stub_server import start_stub
+
+        server, base_url = start_stub(first_token_s=0.05, token_interval_s=0.002)
+        os.environ.update(OPENAI_API_KEY="sk-stub", OPENAI_BASE_URL=base_url)
+    else:
+        os.environ.pop("OPENAI_API_KEY", None)
+    tmp = tempfile.TemporaryDirectory()
+    if args.store:
+        os.environ["COSMOBOT_STORE_PATH"] = os.path.join(tmp.name, "bench.db")
+    else:
+        os.environ.pop("COSMOBOT_STORE_PATH", None)
+
+    rng = random.Random(args.seed)
+    scripts = [make_script(rng, args.steps) for _ in range(args.sessions)]
+    print(f"{args.sessions} sessions x {args.steps} steps, llm {args.llm}, store {'on' if args.store else 'off'}")
+
+    memory = [] if args.no_memory else replay(scripts, memory=True)
+    summaries = []
+    for i in range(max(1, args.repeat)):
+        t0 = time.perf_counter()
+        timing = replay(scripts, memory=False)
+        print(f"pass {i + 1}: {len(timing)} reruns in {time.perf_counter() - t0:.1f}s "
+              f"({sum(r['runs'] for r in timing)} script runs)")
+        summaries.append(summarize(timing, memory))
+    summary = best_of(summaries)
+    print()
+    print_summary(summary)
+
+    if args.out:
+        import streamlit
+
+        meta = {
+            "commit": git_commit(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "streamlit": streamlit.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count(),
+            "sessions": args.sessions, "steps": args.steps, "seed": args.seed,
+            "llm": args.llm, "store": args.store,
+        }
+        with open(args.out, "w", encoding="utf-8") as fp:
+            json.dump({"meta": meta, "summary": summary}, fp, indent=1)
+    if server is not None:
+        server.shutdown()
+    tmp.cleanup()
+    if args.baseline:
+        sys.exit(1 if compare(summary, args.baseline, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_ttft.py — time-to-first-token: streaming vs blocking replies
+#
+#   python benchmarks/bench_ttft.py [--turns 20]
+#
+# Runs against benchmarks/stub_server.py, so no API key or network is needed.
+# Exits non-zero if streaming doesn't put the first token on screen sooner
+# than the old blocking path (fake "Scanning..." delay + full completion).
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import start_stub  # noqa: E402
+import llm  # noqa: E402
+
+OLD_SCANNING_DELAY_S = 4 * 0.10  # removed chat_input animation
+MESSAGES = [
+    {"role": "system", "content": "You are COSMOBOT."},
+    {"role": "user", "content": "status report"},
+]
+
+
+def p50(xs):
+    return statistics.median(xs) * 1000
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--turns", type=int, default=20)
+    p.add_argument("--first-token-s", type=float, default=0.30)
+    p.add_argument("--token-interval-s", type=float, default=0.02)
+    args = p.parse_args()
+
+    server, base_url = start_stub(first_token_s=args.first_token_s, token_interval_s=args.token_interval_s)
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    blocking, ttft, stream_total = [], [], []
+    for _ in range(args.turns):
+        t0 = time.perf_counter()
+        assert llm.try_openai_chat(MESSAGES)
+        blocking.append(time.perf_counter() - t0 + OLD_SCANNING_DELAY_S)
+
+        t0 = time.perf_counter()
+        deltas = llm.stream_openai_chat(MESSAGES)
+        assert deltas is not None
+        first = None
+        for _delta in deltas:
+            if first is None:
+                first = time.perf_counter() - t0
+        ttft.append(first)
+        stream_total.append(time.perf_counter() - t0)
+
+    server.shutdown()
+
+    print(f"turns={args.turns}  stub first_token={args.first_token_s}s  interval={args.token_interval_s}s")
+    print(f"blocking (scanning delay + full reply)  p50 {p50(blocking):8.1f} ms")
+    print(f"streaming time-to-first-token            p50 {p50(ttft):8.1f} ms")
+    print(f"streaming full reply                     p50 {p50(stream_total):8.1f} ms")
+
+    if p50(ttft) >= p50(blocking):
+        print("FAIL: streaming TTFT is not below blocking latency")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
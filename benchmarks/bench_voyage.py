@@ -0,0 +1,81 @@
+# benchmarks/bench_voyage.py — voyage.py against the engine it models
+#
+#   python benchmarks/bench_voyage.py [--rate 0.18] [--sessions 5000] [--gap-s 60]
+#
+# Runs the same voyages two ways: engine Sessions one message at a time
+# (maybe_trigger_event with a fake clock, so simulation.py's timers run
+# exactly), and voyage.simulate() vectorised. Prints each summary metric
+# side by side with the largest share difference, which should sit within
+# sampling noise (~2 points at 5000 sessions), then sessions/s both ways.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import Session  # noqa: E402
+from simulation import ALERT_LEVELS, AMBIENT_EVENTS_PER_H  # noqa: E402
+from voyage import simulate, summarize  # noqa: E402
+
+
+def engine_voyages(rate: float, sessions: int, messages: int, gap_s: float) -> dict:
+    cols = {k: np.zeros(sessions, int) for k in ("alert", "ever_red", "red_msgs", "fuel", "offline_msgs", "outages")}
+    for n in range(sessions):
+        clock = [0.0]
+        s = Session(f"voyage-{n}", rng=random.Random(n), llm=False, clock=lambda: clock[0])
+        s.event_rate = rate
+        ship = s.ship_state
+        for i in range(messages):
+            clock[0] = i * gap_s
+            was_offline = ship["comms"] == "OFFLINE"  # as of the last message
+            s.maybe_trigger_event()
+            red, offline = ship["alert"] == "RED", ship["comms"] == "OFFLINE"
+            cols["ever_red"][n] |= red
+            cols["red_msgs"][n] += red
+            cols["offline_msgs"][n] += offline
+            cols["outages"][n] += offline and not was_offline
+        cols["alert"][n] = ALERT_LEVELS.index(ship["alert"])
+        cols["fuel"][n] = ship["fuel"]
+    cols["ever_red"] = cols["ever_red"].astype(bool)
+    return cols
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rate", type=float, default=0.18)
+    p.add_argument("--sessions", type=int, default=5000)
+    p.add_argument("--messages", type=int, default=200)
+    p.add_argument("--gap-s", type=float, default=60.0)
+    p.add_argument("--vector-sessions", type=int, default=1_000_000)
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    scalar = summarize(engine_voyages(args.rate, args.sessions, args.messages, args.gap_s))
+    t_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vector = summarize(simulate(args.rate, args.messages, args.vector_sessions, args.gap_s, AMBIENT_EVENTS_PER_H))
+    t_vector = time.perf_counter() - t0
+
+    flat = lambda s: {**{f"final {a}": v for a, v in s.pop("final_alert").items()}, **s}  # noqa: E731
+    scalar, vector = flat(scalar), flat(vector)
+    print(f"rate {args.rate:.0%}, {args.messages} messages, {args.gap_s:g} s apart, "
+          f"{AMBIENT_EVENTS_PER_H:g} ambient events/h")
+    print(f"{'metric':<18} {'engine':>10} {'voyage.py':>10}")
+    for key in scalar:
+        if key != "sessions":
+            print(f"{key:<18} {scalar[key]:10.3f} {vector[key]:10.3f}")
+    shares = [k for k in scalar if k.startswith("final") or k in ("ever_red", "fuel_empty", "fuel_below_25", "outage_any")]
+    print(f"largest share difference: {max(abs(scalar[k] - vector[k]) for k in shares):.3f}")
+    print(f"\nengine     {args.sessions:>9,} sessions  {t_scalar:6.2f}s  {args.sessions / t_scalar:>12,.0f} sessions/s")
+    print(f"voyage.py  {args.vector_sessions:>9,} sessions  {t_vector:6.2f}s  "
+          f"{args.vector_sessions / t_vector:>12,.0f} sessions/s")
+
+
+if __name__ == "__main__":
+    main()
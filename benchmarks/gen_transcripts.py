@@ -0,0 +1,43 @@
+# benchmarks/gen_transcripts.py — synthetic Commander transcripts for replay.py
+#
+#   python benchmarks/gen_transcripts.py --out transcripts/ [--sessions 2000] [--turns 40]
+#
+# Writes one JSONL file per 100 sessions ({"sid", "text"} lines), mixing chat
+# lines, palette commands, mode switches and chained commands.
+
+import argparse
+import json
+import os
+import random
+
+LINES = [
+    "hello there", "give me a mission", "run a scan of the sector", "tell me a space fact",
+    "status report", "engineering checklist please", "tell me a joke", "who are you",
+    "what about the ion storm we saw earlier", "how much fuel do we have left",
+    "plot a course around the debris field", "any biosignatures nearby?",
+]
+COMMANDS = ["/status", "/mission", "/scan", "/event", "/help",
+            "/mode science", "/mode engineering", "/mode alert", "/mode standard",
+            "/scan; /status; /mode alert"]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--out", required=True)
+    p.add_argument("--sessions", type=int, default=2000)
+    p.add_argument("--turns", type=int, default=40, help="mean turns per session")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    for start in range(0, args.sessions, 100):
+        with open(os.path.join(args.out, f"transcripts_{start // 100:04d}.jsonl"), "w", encoding="utf-8") as fp:
+            for i in range(start, min(start + 100, args.sessions)):
+                for _ in range(max(1, int(rng.expovariate(1 / args.turns)))):
+                    text = rng.choice(COMMANDS) if rng.random() < 0.2 else rng.choice(LINES)
+                    fp.write(json.dumps({"sid": f"cmdr-{i:05d}", "text": text}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
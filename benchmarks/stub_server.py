@@ -0,0 +1,342 @@
+# benchmarks/stub_server.py — local OpenAI-compatible stand-in for benchmarks
+# Serves POST /v1/chat/completions (blocking + SSE streaming) and
+# GET /v1/models/{id} with a scripted reply and usage (including simulated
+# prompt-prefix caching), so the LLM path can be measured offline. A
+# profile shapes it:
+#   - first-token latency drawn from a distribution (fixed, uniform,
+#     lognormal, pareto) around first_token_s;
+#   - injected errors (error_status), 429s with Retry-After, either at
+#     random or from an RPM limit, requests that hang past the client's
+#     read timeout, and streams cut off mid-reply.
+# PROFILES holds presets; any key can be overridden, and changed live.
+#
+# In-process:
+#   server, base_url = start_stub(**PROFILES["flaky"], token_interval_s=0.0)
+#   os.environ["OPENAI_BASE_URL"] = base_url
+#   server.profile["error_rate"] = 1.0   # live fault injection
+#   server.shutdown()
+#
+# Standalone (then point the app at it; any API key works):
+#   python benchmarks/stub_server.py --port 8009 --profile realistic [--timeout-rate 0.05]
+#   OPENAI_API_KEY=sk-stub OPENAI_BASE_URL=http://127.0.0.1:8009/v1 streamlit run app.py
+#   curl -d '{"partial_rate": 0.2}' http://127.0.0.1:8009/stub/profile   # change it live
+#   curl http://127.0.0.1:8009/stub/stats
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_TOKENS = (
+    "Commander, sensors report the sector is quiet. "
+    "Propulsion is stable, comms are clear, and the star tracker holds attitude. "
+    "Recommend we stay the course and log a science sweep on the next orbit."
+).split(" ")
+
+DEFAULT_PROFILE = {
+    "first_token_s": 0.30,    # median server think time before the first token
+    "latency_dist": "fixed",  # fixed | uniform | lognormal | pareto
+    "latency_spread": 0.5,    # uniform: +/- share; lognormal: sigma; pareto: 1/alpha (tail weight)
+    "token_interval_s": 0.01, # gap between streamed tokens
+    "error_rate": 0.0,        # share of completions answered with error_status
+    "error_status": 503,
+    "rate_limit_rate": 0.0,   # share answered 429 regardless of load
+    "rpm_limit": 0,           # 429 beyond this many requests per rolling minute (0: off)
+    "retry_after_s": 1.0,     # Retry-After sent with every 429
+    "timeout_rate": 0.0,      # share that hang for hang_s, then close without a reply
+    "hang_s": 60.0,
+    "partial_rate": 0.0,      # share of streams cut off after a random number of tokens
+    "cache_speedup": 0.5,     # first-token time saved on a fully prefix-cached prompt
+}
+
+PROFILES = {
+    "fast": {"first_token_s": 0.0, "token_interval_s": 0.0},
+    "realistic": {"first_token_s": 0.35, "latency_dist": "lognormal", "latency_spread": 0.6,
+                  "token_interval_s": 0.02},
+    "flaky": {"first_token_s": 0.35, "latency_dist": "lognormal", "latency_spread": 0.6,
+              "token_interval_s": 0.02, "error_rate": 0.05, "timeout_rate": 0.03, "partial_rate": 0.05},
+    "overloaded": {"first_token_s": 0.8, "latency_dist": "pareto", "latency_spread": 0.5,
+                   "token_interval_s": 0.03, "rate_limit_rate": 0.1, "rpm_limit": 120, "retry_after_s": 2.0},
+}
+
+COUNTERS = ("connections", "completions", "tokens_sent", "streams_aborted",
+            "errors", "rate_limited", "timeouts", "partial")
+
+# Provider-style prompt caching: prefixes are remembered in ~128-token
+# blocks and only count once at least ~1024 tokens match (chars / 4 ≈ tokens).
+CACHE_BLOCK_CHARS = 512
+CACHE_MIN_CHARS = 4096
+
+
+def _completion_id():
+    return "chatcmpl-stub-" + uuid.uuid4().hex[:12]
+
+
+def _cached_prefix_chars(server, prompt: str) -> int:
+    hashes = [hash(prompt[:end]) for end in range(CACHE_BLOCK_CHARS, len(prompt) + 1, CACHE_BLOCK_CHARS)]
+    matched = 0
+    with server.lock:
+        for h in hashes:
+            if h not in server.prefixes:
+                break
+            matched += CACHE_BLOCK_CHARS
+        server.prefixes.update(hashes)
+    return matched if matched >= CACHE_MIN_CHARS else 0
+
+
+def sample_first_token_s(profile: dict, rng=random) -> float:
+    # first_token_s is the median of every distribution.
+    base, spread, dist = profile["first_token_s"], profile["latency_spread"], profile["latency_dist"]
+    if base <= 0 or dist == "fixed":
+        return max(0.0, base)
+    if dist == "uniform":
+        return max(0.0, base * (1 + rng.uniform(-spread, spread)))
+    if dist == "lognormal":
+        return base * rng.lognormvariate(0.0, spread)
+    if dist == "pareto":
+        alpha = 1 / max(spread, 1e-3)
+        return base * rng.paretovariate(alpha) / 2 ** (1 / alpha)
+    raise ValueError(f"unknown latency_dist {dist!r}")
+
+
+def _over_rpm(server, limit: int) -> bool:
+    now = time.monotonic()
+    with server.lock:
+        arrivals = server.arrivals
+        while arrivals and now - arrivals[0] > 60:
+            arrivals.popleft()
+        if len(arrivals) >= limit:
+            return True
+        arrivals.append(now)
+        return False
+
+
+def _count(server, name: str, n: int = 1):
+    with server.lock:
+        setattr(server, name, getattr(server, name) + n)
+
+
+def _usage(prompt_chars: int, cached_chars: int, completion_tokens: int):
+    prompt_tokens = prompt_chars // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_chars // 4},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # else header/body writes stall ~40ms on delayed ACK
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away between requests
+
+    def setup(self):
+        super().setup()
+        _count(self.server, "connections")
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stub/stats":
+            self._send_json(200, {**stub_stats(self.server), "profile": self.server.profile})
+            return
+        # GET /v1/models/{id} — used by llm.probe_backend()
+        parts = self.path.rstrip("/").split("/")
+        if len(parts) >= 2 and parts[-2] == "models":
+            self._send_json(200, {"id": parts[-1], "object": "model", "created": 0, "owned_by": "stub"})
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") == "/stub/profile":
+            unknown = set(body) - set(DEFAULT_PROFILE)
+            if unknown:
+                self._send_json(400, {"error": {"message": f"unknown keys {sorted(unknown)}"}})
+                return
+            self.server.profile.update(body)
+            self._send_json(200, self.server.profile)
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        profile = self.server.profile  # may be changed live to inject faults
+        _count(self.server, "completions")
+        model = body.get("model", "stub-model")
+        if random.random() < profile["rate_limit_rate"] or (
+                profile["rpm_limit"] and _over_rpm(self.server, profile["rpm_limit"])):
+            _count(self.server, "rate_limited")
+            self._send_json(429, {"error": {"message": "stub rate limit", "type": "rate_limit_exceeded"}},
+                            {"Retry-After": f"{profile['retry_after_s']:g}"})
+            return
+        if random.random() < profile["error_rate"]:
+            _count(self.server, "errors")
+            status = profile["error_status"]
+            self._send_json(status, {"error": {"message": f"stub fault {status}", "type": "server_error"}})
+            return
+        if random.random() < profile["timeout_rate"]:
+            # Says nothing until the client's read timeout gives up on us.
+            _count(self.server, "timeouts")
+            time.sleep(profile["hang_s"])
+            self.close_connection = True
+            return
+        prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+        cached = _cached_prefix_chars(self.server, prompt)
+        usage = _usage(len(prompt), cached, len(REPLY_TOKENS))
+        first_token_s = sample_first_token_s(profile)
+        time.sleep(first_token_s * (1 - profile["cache_speedup"] * cached / max(1, len(prompt))))
+
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            self._stream(model, profile, usage if include_usage else None)
+        else:
+            time.sleep(profile["token_interval_s"] * (len(REPLY_TOKENS) - 1))
+            self._send_json(200, {
+                "id": _completion_id(),
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(REPLY_TOKENS)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model, profile, usage=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        cid, created = _completion_id(), int(time.time())
+        try:
+            self._stream_tokens(model, profile, usage, cid, created)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hung up mid-reply (cancelled); the rest is never generated.
+            with self.server.lock:
+                self.server.streams_aborted += 1
+            self.close_connection = True
+
+    def _stream_tokens(self, model, profile, usage, cid, created):
+        cut = len(REPLY_TOKENS)
+        if random.random() < profile["partial_rate"]:
+            cut = random.randint(1, len(REPLY_TOKENS) - 1)
+        for i, tok in enumerate(REPLY_TOKENS):
+            if i == cut:
+                # Drop the connection mid-body: no finish_reason, no [DONE],
+                # an unterminated chunked response.
+                _count(self.server, "partial")
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                self.close_connection = True
+                return
+            if i:
+                time.sleep(profile["token_interval_s"])
+            with self.server.lock:
+                self.server.tokens_sent += 1
+            self._sse({
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": tok if i == 0 else " " + tok}, "finish_reason": None}],
+            })
+        self._sse({
+            "id": cid,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        if usage is not None:
+            self._sse({
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            })
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _sse(self, payload):
+        self._chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, **profile):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.profile = {**DEFAULT_PROFILE, **profile}
+    server.lock = threading.Lock()
+    server.connections = 0  # TCP connections accepted (keep-alive reuse shows up here)
+    server.completions = 0  # chat completion requests received
+    server.prefixes = set()  # prompt-prefix block hashes seen so far
+    server.tokens_sent = 0  # streamed completion tokens actually written
+    server.streams_aborted = 0  # streams the client closed before the end
+    server.errors = 0  # answered with error_status
+    server.rate_limited = 0  # answered 429
+    server.timeouts = 0  # left hanging
+    server.partial = 0  # streams cut off by the stub
+    server.arrivals = deque()  # request times in the last minute, for rpm_limit
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def stub_stats(server) -> dict:
+    with server.lock:
+        return {name: getattr(server, name) for name in COUNTERS}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Local OpenAI-compatible stub server.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8009)
+    p.add_argument("--profile", choices=sorted(PROFILES), help="preset; the flags below override it")
+    for key, default in DEFAULT_PROFILE.items():
+        p.add_argument("--" + key.replace("_", "-"), type=type(default), default=None,
+                       help=f"default {default}")
+    args = p.parse_args()
+
+    profile = dict(PROFILES.get(args.profile, {}))
+    profile.update({k: v for k, v in vars(args).items() if k in DEFAULT_PROFILE and v is not None})
+    server, base_url = start_stub(args.host, args.port, **profile)
+    print(f"Stub listening: OPENAI_API_KEY=sk-stub OPENAI_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# breaker.py — circuit breaker for the LLM backend
+# CLOSED:    calls flow; outcomes land in a sliding window.
+# OPEN:      calls are refused instantly (caller answers offline) until the
+#            next probe time, which backs off exponentially with jitter.
+# HALF_OPEN: exactly one probe call is let through; success closes the
+#            breaker, failure re-opens it with a longer backoff.
+
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = 20,          # outcomes kept for the rates below
+        min_calls: int = 5,        # don't judge on fewer samples than this
+        failure_rate: float = 0.5, # trip when this share of the window failed...
+        slow_call_s: float = 8.0,  # ...or when calls slower than this...
+        slow_rate: float = 0.5,    # ...make up this share of the window
+        open_s: float = 15.0,      # first open period; doubles per re-open
+        max_open_s: float = 120.0,
+        jitter: float = 0.2,       # +/- share of the open period, spreads probes across processes
+        clock=time.monotonic,
+        rng=random.random,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.max_open_s = max_open_s
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._state = CLOSED
+        self._opens = 0          # consecutive opens, drives the backoff
+        self._next_probe = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0        # calls refused while OPEN/HALF_OPEN
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self.clock() >= self._next_probe:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency_s: float = 0.0):
+        self._record(False, latency_s)
+
+    def record_failure(self, latency_s: float = 0.0):
+        self._record(True, latency_s)
+
+    def release(self):
+        # An admitted call abandoned before it had a verdict (cancelled by
+        # the caller): give the HALF_OPEN probe slot back, record nothing.
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _record(self, failed: bool, latency_s: float):
+        slow = latency_s >= self.slow_call_s
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._opens = 0
+                    self._outcomes.clear()
+                return
+            if self._state == OPEN:
+                return  # late result from a call admitted before the trip
+
+            self._outcomes.append((failed, slow))
+            n = len(self._outcomes)
+            if n < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slows = sum(1 for _, s in self._outcomes if s)
+            if failures / n >= self.failure_rate or slows / n >= self.slow_rate:
+                self._trip()
+
+    def _trip(self):
+        self._opens += 1
+        self.trips += 1
+        period = min(self.open_s * 2 ** (self._opens - 1), self.max_open_s)
+        period *= 1 + self.jitter * (2 * self.rng() - 1)
+        self._state = OPEN
+        self._next_probe = self.clock() + period
+        self._outcomes.clear()
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._opens = 0
+            self._outcomes.clear()
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = len(self._outcomes)
+            return {
+                "state": self._state,
+                "calls": n,
+                "failure_rate": (sum(1 for f, _ in self._outcomes if f) / n) if n else 0.0,
+                "retry_in_s": max(0.0, self._next_probe - self.clock()) if self._state == OPEN else 0.0,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,79 @@
+# context.py — token-budgeted prompt assembly
+# Replaces the fixed "last 18 messages" window: the system prompt, the ship
+# telemetry and the Commander's new line are always sent, then as much past
+# history as the budget allows. Oversized messages are clipped (head + tail)
+# instead of crowding out everything older.
+#
+# Layout: [static system] [history...] [telemetry system] [user]. Everything
+# that changes per turn sits at the end, so the provider's prompt cache sees
+# a stable prefix. For that the window's start must stay put too: history is
+# sent from the same first message turn after turn, and only when it no
+# longer fits is old history dropped in one coarse block (down to TRIM_TO of
+# the room), so the prefix then holds again for many turns instead of
+# shifting by a message every turn once the budget is full.
+#
+# Token counts are a rough local estimate (no tokenizer download): one token
+# per word or punctuation mark, plus one per extra 6 characters of long words.
+
+import re
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role + framing per chat message
+REPLY_PRIMING_TOKENS = 3     # assistant turn header the API adds
+TRIM_TO = 0.6  # share of the history room kept when the window overflows
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 + len(w) // 6 for w in _TOKEN_RE.findall(text))
+
+
+def message_tokens(content: str) -> int:
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    est = estimate_tokens(text)
+    if est <= max_tokens:
+        return text
+    # Keep the opening (usually the answer) and the end (usually the ask).
+    keep = int(len(text) * max_tokens / est)
+    head, tail = int(keep * 0.7), int(keep * 0.3)
+    return text[:head].rstrip() + " … [trimmed] … " + text[len(text) - tail:].lstrip()
+
+
+def build_context(system: str, history, user_text: str, budget: int, max_message_tokens: int,
+                  telemetry: str = "", start: int | None = None):
+    # history: oldest-first records with .mid / .role / .content / .packed
+    # (records.Message; mids increase). start: the mid the previous turn's
+    # window began at (None: from the oldest). Returns (messages,
+    # prompt_tokens, start for next turn).
+    used = message_tokens(system) + message_tokens(user_text) + REPLY_PRIMING_TOKENS
+    tail = [{"role": "user", "content": user_text}]
+    if telemetry:
+        used += message_tokens(telemetry)
+        tail.insert(0, {"role": "system", "content": telemetry})
+    room = max(0, budget - used)
+
+    window = [m for m in history if start is None or m.mid >= start]
+    for m in window:
+        # Clipped once per message and limit, memoized on the record (like
+        # Message.block): history is re-sent every turn but never changes.
+        if m.packed is None or m.packed[0] != max_message_tokens:
+            content, tokens = m.content, estimate_tokens(m.content)
+            if tokens > max_message_tokens:
+                content = clip_to_tokens(content, max_message_tokens)
+                tokens = estimate_tokens(content)
+            m.packed = (max_message_tokens, content, tokens + MESSAGE_OVERHEAD_TOKENS)
+    packed = [{"role": m.role, "content": m.packed[1]} for m in window]
+    costs = [m.packed[2] for m in window]
+    total = sum(costs)
+    if total > room:
+        # Overflow: drop the oldest messages down to TRIM_TO of the room.
+        cut = 0
+        while cut < len(costs) and total > room * TRIM_TO:
+            total -= costs[cut]
+            cut += 1
+        window, packed = window[cut:], packed[cut:]
+        start = window[0].mid if window else history[-1].mid + 1
+    return [{"role": "system", "content": system}] + packed + tail, used + total, start
@@ -0,0 +1,377 @@
+# dispatch.py — async LLM dispatch on one shared event loop
+# Completions run as asyncio tasks on a single background loop (one per
+# process, shared by every session) using the SDK's async client, instead of
+# holding a Streamlit script thread for the whole call. The script thread
+# only drains a queue of text deltas.
+#
+# - One in-flight call per session key: submitting again cancels the
+#   previous call, and so does closing its iterator (a Streamlit rerun
+#   interrupts the reply loop, which closes it). Cancelling closes the HTTP
+#   stream, so an abandoned reply stops costing tokens.
+# - Single flight: a request whose normalized payload matches one already in
+#   flight (a class pressing the same button together) joins that call and
+#   gets its token stream fanned out, from the first delta; the call is only
+#   cancelled when its last listener leaves. STATS["coalesced"] counts the
+#   provider calls saved.
+# - Admission goes through scheduler.FairScheduler (requests/min and
+#   tokens/min buckets, in-flight cap, per-session round-robin, Alert mode
+#   first). Callers queue on the loop, not on a thread; a call still queued
+#   after OPENAI_QUEUE_TIMEOUT ends empty and the turn answers offline. A 429
+#   pauses admissions for its Retry-After and re-queues the call instead of
+#   counting against the breaker.
+# - While waiting, the iterator yields "" every HEARTBEAT_S so the UI loop
+#   keeps touching Streamlit and notices a rerun promptly.
+#
+# Env:
+#   OPENAI_MAX_CONCURRENCY   concurrent provider calls per process (default 32)
+#   OPENAI_RPM / OPENAI_TPM  request / token budgets per minute (default 500 / 200000)
+#   OPENAI_QUEUE_TIMEOUT     max seconds a call waits for admission (default 20)
+
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import Iterator
+
+import perf
+from llm import (
+    BACKEND_LEGACY, BREAKER, RETRIES, StreamTally,
+    admit, after_error, build_client, completion_args, completion_text, legacy_chat, record_call, used_tokens,
+)
+from reply_cache import normalize_text
+from scheduler import PRIORITY_NORMAL, FairScheduler
+
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+QUEUE_TIMEOUT_S = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "20"))
+COMPLETION_TOKENS_EST = 300  # charged up front per call, corrected by usage
+RATE_LIMIT_REQUEUES = 2  # 429s absorbed by re-queueing before the turn gives up
+HEARTBEAT_S = 0.25
+
+SCHEDULER = FairScheduler(
+    rpm=float(os.getenv("OPENAI_RPM", "500")),
+    tpm=float(os.getenv("OPENAI_TPM", "200000")),
+    max_concurrency=MAX_CONCURRENCY,
+)
+
+_DONE = object()  # end-of-reply marker on a delta queue
+
+STATS = {"submitted": 0, "coalesced": 0, "completed": 0, "cancelled": 0, "failed": 0,
+         "timed_out": 0, "rate_limited": 0}
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_INFLIGHT = {}  # session key -> (_Flight, its delta queue)
+_FLIGHTS = {}  # flight_key -> _Flight still open to new listeners
+_INFLIGHT_LOCK = threading.Lock()
+
+# Loop-thread only (no locks needed): async clients, admission waiters.
+_ASYNC_CLIENTS = {}
+_WAITERS = {}  # scheduler Ticket -> asyncio.Future set on admission
+_PUMP = None  # pending loop.call_later handle for the next bucket refill
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    if _LOOP is None:
+        with _LOOP_LOCK:
+            if _LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-dispatch", daemon=True).start()
+                _LOOP = loop
+    return _LOOP
+
+
+def submit(key: str, messages, stream: bool = True, prompt_tokens: int = 0,
+           priority: int = PRIORITY_NORMAL) -> Iterator[str] | None:
+    # None when there is no backend or the breaker refuses (caller answers
+    # offline). Otherwise an iterator of text deltas; it may end empty if the
+    # call fails or times out in the queue, which callers already treat as
+    # "fall back offline".
+    backend = admit()
+    if backend is None:
+        return None
+    cancel(key)
+    fkey = flight_key(backend, messages, stream)
+    sub = queue.SimpleQueue()
+    with _INFLIGHT_LOCK:
+        STATS["submitted"] += 1
+        flight = _FLIGHTS.get(fkey)
+        if flight is not None:
+            # Same payload already in flight: ride along instead of calling.
+            STATS["coalesced"] += 1
+            for delta in flight.buffer:
+                sub.put(delta)
+            flight.subs.append(sub)
+            _INFLIGHT[key] = (flight, sub)
+    if flight is not None:
+        BREAKER.release()  # the admission we took above isn't used
+        return _drain(key, flight, sub)
+
+    flight = _Flight(fkey)
+    flight.subs.append(sub)
+    with _INFLIGHT_LOCK:
+        _FLIGHTS[fkey] = flight
+        _INFLIGHT[key] = (flight, sub)
+    job = _run(backend, key, messages, stream, prompt_tokens + COMPLETION_TOKENS_EST, priority, flight)
+    flight.fut = asyncio.run_coroutine_threadsafe(job, get_loop())
+    return _drain(key, flight, sub)
+
+
+def flight_key(backend: dict, messages, stream: bool) -> str:
+    # Identical requests modulo case, whitespace and trailing punctuation.
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((backend["key"][1:], stream)).encode("utf-8"))
+    for m in messages:
+        h.update(b"\0" + m["role"].encode("utf-8") + b"\0" + normalize_text(m["content"]).encode("utf-8"))
+    return h.hexdigest()
+
+
+def cancel(key: str) -> bool:
+    # Detaches this session from its call; the call itself is cancelled once
+    # no session is listening to it any more.
+    with _INFLIGHT_LOCK:
+        entry = _INFLIGHT.pop(key, None)
+    return entry is not None and _detach(key, *entry)
+
+
+def dispatch_stats() -> dict:
+    with _INFLIGHT_LOCK:
+        stats = dict(STATS)
+    stats.update(SCHEDULER.stats())
+    return stats
+
+
+class _Flight:
+    # One provider call and everyone waiting on it. Deltas are kept so a
+    # session joining mid-stream gets the reply from the start.
+    __slots__ = ("key", "fut", "subs", "buffer", "done", "complete")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.fut = None
+        self.subs = []  # one SimpleQueue per listening session
+        self.buffer = []
+        self.done = False
+        self.complete = False  # the provider finished the reply (set before _DONE)
+
+    def put(self, item):
+        with _INFLIGHT_LOCK:
+            if item is _DONE:
+                self.done = True
+                if _FLIGHTS.get(self.key) is self:
+                    del _FLIGHTS[self.key]
+            else:
+                self.buffer.append(item)
+            for sub in self.subs:
+                sub.put(item)
+
+
+def _drain(key: str, flight: _Flight, sub: queue.SimpleQueue) -> Iterator[str]:
+    # Returns (as llm.stream_openai_chat's iterator does) whether the reply
+    # was complete.
+    try:
+        while True:
+            try:
+                item = sub.get(timeout=HEARTBEAT_S)
+            except queue.Empty:
+                if flight.fut is not None and flight.fut.done() and sub.empty():
+                    return False  # cancelled before the task ever ran
+                yield ""
+                continue
+            if item is _DONE:
+                return flight.complete
+            yield item
+    finally:
+        _detach(key, flight, sub)
+
+
+def _detach(key: str, flight: _Flight, sub: queue.SimpleQueue) -> bool:
+    with _INFLIGHT_LOCK:
+        if _INFLIGHT.get(key) == (flight, sub):
+            del _INFLIGHT[key]
+        if sub not in flight.subs:
+            return False
+        flight.subs.remove(sub)
+        last = not flight.subs
+        if last and _FLIGHTS.get(flight.key) is flight:
+            del _FLIGHTS[flight.key]  # nobody may join a call about to be cancelled
+    if last and flight.fut is not None:
+        flight.fut.cancel()  # no-op once finished
+    return True
+
+
+perf.register_collector("dispatch", dispatch_stats)
+
+
+def _count(name: str, delta: int = 1):
+    with _INFLIGHT_LOCK:
+        STATS[name] += delta
+
+
+def _client(backend: dict):
+    api_key, base_url, model = backend["key"]
+    client = _ASYNC_CLIENTS.get(backend["key"])
+    if client is None:
+        client = _ASYNC_CLIENTS[backend["key"]] = build_client(api_key, base_url, asynchronous=True)
+    return client
+
+
+def _pump():
+    # Loop thread: wake every ticket the scheduler admits now, and come back
+    # when the buckets will have refilled enough for the next one.
+    global _PUMP
+    if _PUMP is not None:
+        _PUMP.cancel()
+        _PUMP = None
+    for ticket in SCHEDULER.admit():
+        waiter = _WAITERS.pop(ticket, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        else:
+            SCHEDULER.release(ticket)  # its caller gave up meanwhile
+    wake = SCHEDULER.next_wakeup()
+    if wake is not None:
+        _PUMP = asyncio.get_running_loop().call_later(wake + 0.001, _pump)
+
+
+async def _admitted(key: str, tokens: int, priority: int, deadline: float):
+    # The scheduler ticket once admitted; None if the queue timeout ran out.
+    ticket = SCHEDULER.enqueue(key, tokens, priority)
+    waiter = _WAITERS[ticket] = asyncio.get_running_loop().create_future()
+    _pump()
+    try:
+        await asyncio.wait_for(waiter, max(0.0, deadline - time.monotonic()))
+        return ticket
+    except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+        _WAITERS.pop(ticket, None)
+        SCHEDULER.cancel(ticket)
+        _pump()
+        if isinstance(exc, asyncio.CancelledError):
+            raise
+        return None
+
+
+class _RateLimited(Exception):
+    def __init__(self, retry_after_s: float):
+        self.retry_after_s = retry_after_s
+
+
+async def _run(backend: dict, key: str, messages, stream: bool, tokens: int, priority: int,
+               out: "_Flight"):
+    verdict = False  # did the breaker get a success/failure for this call
+    deadline = time.monotonic() + QUEUE_TIMEOUT_S
+    try:
+        for requeue in range(RATE_LIMIT_REQUEUES + 1):
+            queued = time.monotonic()
+            ticket = await _admitted(key, tokens, priority, deadline)
+            perf.record("llm_queue", time.monotonic() - queued)
+            if ticket is None:
+                _count("timed_out")
+                return
+            used = None
+            try:
+                # Timed from admission: queueing is ours, not the provider's.
+                used = await _call(backend, messages, stream, out, time.monotonic())
+                verdict = True
+                return
+            except _RateLimited as exc:
+                _count("rate_limited")
+                SCHEDULER.throttle(exc.retry_after_s)
+            finally:
+                SCHEDULER.release(ticket, used)
+                _pump()
+        # Still rate limited after re-queueing: that is a failed call.
+        BREAKER.record_failure()
+        verdict = True
+        _count("failed")
+    except asyncio.CancelledError:
+        _count("cancelled")
+        raise
+    except Exception:
+        # Unexpected (say a response with no choices): _call raises only
+        # before it has judged the call, so this is the failure verdict.
+        BREAKER.record_failure()
+        verdict = True
+        _count("failed")
+    finally:
+        if not verdict:
+            # Timed out in the queue or cancelled: hand the admission back,
+            # or a HALF_OPEN probe slot stays taken and nothing gets through.
+            BREAKER.release()
+        out.put(_DONE)
+
+
+async def _call(backend: dict, messages, stream: bool, out: "_Flight", t0: float) -> int | None:
+    # One admitted provider call; returns the tokens it used (if reported).
+    if backend["kind"] == BACKEND_LEGACY:
+        text, error = await asyncio.get_running_loop().run_in_executor(None, legacy_chat, backend, messages)
+        record_call(text is not None, t0, error)
+        perf.record("llm", time.monotonic() - t0)
+        if text:
+            out.complete = True
+            out.put(text)
+        _count("completed" if text else "failed")
+        return None
+
+    resp, error = await _create(backend, messages, stream)
+    if resp is None:
+        record_call(False, t0, error)
+        _count("failed")
+        return None
+    if not stream:
+        text = completion_text(resp, t0)
+        record_call(text is not None, t0)
+        perf.record("llm", time.monotonic() - t0)
+        if text:
+            out.complete = True
+            out.put(text)
+        _count("completed")
+        return used_tokens(getattr(resp, "usage", None))
+
+    # Judged on time-to-open, as in llm.stream_openai_chat.
+    record_call(True, t0)
+    tally = StreamTally(t0)
+    dropped = False
+    try:
+        async for chunk in resp:
+            delta = tally.delta(chunk)
+            if delta:
+                out.put(delta)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        dropped = True
+    finally:
+        try:
+            await resp.close()
+        except Exception:
+            pass  # the connection is gone either way
+    out.complete = tally.end(dropped)
+    _count("completed" if out.complete else "failed")
+    return tally.used
+
+
+def _retry_after_s(exc: Exception) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 1.0)))
+    except ValueError:
+        return 1.0
+
+
+async def _create(backend: dict, messages, stream: bool):
+    # (response, "") or (None, the error class), as llm._create.
+    client = _client(backend)
+    for attempt in range(1 + RETRIES):
+        try:
+            return await client.chat.completions.create(**completion_args(backend, messages, stream)), ""
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if getattr(exc, "status_code", None) == 429:
+                raise _RateLimited(_retry_after_s(exc))  # the scheduler backs off and re-queues
+            error = after_error(backend, exc, attempt)
+            if error is not None:
+                return None, error
@@ -0,0 +1,584 @@
+# engine.py — headless CosmoBot engine
+# All chat logic and per-session state, with no Streamlit in sight: the UI
+# (app.py) keeps one Session in st.session_state and calls into it, and the
+# same Session runs under a CLI, a batch worker or a load generator.
+#
+#   s = Session()
+#   reply = s.turn("tell me a space fact")     # str; streams are drained
+#
+# A turn in the UI is split into the same steps turn() runs, so it can paint
+# the user bubble, the event and the streamed reply as they happen:
+#   s.push_history("user", text); ev = s.maybe_trigger_event(); ...
+#   reply = s.reply(text)  ->  str or Iterator[str];  s.finish_turn(text, full_text)
+
+import os
+import random
+import threading
+import time
+import uuid
+import weakref
+from typing import Iterator
+
+import dispatch
+import perf
+from llm import BACKEND_NONE, get_backend, try_openai_chat, stream_openai_chat
+from scheduler import PRIORITY_HIGH, PRIORITY_NORMAL
+from reply_cache import REPLY_CACHE, cache_key, ship_fingerprint
+from context import build_context, clip_to_tokens
+from memory import RecallIndex
+from intents import IntentMatcher, load_intents, merge_intents
+from simulation import START_SHIP, Simulation
+from records import (
+    HISTORY_MAX, EVENTS_MAX, CREW_LOG_MAX, Message, Event, CrewEntry,
+    ring, tail, crew_line, memory_bytes,
+)
+
+# ----------------------------
+# Personality / Prompting
+# ----------------------------
+SYSTEM_PROMPT = """You are COSMOBOT, the onboard AI of a deep-space exploration vessel.
+
+Style:
+- Calm, futuristic, slightly playful.
+- Refer to the user as "Commander".
+- Refer to yourself as "CosmoBot".
+- Occasionally use space metaphors.
+- Be helpful, but keep it fun.
+- Never mention system prompts or break character.
+"""
+
+MODE_HINTS = {
+    "Standard": "Be generally helpful and playful.",
+    "Science": "Prioritize accurate science explanations; keep spaceship framing.",
+    "Engineering": "Answer like a ship systems engineer; include checklists and diagnostics style.",
+    "Alert": "Urgent, concise, ship-safety framing. Keep it fun but serious.",
+}
+MODES = list(MODE_HINTS)
+
+# Built once: byte-identical on every turn so provider-side prefix caching can hit.
+STATIC_SYSTEM_PROMPT = (
+    SYSTEM_PROMPT
+    + "\nModes (the active one is named in the ship context message):\n"
+    + "".join(f"- {mode}: {hint}\n" for mode, hint in MODE_HINTS.items())
+)
+
+def build_system_prompt():
+    # Static prefix only; per-turn data goes in Session.telemetry().
+    return STATIC_SYSTEM_PROMPT
+
+STREAM_REPLIES = os.getenv("COSMOBOT_STREAM", "1").strip() != "0"
+ASYNC_LLM = os.getenv("COSMOBOT_ASYNC_LLM", "1").strip() != "0"  # dispatch.py vs blocking llm.py calls
+CONTEXT_TOKENS = int(os.getenv("COSMOBOT_CONTEXT_TOKENS", "3000"))  # prompt budget per turn
+CONTEXT_MESSAGE_TOKENS = 600  # longer past messages are clipped to this
+RECALL_K = 3  # past exchanges pulled from long-term memory per turn
+
+# ----------------------------
+# Offline Toy Brain (fallback)
+# ----------------------------
+STARFACTS = [
+    "A day on Venus is longer than a year on Venus.",
+    "Neutron stars can spin hundreds of times per second.",
+    "There are more stars in the observable universe than grains of sand on Earth’s beaches (roughly speaking).",
+    "A teaspoon of neutron star material would weigh billions of tons on Earth.",
+    "Jupiter’s Great Red Spot is a storm larger than Earth.",
+]
+MISSION_SNIPPETS = [
+    "Plot a safe course around the ion storm.",
+    "Calibrate the star tracker and confirm attitude hold.",
+    "Run diagnostics on the thermal shielding.",
+    "Scan for biosignatures in the target sector.",
+    "Map asteroid fragments for resource harvesting.",
+]
+SCAN_RESULTS = [
+    "No anomalies detected. Cosmic background radiation within expected parameters.",
+    "Minor electromagnetic interference. Suggest shielding check on bay 2.",
+    "Spectral spike observed. Possible ion pocket ahead — recommend course adjustment.",
+    "Debris field detected at medium range. Activating avoidance guidance.",
+]
+ENGINEERING_CHECKS = [
+    "Run propulsion coil impedance check.",
+    "Verify thermal loop pressure and radiator duty cycle.",
+    "Confirm inertial nav bias estimates are within tolerance.",
+    "Inspect comms antenna gimbal limits and cable strain relief.",
+]
+
+# Declarative intent table (see intents.py); first match wins. Extra intents
+# and pools: COSMOBOT_INTENTS=/path/to/intents.json.
+INTENT_POOLS = {
+    "starfacts": STARFACTS,
+    "missions": MISSION_SNIPPETS,
+    "scans": SCAN_RESULTS,
+    "checks": ENGINEERING_CHECKS,
+}
+OFFLINE_INTENTS = [
+    {"name": "greeting", "words": ["hello", "hi", "hey", "yo", "greetings"],
+     "replies": ["Greetings, Commander. CosmoBot online. Instruments are nominal. What’s our mission?"]},
+    {"name": "mission", "stems": ["mission", "quest"],
+     "replies": ["Commander, mission packet generated: **{missions}**. Awaiting confirmation."]},
+    {"name": "scan", "stems": ["scan", "sweep"],
+     "replies": ["Initiating sensor sweep… ✅  \n**Scan:** {scans}"]},
+    {"name": "joke", "stems": ["joke"],
+     "replies": ["Commander, a joke from the cosmic archives: Why don’t stars ever get lost? Because they always *follow their constellation.*"]},
+    {"name": "fact", "stems": ["fact", "space"],
+     "replies": ["Scanning cosmic archives… ✅  \n**Space Fact:** {starfacts}"]},
+    {"name": "status", "stems": ["status", "diagnostic"],
+     "replies": ["Ship status: **Green across all systems**. Propulsion stable. Comms clear. Coffee… unfortunately not installed."]},
+    {"name": "engineering", "stems": ["checklist", "engineering"],
+     "replies": ["🛠️ Commander, engineering checklist queued:\n- {checks}\n- {checks}\n- {checks}"]},
+    {"name": "identity", "phrases": ["who are you", "your name"],
+     "replies": ["I am **CosmoBot**, the ship’s onboard intelligence. You are the Commander. Together, we keep the void politely organized."]},
+]
+OFFLINE_FALLBACK = ("Understood, Commander. I’m running a quick simulation… "
+                    "If you want richer responses, add an API key in settings. Otherwise, try /mission, /scan, /status, or /joke.")
+
+
+def _compile_offline_brain() -> IntentMatcher:
+    extra, pools = load_intents(os.getenv("COSMOBOT_INTENTS"))
+    return IntentMatcher(merge_intents(OFFLINE_INTENTS, extra), {**INTENT_POOLS, **pools})
+
+
+OFFLINE_BRAIN = _compile_offline_brain()
+
+
+@perf.timed("offline")
+def offline_response(user_text: str, rng=random) -> str:
+    return OFFLINE_BRAIN.respond(user_text, rng) or OFFLINE_FALLBACK
+
+# ----------------------------
+# Command Palette
+# ----------------------------
+# One declaration per slash command; the dispatcher, argument checking,
+# /help text and the UI's palette entries are all derived from COMMANDS.
+# Several commands can be chained with ";" ("/scan; /status; /mode alert"):
+# they run in order as one turn with one combined reply, so a scripted
+# operator pays one rerun for the batch instead of one per command.
+PIPE = ";"
+MAX_PIPELINE = 8  # commands per chained input; the rest are dropped
+
+
+class Command:
+    __slots__ = ("name", "summary", "handler", "arg", "choices")
+
+    def __init__(self, name: str, summary: str, handler, arg: str | None = None, choices=()):
+        self.name = name  # "/mode"
+        self.summary = summary
+        self.handler = handler  # handler(session) or, with an arg, handler(session, value or None)
+        self.arg = arg  # label of the single optional argument ("Mode")
+        self.choices = tuple(choices)  # allowed argument values, lowercase
+
+
+COMMANDS = {}  # "/name" -> Command, in /help and palette order
+
+
+def command(name: str, summary: str, arg: str | None = None, choices=()):
+    def register(fn):
+        COMMANDS[name] = Command(name, summary, fn, arg, choices)
+        return fn
+    return register
+
+
+def run_command(session, text: str) -> str:
+    # One command ("/mode alert"); extra words after the argument are ignored.
+    parts = text.split()
+    cmd = COMMANDS.get(parts[0].lower()) if parts else None
+    if cmd is None:
+        return "Command not recognized, Commander. Try `/help`."
+    if cmd.arg is None:
+        return cmd.handler(session)
+    value = parts[1].lower() if len(parts) > 1 else None
+    if value is not None and cmd.choices and value not in cmd.choices:
+        return f"{cmd.arg} not recognized, Commander. Valid: {' | '.join(cmd.choices)}."
+    return cmd.handler(session, value)
+
+
+def command_help():
+    lines = []
+    for cmd in COMMANDS.values():
+        if cmd.choices:
+            keys = " | ".join(f"<kbd>{cmd.name} {c}</kbd>" for c in cmd.choices)
+        else:
+            keys = f"<kbd>{cmd.name}</kbd>"
+        lines.append(f"- {keys} — {cmd.summary}  \n")
+    return (
+        "**Command Palette**  \n"
+        + "".join(lines)
+        + f"- <kbd>/scan{PIPE} /status</kbd> — chain up to {MAX_PIPELINE} commands in one go  \n"
+        "\nTip: Ask normal questions too — CosmoBot stays in character."
+    )
+
+
+def command_palette() -> dict:
+    # Dropdown label -> command text, one entry per command (or per choice).
+    entries = {}
+    for cmd in COMMANDS.values():
+        for c in cmd.choices or (None,):
+            text = f"{cmd.name} {c}" if c else cmd.name
+            entries[text if c else f"{text} — {cmd.summary}"] = text
+    return entries
+
+
+MODE_BY_NAME = {m.lower(): m for m in MODES}
+
+
+@command("/help", "show this list")
+def _help(s):
+    return command_help()
+
+
+@command("/status", "show ship readout")
+def _status(s):
+    return f"Commander, reporting in.  \n{s.format_status()}"
+
+
+@command("/mission", "generate a mission packet")
+def _mission(s):
+    return f"Commander, mission packet generated: **{s.rng.choice(MISSION_SNIPPETS)}**. Awaiting confirmation."
+
+
+@command("/scan", "run a sensor sweep")
+def _scan(s):
+    return f"Initiating sensor sweep… ✅  \n**Scan:** {s.rng.choice(SCAN_RESULTS)}"
+
+
+@command("/mode", "switch ship mode", arg="Mode", choices=MODE_BY_NAME)
+def _mode(s, target):
+    if target is None:
+        return f"Commander, current mode is **{s.mode}**. Try: `/mode science`."
+    s.mode = MODE_BY_NAME[target]
+    return f"Mode shift complete, Commander. **{s.mode}** engaged."
+
+
+@command("/perf", "timing percentiles and counters")
+def _perf(s):
+    return perf.report_markdown()
+
+
+@command("/event", "force a ship event (demo)")
+def _event(s):
+    ev = s.maybe_trigger_event(force=True)
+    return ev if ev else "Event generator idle, Commander."
+
+
+@command("/clear", "clear chat")
+def _clear(s):
+    s.clear_history()
+    return "Crew channel wiped clean, Commander. Fresh console ready."
+
+
+def clip(s: str, n: int = 90):
+    s = s.strip().replace("\n", " ")
+    return s if len(s) <= n else (s[:n] + "…")
+
+# ----------------------------
+# Session
+# ----------------------------
+_LIVE = weakref.WeakValueDictionary()  # sid -> Session some tab still holds (Session.attach)
+_LIVE_LOCK = threading.Lock()
+
+
+def _release_ship_fp(box: list):
+    # Session finalizer: a dropped console no longer keeps its ship state's
+    # reply cache entries (or its reference count) alive.
+    if box[0] is not None:
+        REPLY_CACHE.ship_released(box[0])
+
+
+class Session:
+    # Everything one Commander's console knows. `store` is an optional
+    # store.SessionStore (every change is appended to it); `rng` makes
+    # events and offline replies reproducible; `llm=False` skips the
+    # provider entirely (offline brain only); `async_llm` sends calls through
+    # dispatch.py's shared event loop instead of blocking the caller.
+    # `clock` is the ship's time source (simulation.py); pass a fake one with
+    # a seeded rng to replay a voyage.
+    SETTINGS = ("mode", "ship_state", "use_crew_log", "sound", "event_rate")
+
+    def __init__(self, sid: str | None = None, store=None, rng: random.Random | None = None,
+                 llm: bool = True, stream: bool = STREAM_REPLIES, async_llm: bool = ASYNC_LLM,
+                 clock=time.time):
+        self.sid = sid or uuid.uuid4().hex
+        self.store = store
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.llm = llm
+        self.stream = stream
+        self.async_llm = async_llm
+
+        self.history = ring(HISTORY_MAX)  # chat: Message(role "user"/"assistant", content, ts)
+        self.mode = "Standard"
+        self.ship_state = dict(START_SHIP)
+        self.use_crew_log = True
+        self.crew_log = ring(CREW_LOG_MAX)  # CrewEntry: clipped lines
+        self.recall = RecallIndex()  # long-term memory: every exchange, BM25-indexed
+        self.sound = True
+        self.events = ring(EVENTS_MAX)  # Event
+        self.event_rate = 0.18  # chance per message
+        self.last_event = ""
+        self.sim = Simulation(self.rng, clock())
+        self.prompt_tokens = 0  # estimated size of the last LLM prompt
+        self.context_start = None  # mid the prompt's history window starts at (context.py)
+        # ship_state fingerprint last reported to the reply cache, boxed so the
+        # finalizer releases the latest one when the session is dropped.
+        self.ship_fp = [None]
+        weakref.finalize(self, _release_ship_fp, self.ship_fp).atexit = False
+        self.persisted_settings = {}
+
+    @classmethod
+    def attach(cls, sid: str, store, **kwargs) -> "Session":
+        # The one Session for this sid: the live one if another tab (or a
+        # refresh inside Streamlit's reconnect grace) still holds it, else
+        # reloaded from the store, else new. Two Session objects on one sid
+        # would interleave their rows and reload as one merged conversation.
+        with _LIVE_LOCK:
+            s = _LIVE.get(sid)
+            if s is None:
+                s = _LIVE[sid] = cls.load(sid, store, **kwargs) or cls(sid, store, **kwargs)
+            return s
+
+    @classmethod
+    def load(cls, sid: str, store, **kwargs) -> "Session | None":
+        # Rebuilds a session from the store; None if the store never saw it.
+        saved = store.load(sid) if store else None
+        if not saved:
+            return None
+        s = cls(sid, store, **kwargs)
+        s.history.extend(Message(m["role"], m["content"], m["ts"]) for m in saved["history"])
+        s.events.extend(Event(e["text"], e["ts"]) for e in saved["events"])
+        s.last_event = saved["last_event"]
+        for k, v in saved["settings"].items():
+            if k in cls.SETTINGS:
+                setattr(s, k, v)
+        for x in saved["exchanges"]:
+            if not x["user"].startswith("/"):
+                s.recall.add(x["user"], x["bot"])
+            if x["crew"]:
+                s.crew_log.append(CrewEntry("Commander", x["user_clip"], x["ts"]))
+                s.crew_log.append(CrewEntry("CosmoBot", x["bot_clip"], x["ts"]))
+        s.persisted_settings = saved["settings"]
+        return s
+
+    # -- persistence --
+    def persist(self, kind: str, data: dict):
+        if self.store:
+            self.store.append(self.sid, kind, data)
+
+    def settings(self) -> dict:
+        return {
+            "mode": self.mode,
+            "ship_state": dict(self.ship_state),
+            "use_crew_log": self.use_crew_log,
+            "sound": self.sound,
+            "event_rate": self.event_rate,
+        }
+
+    def persist_settings(self):
+        # One row per actual change; called after every turn, and by the UI
+        # once per rerun after the widgets ran.
+        current = self.settings()
+        if current != self.persisted_settings:
+            self.persist("settings", current)
+            self.persisted_settings = current
+
+    # -- records --
+    def add_event(self, text: str, ts: float | None = None):
+        ev = Event(text, ts)
+        self.events.append(ev)
+        self.last_event = text
+        self.persist("event", {"text": text, "ts": ev.ts})
+
+    def push_history(self, role: str, content: str):
+        msg = Message(role, content)
+        self.history.append(msg)
+        self.persist("history", {"role": role, "content": content, "ts": msg.ts})
+
+    def push_crew_log(self, user_text: str, bot_text: str):
+        if not user_text.strip().startswith("/"):
+            self.recall.add(user_text, bot_text)
+        stamp = time.time()
+        self.persist("exchange", {
+            "user": user_text, "bot": bot_text, "ts": stamp, "crew": self.use_crew_log,
+            "user_clip": clip(user_text), "bot_clip": clip(bot_text),
+        })
+        if not self.use_crew_log:
+            return
+        self.crew_log.append(CrewEntry("Commander", clip(user_text), stamp))
+        self.crew_log.append(CrewEntry("CosmoBot", clip(bot_text), stamp))
+
+    def clear_history(self):
+        self.history.clear()
+        self.last_event = ""
+        self.persist("clear", {"what": "history"})
+
+    def clear_crew_log(self):
+        self.crew_log.clear()
+        self.recall.clear()
+        self.persist("clear", {"what": "crew"})
+
+    def memory_bytes(self) -> int:
+        return (memory_bytes(self.history) + memory_bytes(self.events) + memory_bytes(self.crew_log)
+                + self.recall.memory_bytes())
+
+    # -- prompting --
+    def telemetry(self, user_text: str = ""):
+        # Sent as a trailing system message, after the chat history, so the
+        # cacheable prefix (persona + modes + history) stays byte-identical.
+        ship = self.ship_state
+        crew = ""
+        if self.use_crew_log and self.crew_log:
+            crew = "\n\nCrew Log (short-term memory):\n- " + "\n- ".join(crew_line(e) for e in tail(self.crew_log, 10))
+        if self.use_crew_log and user_text:
+            # The last 5 exchanges are already in the crew log above.
+            hits = self.recall.search(user_text, k=RECALL_K, skip_recent=5)
+            if hits:
+                crew += "\n\nRelevant earlier exchanges (long-term memory):\n- " + "\n- ".join(
+                    f"Commander: {clip_to_tokens(u, 40)} / CosmoBot: {clip_to_tokens(b, 80)}" for _, u, b in hits
+                )
+        ev = ""
+        if self.last_event:
+            ev = f"\n\nRecent ship event:\n- {self.last_event}\n"
+        return (
+            "Current ship context:\n"
+            f"- Alert level: {ship['alert']}\n"
+            f"- Sector: {ship['sector']}\n"
+            f"- Fuel: {ship['fuel']}%\n"
+            f"- Comms: {ship['comms']}\n"
+            + f"\nMode directive: {self.mode} — {MODE_HINTS[self.mode]}\n"
+            + ev
+            + crew
+        )
+
+    def format_status(self):
+        s = self.ship_state
+        return (
+            f"**Ship Status**  \n"
+            f"- Alert: **{s['alert']}**  \n"
+            f"- Sector: **{s['sector']}**  \n"
+            f"- Fuel: **{s['fuel']}%**  \n"
+            f"- Comms: **{s['comms']}**  \n"
+            f"- Mode: **{self.mode}**  \n"
+            f"- Crew Log: **{'ON' if self.use_crew_log else 'OFF'}**  \n"
+            f"- Event Rate: **{int(self.event_rate * 100)}% / message**"
+        )
+
+    # -- ship events --
+    def tick(self) -> int:
+        # Brings the ship up to now (fuel, recoveries, ambient events); the
+        # UI calls it on every rerun. Returns how many events fired.
+        self.sim.ambient_on = self.event_rate > 0  # the event-rate slider at 0 stops every event
+        fired = self.sim.advance(self.ship_state, self.clock())
+        for ts, event in fired:
+            self.add_event(event["log"].format(**self.ship_state), ts)
+        return len(fired)
+
+    def maybe_trigger_event(self, force: bool = False) -> str | None:
+        self.tick()
+        if not force and self.rng.random() > self.event_rate:
+            return None
+        event = self.sim.trigger(self.ship_state)
+        self.add_event(event["log"].format(**self.ship_state))
+        return event["message"]
+
+    # -- commands --
+    @perf.timed("command")
+    def run_command(self, text: str) -> str:
+        # A command or a ";"-chained pipeline of them; a pipeline's replies
+        # come back as one message, each under its command.
+        steps = [p.strip() for p in text.split(PIPE) if p.strip()][:MAX_PIPELINE]
+        if len(steps) <= 1:
+            return run_command(self, steps[0] if steps else "")
+        return "\n\n".join(f"**{step}**  \n{run_command(self, step)}" for step in steps)
+
+    # -- core reply --
+    def reply(self, user_text: str) -> str | Iterator[str]:
+        # Commands
+        if user_text.strip().startswith("/"):
+            return self.run_command(user_text)
+
+        # No backend (no key, no SDK, or disabled by a fatal error): no prompt
+        # to build and nothing to look up, the offline brain answers.
+        if not self.llm or get_backend()["kind"] == BACKEND_NONE:
+            return self.offline_reply(user_text)
+
+        # The chat path records the Commander's line (and any ship event after it)
+        # before replying; it is sent once, as the final user message.
+        past = list(self.history)
+        for i in range(len(past) - 1, max(len(past) - 3, -1), -1):
+            if past[i].role == "user" and past[i].content == user_text:
+                del past[i]
+                break
+
+        with perf.span("prompt"):
+            messages, self.prompt_tokens, self.context_start = build_context(
+                build_system_prompt(), past, user_text,
+                telemetry=self.telemetry(user_text),
+                budget=CONTEXT_TOKENS,
+                max_message_tokens=CONTEXT_MESSAGE_TOKENS,
+                start=self.context_start,
+            )
+
+        # Repeated question in an opted-in mode: no round trip. The rest of the
+        # prompt (history, crew log, recall hits, last event) is in the key, so
+        # only consoles whose prompts match exactly share a reply.
+        key = None
+        if REPLY_CACHE.enabled_for(self.mode):
+            self.sync_ship_fingerprint()
+            key = cache_key(self.mode, self.ship_state, user_text, context=messages[:-1])
+            cached = REPLY_CACHE.get(key)
+            if cached is not None:
+                return cached
+
+        if self.async_llm:
+            # Supersedes (cancels) this session's previous call if still running.
+            llm = dispatch.submit(
+                self.sid, messages, stream=self.stream, prompt_tokens=self.prompt_tokens,
+                priority=PRIORITY_HIGH if self.mode == "Alert" else PRIORITY_NORMAL,
+            )
+        else:
+            llm = stream_openai_chat(messages) if self.stream else try_openai_chat(messages)
+        if llm and key is not None:
+            if isinstance(llm, str):
+                REPLY_CACHE.put(key, llm)
+            else:
+                llm = REPLY_CACHE.put_stream(key, llm)
+        if llm:
+            return llm
+        return self.offline_reply(user_text)
+
+    def cancel(self) -> bool:
+        # Drops this session's in-flight LLM call, if any (async dispatch only).
+        return dispatch.cancel(self.sid)
+
+    def sync_ship_fingerprint(self):
+        # Reply cache invalidation hook: tell the cache when this session's ship_state moved.
+        fp = ship_fingerprint(self.ship_state)
+        if fp != self.ship_fp[0]:
+            REPLY_CACHE.ship_changed(self.ship_fp[0], fp)
+            self.ship_fp[0] = fp
+
+    def offline_reply(self, user_text: str) -> str:
+        base = offline_response(user_text, self.rng)
+        if self.mode == "Alert":
+            return "🚨 **ALERT MODE ACTIVE**  \n" + base
+        if self.mode == "Engineering":
+            return "🛠️ **ENGINEERING CONSOLE**  \n" + base
+        if self.mode == "Science":
+            return "🌌 **SCIENCE ARRAY ONLINE**  \n" + base
+        return base
+
+    def finish_turn(self, user_text: str, reply_text: str):
+        self.push_history("assistant", reply_text)
+        self.push_crew_log(user_text, reply_text)
+        self.persist_settings()  # /mode, ship changes: headless sessions have no UI to do it
+
+    def turn(self, user_text: str) -> tuple[str | None, str]:
+        # One full exchange, as typed into the chat input: returns
+        # (ship event message or None, reply text).
+        self.push_history("user", user_text)
+        event_msg = self.maybe_trigger_event()
+        if event_msg:
+            self.push_history("assistant", event_msg)
+        reply = self.reply(user_text)
+        if not isinstance(reply, str):
+            reply = "".join(reply) or self.offline_reply(user_text)
+        self.finish_turn(user_text, reply)
+        return event_msg, reply
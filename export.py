@@ -0,0 +1,189 @@
+# export.py — Captain's Log export (.txt / .jsonl, optionally gzipped)
+# Every format is a generator of lines, and gzip/encoding wrap those
+# generators chunk by chunk, so an export never exists as one big string:
+# a download writes straight into the buffer it hands to Streamlit, and the
+# bulk job writes straight to disk.
+#
+# Bulk export from the session store (the compliance job), one file per session:
+#   python export.py --db cosmobot.db --out exports/ [--format jsonl] [--gzip] [--sid SID ...]
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import zlib
+from typing import Iterable, Iterator
+
+from records import fmt_ts, event_line, crew_line
+
+FORMATS = {  # name -> (mime, extension)
+    "txt": ("text/plain", ".txt"),
+    "jsonl": ("application/x-ndjson", ".jsonl"),
+}
+GZIP_MIME = "application/gzip"
+CHUNK_BYTES = 64 * 1024  # encoded bytes buffered before a write
+
+
+def _json_line(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+# ----------------------------
+# Live session (what the sidebar download exports)
+# ----------------------------
+def iter_txt(ship: dict, mode: str, events: Iterable, history: Iterable, crew: Iterable | None,
+             generated: float | None = None) -> Iterator[str]:
+    yield "HANNAH — Captain’s Log\n"
+    yield "======================\n"
+    yield f"Generated: {fmt_ts(time.time() if generated is None else generated)}\n\n"
+    yield "Ship Snapshot\n-------------\n"
+    yield f"Alert: {ship['alert']}\nSector: {ship['sector']}\nFuel: {ship['fuel']}%\nComms: {ship['comms']}\n"
+    yield f"Mode: {mode}\n\n"
+
+    yield "Events\n------\n"
+    empty = True
+    for e in events:
+        empty = False
+        yield event_line(e) + "\n"
+    if empty:
+        yield "(none)\n"
+    yield "\n"
+
+    yield "Conversation\n------------\n"
+    empty = True
+    for m in history:
+        empty = False
+        role = "Commander" if m.role == "user" else "CosmoBot"
+        yield f"[{fmt_ts(m.ts)}] {role}: {m.content}\n"
+    if empty:
+        yield "(empty)\n"
+    yield "\n"
+
+    yield "Crew Log\n--------\n"
+    empty = True
+    for e in crew or ():
+        empty = False
+        yield crew_line(e) + "\n"
+    if empty:
+        yield "(disabled or empty)\n"
+
+
+def iter_jsonl(ship: dict, mode: str, events: Iterable, history: Iterable, crew: Iterable | None,
+               generated: float | None = None) -> Iterator[str]:
+    yield _json_line({"type": "ship", "generated": time.time() if generated is None else generated,
+                      "mode": mode, **ship})
+    for e in events:
+        yield _json_line({"type": "event", "ts": e.ts, "text": e.text})
+    for m in history:
+        yield _json_line({"type": "message", "ts": m.ts, "role": m.role, "content": m.content})
+    for e in crew or ():
+        yield _json_line({"type": "crew", "ts": e.ts, "speaker": e.speaker, "text": e.text})
+
+
+# ----------------------------
+# Session store rows (bulk export)
+# ----------------------------
+def iter_store_txt(sid: str, rows: Iterable) -> Iterator[str]:
+    # Chronological transcript: the store keeps every row, not just the
+    # bounded window a live session shows.
+    yield f"HANNAH — Captain’s Log (session {sid})\n"
+    yield "======================\n\n"
+    for kind, ts, data in rows:
+        data = json.loads(data)
+        if kind == "history":
+            role = "Commander" if data["role"] == "user" else "CosmoBot"
+            yield f"[{fmt_ts(ts)}] {role}: {data['content']}\n"
+        elif kind == "event":
+            yield f"[{fmt_ts(ts)}] EVENT: {data['text']}\n"
+        elif kind == "clear":
+            yield f"[{fmt_ts(ts)}] -- {data['what']} cleared --\n"
+
+
+def iter_store_jsonl(sid: str, rows: Iterable) -> Iterator[str]:
+    for kind, ts, data in rows:
+        # data is already compact JSON; splice it in rather than re-encoding
+        yield f'{{"sid":{json.dumps(sid)},"kind":"{kind}","ts":{ts!r},"data":{data}}}\n'
+
+
+STORE_FORMATS = {"txt": iter_store_txt, "jsonl": iter_store_jsonl}
+
+
+# ----------------------------
+# Encoding
+# ----------------------------
+def encode(lines: Iterable[str], gzip: bool = False) -> Iterator[bytes]:
+    # UTF-8 chunks of ~CHUNK_BYTES; gzip-framed (wbits=31) when asked.
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    buf, size = [], 0
+    for line in lines:
+        b = line.encode("utf-8")
+        buf.append(b)
+        size += len(b)
+        if size >= CHUNK_BYTES:
+            chunk = b"".join(buf)
+            buf, size = [], 0
+            chunk = comp.compress(chunk) if comp else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buf)
+    if comp:
+        chunk = comp.compress(chunk) + comp.flush()
+    if chunk:
+        yield chunk
+
+
+def to_buffer(chunks: Iterable[bytes]) -> io.BytesIO:
+    out = io.BytesIO()
+    for chunk in chunks:
+        out.write(chunk)
+    out.seek(0)
+    return out
+
+
+def safe_name(sid: str) -> str:
+    # Store keys predating sid validation may hold anything ("/", ".."):
+    # keep them as file names only once they are plain, unique via a hash.
+    clean = re.sub(r"[^A-Za-z0-9_-]", "_", sid)[:64]
+    if clean == sid:
+        return sid
+    return f"{clean}-{hashlib.blake2b(sid.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def file_name(base: str, fmt: str, gzip: bool) -> str:
+    return base + FORMATS[fmt][1] + (".gz" if gzip else "")
+
+
+def mime_type(fmt: str, gzip: bool) -> str:
+    return GZIP_MIME if gzip else FORMATS[fmt][0]
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main():
+    from store import iter_records, session_ids
+
+    p = argparse.ArgumentParser(description="Export Captain's Logs from the session store.")
+    p.add_argument("--db", default=os.getenv("COSMOBOT_STORE_PATH", ""), help="sqlite store (default: $COSMOBOT_STORE_PATH)")
+    p.add_argument("--out", default="exports", help="output directory")
+    p.add_argument("--format", choices=sorted(STORE_FORMATS), default="jsonl")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("--sid", action="append", help="session id (repeatable; default: every session)")
+    args = p.parse_args()
+    if not args.db:
+        p.error("no store: pass --db or set COSMOBOT_STORE_PATH")
+
+    os.makedirs(args.out, exist_ok=True)
+    for sid in args.sid or session_ids(args.db):
+        path = os.path.join(args.out, file_name(f"captains_log_{safe_name(sid)}", args.format, args.gzip))
+        with open(path, "wb") as fp:
+            for chunk in encode(STORE_FORMATS[args.format](sid, iter_records(args.db, sid)), args.gzip):
+                fp.write(chunk)
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
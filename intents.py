@@ -0,0 +1,140 @@
+# intents.py — compiled keyword-intent matcher for the offline brain
+# Built once from a declarative table instead of a chain of substring tests,
+# compiled into one word-bounded regular expression and matched in a single
+# pass over the message. Each intent is a dict:
+#   name     unique; a later entry with the same name replaces it in place
+#   words    whole words only ("hi" matches "hi there", not "this")
+#   stems    whole words plus regular inflections ("scan": scans, scanning, scanned)
+#   phrases  word sequences ("who are you")
+#   replies  templates, one picked at random; a {field} draws from the pool
+#            of that name on every use
+#   before   (extra intents only) insert ahead of this intent instead of last
+# The earliest intent in the table that matches anywhere in the message wins,
+# the same precedence the old if-chain had.
+#
+# Extra intents and pools come from a JSON file (engine.py reads
+# COSMOBOT_INTENTS), so adding one is a config change:
+#   {"pools": {"drills": ["Fire drill, deck 3."]},
+#    "intents": [{"name": "drill", "stems": ["drill"], "replies": ["Drill queued: {drills}"],
+#                 "before": "status"}]}
+
+import json
+import random
+import re
+from string import Formatter
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:['’][a-z]+)*")
+
+
+def words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def inflections(stem: str) -> set[str]:
+    # Regular English endings, generated up front so the matcher only ever
+    # compares whole words. Over-generation ("facter") is harmless: nobody types it.
+    forms = {stem, stem + "s", stem + "es", stem + "ing", stem + "ed", stem + "er", stem + "ers"}
+    if stem.endswith("e"):
+        forms |= {stem[:-1] + "ing", stem + "d"}
+    if len(stem) > 2 and stem[-1] not in "aeiouwy" and stem[-2] in "aeiou" and stem[-3] not in "aeiou":
+        forms |= {stem + stem[-1] + "ing", stem + stem[-1] + "ed"}  # scan -> scanning
+    return forms
+
+
+def load_intents(path: str | None) -> tuple[list, dict]:
+    # (intents, pools) from a JSON file; nothing if path is empty.
+    if not path:
+        return [], {}
+    with open(path, encoding="utf-8") as fp:
+        spec = json.load(fp)
+    return list(spec.get("intents", [])), dict(spec.get("pools", {}))
+
+
+def merge_intents(table: list, extra: list) -> list:
+    out = list(table)
+    for intent in extra:
+        names = [i["name"] for i in out]
+        if intent["name"] in names:
+            out[names.index(intent["name"])] = intent
+        elif intent.get("before") in names:
+            out.insert(names.index(intent["before"]), intent)
+        else:
+            out.append(intent)
+    return out
+
+
+class _Draw(dict):
+    # format_map() looks a field up once per occurrence: each {pool} is a fresh draw.
+    __slots__ = ("pools", "rng")
+
+    def __init__(self, pools: dict, rng):
+        self.pools = pools
+        self.rng = rng
+
+    def __missing__(self, key):
+        return self.rng.choice(self.pools[key])
+
+
+def _trie_pattern(keys) -> str:
+    trie = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # a key ends here
+
+    def emit(node: dict) -> str:
+        alts = [(r"\s+" if ch == " " else re.escape(ch)) + emit(child)
+                for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        return "(?:" + "|".join(alts) + (")?" if "" in node else ")")
+
+    return emit(trie)
+
+
+class IntentMatcher:
+    def __init__(self, table: list, pools: dict | None = None):
+        self.intents = list(table)
+        self.pools = dict(pools or {})
+        # keyword or phrase (words joined by one space) -> priority
+        self._priority = {}
+        for prio, intent in enumerate(self.intents):
+            keys = {w.lower() for w in intent.get("words", ())}
+            keys |= {f for s in intent.get("stems", ()) for f in inflections(s.lower())}
+            keys |= {" ".join(words(phrase)) for phrase in intent.get("phrases", ())}
+            for key in keys:
+                self._priority.setdefault(key, prio)
+            for template in intent.get("replies", ()):
+                for _, field, _, _ in Formatter().parse(template):
+                    if field is not None and field not in self.pools:
+                        raise ValueError(f"intent {intent['name']!r}: unknown pool {{{field}}}")
+        # One regex over every keyword, shaped as a trie so the re engine
+        # never retries a shared prefix: the scan runs in C, and Python only
+        # sees the (few) words that are keywords.
+        self._regex = re.compile(r"\b" + _trie_pattern(self._priority) + r"\b") if self._priority else None
+
+    def match(self, text: str) -> dict | None:
+        best = len(self.intents)
+        if self._regex is not None:
+            for m in self._regex.finditer(text.lower()):
+                key = m.group()
+                prio = self._priority.get(key)
+                if prio is None:
+                    prio = self._priority[" ".join(key.split())]  # phrase with odd spacing
+                if prio < best:
+                    best = prio
+                    if prio == 0:
+                        break
+        return self.intents[best] if best < len(self.intents) else None
+
+    def respond(self, text: str, rng=random) -> str | None:
+        intent = self.match(text)
+        if intent is None:
+            return None
+        replies = intent["replies"]
+        # No draw for a single reply, so RNG sequences match the old chain.
+        template = replies[0] if len(replies) == 1 else rng.choice(replies)
+        return template.format_map(_Draw(self.pools, rng))
@@ -0,0 +1,457 @@
+# llm.py — optional OpenAI backend for CosmoBot
+# Kept free of Streamlit so it can be imported by benchmarks and tools.
+#
+# Env:
+#   OPENAI_API_KEY   enables the LLM path
+#   OPENAI_MODEL     default: gpt-4o-mini
+#   OPENAI_BASE_URL  optional OpenAI-compatible endpoint (e.g. a local stub)
+#   OPENAI_CONNECT_TIMEOUT / OPENAI_READ_TIMEOUT  seconds (default 5 / 30)
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterator
+
+import perf
+from breaker import CLOSED, CircuitBreaker
+
+DEFAULT_MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.8
+
+CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT_S = float(os.getenv("OPENAI_READ_TIMEOUT", "30"))
+POOL_MAX_CONNECTIONS = 100
+POOL_MAX_KEEPALIVE = 20
+POOL_KEEPALIVE_S = 120.0  # SDK default is 5s, shorter than a typical gap between turns
+PROBE_TIMEOUT_S = 2.0  # the probe runs on the first page render: never wait a read timeout
+
+
+def llm_settings():
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    base_url = os.getenv("OPENAI_BASE_URL", "").strip() or None
+    model = os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
+    return api_key, base_url, model
+
+
+# ----------------------------
+# Shared client pool
+# ----------------------------
+# One client (and so one keep-alive connection pool) per process and config,
+# shared by every Streamlit session. Module globals survive script reruns.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def build_client(api_key: str, base_url: str | None, asynchronous: bool = False):
+    # asynchronous=True builds the AsyncOpenAI twin (same timeouts and pool
+    # limits) for dispatch.py's event loop.
+    import openai  # type: ignore
+
+    timeout = openai.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S)
+    http_client = None
+    if hasattr(openai, "DefaultHttpxClient"):
+        # httpx.Limits, taken from the SDK so we don't pin httpx ourselves
+        limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_S,
+        )
+        http_cls = openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+        http_client = http_cls(timeout=timeout, limits=limits)
+    # max_retries=0: retries are decided by classify_error(), not the SDK's
+    # built-in backoff, so a failing turn costs one bounded attempt.
+    return (openai.AsyncOpenAI if asynchronous else openai.OpenAI)(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=0,
+        http_client=http_client,
+    )
+
+
+def get_client(api_key: str, base_url: str | None, model: str):
+    key = (api_key, base_url, model)
+    client = _CLIENTS.get(key)
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(key)
+            if client is None:
+                client = _CLIENTS[key] = build_client(api_key, base_url)
+    return client
+
+
+def reset_clients():
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        client.close()
+
+
+# ----------------------------
+# Backend probe
+# ----------------------------
+# Detected once per process and config: which SDK generation is installed,
+# whether the endpoint answers, and whether the model exists. Turns then go
+# straight to that backend; there is no per-call new-SDK -> legacy fallthrough.
+BACKEND_NONE = "none"      # no key, no SDK, or a fatal (config) probe/call error
+BACKEND_OPENAI = "openai"  # openai>=1.x client
+BACKEND_LEGACY = "legacy"  # openai<1.x module-level ChatCompletion
+
+RETRYABLE = "retryable"  # may clear up on its own: retry, then fail the turn
+REJECTED = "rejected"    # this request only (bad/oversized prompt, policy): fail the turn
+FATAL = "fatal"          # the config is wrong (key, permission, model): disable the backend
+
+CONFIG_STATUSES = (401, 403, 404)
+
+RETRIES = 1  # extra attempts for retryable, non-timeout errors
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def _status(exc: Exception) -> int | None:
+    status = getattr(exc, "status_code", None) or getattr(exc, "http_status", None)  # new / legacy SDK
+    return status if isinstance(status, int) else None
+
+
+def classify_error(exc: Exception) -> str:
+    # Rate limits, overload, 5xx and transport failures may clear up on their
+    # own. Auth, permission and unknown model won't, for anyone. Anything
+    # else (400 oversized or policy-rejected prompt, 422, an SDK parse error)
+    # is about this one request and must not take the backend down for
+    # every session.
+    status = _status(exc)
+    if status is not None:
+        if status in (408, 409, 429) or status >= 500:
+            return RETRYABLE
+        return FATAL if status in CONFIG_STATUSES else REJECTED
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return RETRYABLE
+    try:
+        import openai  # type: ignore
+        if isinstance(exc, getattr(openai, "APIConnectionError", ())):  # includes APITimeoutError
+            return RETRYABLE
+    except ImportError:
+        pass
+    return REJECTED
+
+
+def _is_timeout(exc: Exception) -> bool:
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+def probe_backend(api_key: str, base_url: str | None, model: str) -> dict:
+    backend = {
+        "kind": BACKEND_NONE,
+        "sdk_version": "",
+        "endpoint": base_url or "https://api.openai.com/v1",
+        "model": model,
+        "reachable": False,
+        "error": "",
+        "key": (api_key, base_url, model),
+    }
+    if not api_key:
+        backend["error"] = "OPENAI_API_KEY not set"
+        return backend
+    try:
+        import openai  # type: ignore
+    except ImportError:
+        backend["error"] = "openai package not installed"
+        return backend
+
+    backend["sdk_version"] = getattr(openai, "__version__", "") or getattr(openai, "version", "")
+    if not hasattr(openai, "OpenAI"):
+        # Pre-1.0 SDK: no cheap typed probe; trust the config.
+        backend["kind"] = BACKEND_LEGACY
+        return backend
+
+    backend["kind"] = BACKEND_OPENAI
+    try:
+        client = get_client(api_key, base_url, model)
+        client.with_options(timeout=PROBE_TIMEOUT_S, max_retries=0).models.retrieve(model)
+        backend["reachable"] = True
+    except Exception as exc:
+        backend["error"] = f"{type(exc).__name__}: {exc}"[:200]
+        if classify_error(exc) == FATAL and _status(exc) != 404:
+            backend["kind"] = BACKEND_NONE
+        # Otherwise keep the backend, unverified: the endpoint may come back,
+        # and a 404 may only mean the server has no GET /models/{id}. An
+        # unknown model then 404s on the first completion instead.
+    return backend
+
+
+def get_backend() -> dict:
+    key = llm_settings()
+    backend = _BACKENDS.get(key)
+    if backend is None:
+        with _BACKENDS_LOCK:
+            backend = _BACKENDS.get(key)
+            if backend is None:
+                backend = _BACKENDS[key] = probe_backend(*key)
+    return backend
+
+
+def reset_backend():
+    with _BACKENDS_LOCK:
+        _BACKENDS.clear()
+
+
+def describe_backend(backend: dict) -> str:
+    if backend["kind"] == BACKEND_NONE:
+        return f"offline ({backend['error'] or 'disabled'})"
+    state = "reachable" if backend["reachable"] else "unverified"
+    return f"{backend['kind']} SDK {backend['sdk_version']} · {backend['model']} @ {backend['endpoint']} ({state})"
+
+
+def after_error(backend: dict, exc: Exception, attempt: int) -> str | None:
+    # The retry policy for one failed attempt, shared by the blocking path
+    # and dispatch.py: None to try again, else the classify_error() class the
+    # call ends with (for record_call). Also records the error and applies FATAL.
+    backend["error"] = f"{type(exc).__name__}: {exc}"[:200]
+    verdict = classify_error(exc)
+    if verdict == FATAL:
+        # Stays disabled until reset_backend() or the config changes.
+        backend["kind"] = BACKEND_NONE
+    # No retry while the breaker is probing: one call decides.
+    if verdict == RETRYABLE and attempt < RETRIES and not _is_timeout(exc) and BREAKER.state == CLOSED:
+        return None
+    return verdict
+
+
+# ----------------------------
+# Circuit breaker
+# ----------------------------
+# Process-wide: when the backend is failing or slow for one session it is
+# for all of them. While OPEN, replies come from the offline brain at once.
+BREAKER = CircuitBreaker(slow_call_s=min(8.0, READ_TIMEOUT_S))
+
+
+def comms_state() -> str:
+    # For the console lights: OFFLINE (no backend) / CLOSED / HALF_OPEN / OPEN.
+    if get_backend()["kind"] == BACKEND_NONE:
+        return "OFFLINE"
+    return BREAKER.state
+
+
+# ----------------------------
+# Usage / prompt-cache instrumentation
+# ----------------------------
+# Provider prompt caching reports usage.prompt_tokens_details.cached_tokens;
+# keep process totals plus a recent window to compare cached vs cold latency.
+USAGE = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+RECENT_USAGE = deque(maxlen=500)  # (prompt_tokens, cached_tokens, latency_s)
+_USAGE_LOCK = threading.Lock()
+
+
+def record_usage(usage, latency_s: float):
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    with _USAGE_LOCK:
+        USAGE["calls"] += 1
+        USAGE["prompt_tokens"] += prompt
+        USAGE["cached_tokens"] += cached
+        USAGE["completion_tokens"] += completion
+        RECENT_USAGE.append((prompt, cached, latency_s))
+
+
+def usage_stats() -> dict:
+    with _USAGE_LOCK:
+        stats = dict(USAGE)
+        recent = list(RECENT_USAGE)
+    stats["cached_ratio"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+    warm = [lat for _, cached, lat in recent if cached]
+    cold = [lat for _, cached, lat in recent if not cached]
+    stats["warm_latency_s"] = sum(warm) / len(warm) if warm else 0.0
+    stats["cold_latency_s"] = sum(cold) / len(cold) if cold else 0.0
+    return stats
+
+
+perf.register_collector("tokens", lambda: {k: v for k, v in usage_stats().items() if k in USAGE or k == "cached_ratio"})
+perf.register_collector("breaker", lambda: {"state": BREAKER.state, "trips": BREAKER.trips, "rejected": BREAKER.rejected})
+
+
+# ----------------------------
+# Call policy
+# ----------------------------
+# Shared by the blocking path below and dispatch.py's async one, so
+# admission, retries, usage and stream bookkeeping are decided in one place.
+def admit():
+    # The cheap gates, in order: is there a backend at all, and will the
+    # breaker let a call through. Both refusals cost microseconds.
+    backend = get_backend()
+    if backend["kind"] == BACKEND_NONE:
+        return None
+    if not BREAKER.allow():
+        return None
+    return backend
+
+
+def record_call(ok: bool, t0: float, error: str = ""):
+    # error: how a failed call ended (after_error). A REJECTED request says
+    # nothing about the backend, so it gets no verdict, only its admission
+    # (maybe the HALF_OPEN probe) back: one Commander repeating an oversized
+    # prompt must not trip the breaker for everyone.
+    if error == REJECTED:
+        BREAKER.release()
+        return
+    latency = time.monotonic() - t0
+    if ok:
+        BREAKER.record_success(latency)
+    else:
+        BREAKER.record_failure(latency)
+
+
+def completion_args(backend: dict, messages, stream: bool) -> dict:
+    # Streams only report usage (incl. cached tokens) when asked to.
+    extra = {"stream_options": {"include_usage": True}} if stream else {}
+    return dict(model=backend["key"][2], messages=messages, temperature=TEMPERATURE, stream=stream, **extra)
+
+
+def completion_text(resp, t0: float) -> str | None:
+    record_usage(getattr(resp, "usage", None), time.monotonic() - t0)
+    return resp.choices[0].message.content
+
+
+def used_tokens(usage) -> int | None:
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+
+
+class StreamTally:
+    # Per-chunk bookkeeping for one streamed reply, whichever loop reads it:
+    # usage (the final chunk with include_usage), time to first token, and
+    # whether the provider finished the reply (sent a finish_reason).
+    __slots__ = ("t0", "started", "finished", "used")
+
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self.started = False
+        self.finished = False
+        self.used = None  # tokens, once usage arrives
+
+    def delta(self, chunk) -> str:
+        if getattr(chunk, "usage", None) is not None:
+            record_usage(chunk.usage, time.monotonic() - self.t0)
+            self.used = used_tokens(chunk.usage)
+        if not chunk.choices:
+            return ""
+        if getattr(chunk.choices[0], "finish_reason", None):
+            self.finished = True
+        text = chunk.choices[0].delta.content
+        if text and not self.started:
+            self.started = True
+            perf.record("llm_ttft", time.monotonic() - self.t0)
+        return text or ""
+
+    def end(self, dropped: bool = False) -> bool:
+        # Mid-stream drop (an error, or a stream that just stopped without a
+        # finish_reason): the caller keeps whatever already arrived, but the
+        # breaker counts it. Returns whether the whole reply came through.
+        if dropped or not self.finished:
+            BREAKER.record_failure()
+            return False
+        perf.record("llm", time.monotonic() - self.t0)
+        return True
+
+
+def legacy_chat(backend: dict, messages) -> tuple[str | None, str]:
+    # (text, "") or (None, the error class), like _create.
+    api_key, base_url, model = backend["key"]
+    try:
+        import openai  # type: ignore
+        kwargs = {"api_base": base_url} if base_url else {}
+        resp = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            temperature=TEMPERATURE,
+            api_key=api_key,
+            **kwargs,
+        )
+        return resp["choices"][0]["message"]["content"], ""
+    except Exception as exc:
+        return None, after_error(backend, exc, RETRIES)
+
+
+# ----------------------------
+# Blocking completion
+# ----------------------------
+def try_openai_chat(messages):
+    backend = admit()
+    if backend is None:
+        return None
+
+    t0 = time.monotonic()
+    if backend["kind"] == BACKEND_LEGACY:
+        text, error = legacy_chat(backend, messages)
+    else:
+        resp, error = _create(backend, messages, stream=False)
+        text = completion_text(resp, t0) if resp is not None else None
+    record_call(text is not None, t0, error)
+    perf.record("llm", time.monotonic() - t0)
+    return text
+
+
+def _create(backend: dict, messages, stream: bool):
+    # (response, "") or (None, the error class the call ended with).
+    api_key, base_url, model = backend["key"]
+    client = get_client(api_key, base_url, model)
+    for attempt in range(1 + RETRIES):
+        try:
+            return client.chat.completions.create(**completion_args(backend, messages, stream)), ""
+        except Exception as exc:
+            error = after_error(backend, exc, attempt)
+            if error is not None:
+                return None, error
+
+
+# ----------------------------
+# Streaming completion
+# ----------------------------
+def stream_openai_chat(messages) -> Iterator[str] | None:
+    # Opens the stream eagerly so connection/auth errors surface here (-> None,
+    # caller falls back offline); the returned iterator yields text deltas.
+    # Its return value (StopIteration.value, `yield from`) is True only if
+    # the reply was complete, so a cut-off reply can be shown but not cached.
+    backend = admit()
+    if backend is None:
+        return None
+
+    t0 = time.monotonic()
+    if backend["kind"] == BACKEND_LEGACY:
+        text, error = legacy_chat(backend, messages)
+        record_call(text is not None, t0, error)
+        return whole_reply(text) if text else None
+
+    stream, error = _create(backend, messages, stream=True)
+    # Judged on time-to-open, which is what the Commander waits on.
+    record_call(stream is not None, t0, error)
+    return _iter_deltas(stream, t0) if stream is not None else None
+
+
+def whole_reply(text: str) -> Iterator[str]:
+    # A reply that arrived in one piece, as a complete stream.
+    yield text
+    return True
+
+
+def _iter_deltas(stream, t0: float) -> Iterator[str]:
+    tally = StreamTally(t0)
+    try:
+        for chunk in stream:
+            delta = tally.delta(chunk)
+            if delta:
+                yield delta
+    except Exception:
+        return tally.end(dropped=True)
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    return tally.end()
@@ -0,0 +1,101 @@
+# memory.py — long-term recall over a session's full conversation
+# An incremental BM25 inverted index, one per session. Each Commander/CosmoBot
+# exchange is a document; adding one costs O(its tokens), nothing is rebuilt.
+# search() returns the top-k past exchanges for the current message, so the
+# prompt stays small while hours-old context can still come back. It keeps the
+# newest RECALL_MAX exchanges (full text plus postings): beyond that the
+# oldest is dropped from the index, so a days-long session stays bounded.
+#
+# Env:
+#   COSMOBOT_RECALL_MAX  exchanges kept per session (default 1000)
+
+import math
+import os
+import re
+import sys
+from collections import Counter
+
+RECALL_MAX = int(os.getenv("COSMOBOT_RECALL_MAX", "1000"))
+
+_WORD_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i if in is it its me my "
+    "no not of on or our so that the this to was we what when where which who why will "
+    "with you your commander cosmobot".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+class RecallIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_docs: int = RECALL_MAX):
+        self.k1 = k1
+        self.b = b
+        self.max_docs = max_docs
+        self.docs = {}       # doc_id -> (user_text, bot_text); ids only grow, oldest first
+        self.doc_len = {}
+        self.postings = {}   # term -> {doc_id: term frequency}
+        self.total_len = 0
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, user_text: str, bot_text: str) -> int:
+        doc_id = self.next_id
+        self.next_id += 1
+        terms = Counter(tokenize(user_text + " " + bot_text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        n = sum(terms.values())
+        self.docs[doc_id] = (user_text, bot_text)
+        self.doc_len[doc_id] = n
+        self.total_len += n
+        while len(self.docs) > self.max_docs:
+            self._drop(next(iter(self.docs)))
+        return doc_id
+
+    def _drop(self, doc_id: int):
+        # Costs O(the exchange's tokens), like add().
+        user_text, bot_text = self.docs.pop(doc_id)
+        for term in set(tokenize(user_text + " " + bot_text)):
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id)
+
+    def search(self, query: str, k: int = 3, skip_recent: int = 0) -> list[tuple[float, str, str]]:
+        # skip_recent: ignore the newest exchanges (already in the prompt window).
+        searched = self.next_id - skip_recent  # ids below this
+        if len(self.docs) - skip_recent <= 0:
+            return []
+        avg_len = self.total_len / len(self.docs) or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (len(self.docs) - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                if doc_id >= searched:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, *self.docs[doc_id]) for doc_id, score in top]
+
+    def clear(self):
+        self.__init__(self.k1, self.b, self.max_docs)
+
+    def memory_bytes(self) -> int:
+        # Same accounting as records.memory_bytes: containers, then what they
+        # hold (texts once; ints and small tfs are interned or tiny).
+        total = sum(map(sys.getsizeof, (self.docs, self.doc_len, self.postings)))
+        for user_text, bot_text in self.docs.values():
+            total += sys.getsizeof((user_text, bot_text)) + sys.getsizeof(user_text) + sys.getsizeof(bot_text)
+        for term, posting in self.postings.items():
+            total += sys.getsizeof(term) + sys.getsizeof(posting)
+        return total
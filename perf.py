@@ -0,0 +1,250 @@
+# perf.py — lightweight run timing and metrics
+# Process-wide totals per span name: calls, wall seconds and CPU seconds of
+# the calling thread (Streamlit runs each session's script on its own
+# thread, so thread CPU is the server cost of that run), plus a fixed-bucket
+# wall-time histogram for p50/p95/p99. Counters owned by other modules
+# (tokens, reply cache, breaker, dispatch) come from registered collectors,
+# read only when a report is built, so they cost nothing per turn.
+#
+# Views: report_markdown() (the /perf command) and prometheus_text() (text
+# exposition format). After start_exporter(), the latter is served at
+# /metrics on COSMOBOT_METRICS_PORT and/or rewritten to COSMOBOT_METRICS_FILE
+# every METRICS_INTERVAL_S (node-exporter textfile style).
+#
+# COSMOBOT_PERF=0 turns spans off: span() hands back one shared null
+# context, timed() returns the function undecorated, record() returns.
+
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.getenv("COSMOBOT_PERF", "1").strip() != "0"
+METRICS_PORT = int(os.getenv("COSMOBOT_METRICS_PORT", "0"))  # 0: no endpoint
+METRICS_HOST = os.getenv("COSMOBOT_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.getenv("COSMOBOT_METRICS_FILE", "")
+METRICS_INTERVAL_S = 15.0
+
+# Histogram upper bounds (seconds), Prometheus "le" style; one more bucket for +Inf.
+BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STATS = {}  # name -> [calls, wall_s, cpu_s]
+HISTOGRAMS = {}  # name -> wall-time bucket counts
+COLLECTORS = {}  # prefix -> fn() returning {counter: number or str}
+_LOCK = threading.Lock()
+_NULL = nullcontext()
+_exporter_started = False
+
+
+def record(name: str, wall_s: float, cpu_s: float = 0.0):
+    # cpu_s stays 0 for stages that mostly wait (LLM calls run on the
+    # dispatch loop or interleave with rendering).
+    if not ENABLED:
+        return
+    i = bisect_left(BUCKETS_S, wall_s)
+    with _LOCK:
+        s = STATS.get(name)
+        if s is None:
+            s = STATS[name] = [0, 0.0, 0.0]
+            HISTOGRAMS[name] = [0] * (len(BUCKETS_S) + 1)
+        s[0] += 1
+        s[1] += wall_s
+        s[2] += cpu_s
+        HISTOGRAMS[name][i] += 1
+
+
+class _Span:
+    __slots__ = ("name", "t0", "c0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0, self.c0 = time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.t0, time.thread_time() - self.c0)
+        return False
+
+
+def span(name: str):
+    return _Span(name) if ENABLED else _NULL
+
+
+def timed(name: str):
+    def deco(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def register_collector(prefix: str, fn):
+    COLLECTORS[prefix] = fn
+
+
+def reset():
+    with _LOCK:
+        STATS.clear()
+        HISTOGRAMS.clear()
+
+
+def percentile(name: str, q: float) -> float:
+    with _LOCK:
+        counts = list(HISTOGRAMS.get(name, ()))
+    return _bucket_quantile(counts, q)
+
+
+def _bucket_quantile(counts: list, q: float) -> float:
+    # Linear within the bucket, as Prometheus' histogram_quantile does.
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank, seen = q * total, 0
+    for i, c in enumerate(counts):
+        if c and seen + c >= rank:
+            lo = BUCKETS_S[i - 1] if i else 0.0
+            if i == len(BUCKETS_S):
+                return lo  # +Inf bucket: best we can say is "above the top bound"
+            return lo + (BUCKETS_S[i] - lo) * (rank - seen) / c
+        seen += c
+    return BUCKETS_S[-1]
+
+
+def snapshot() -> tuple[dict, dict]:
+    # ({span: (calls, wall_s, cpu_s, bucket counts)}, {prefix: counters})
+    with _LOCK:
+        spans = {name: (*STATS[name], list(HISTOGRAMS[name])) for name in sorted(STATS)}
+    counters = {}
+    for prefix, fn in list(COLLECTORS.items()):
+        try:
+            counters[prefix] = fn()
+        except Exception:
+            counters[prefix] = {}  # a broken collector must not break the report
+    return spans, counters
+
+
+# ----------------------------
+# Views
+# ----------------------------
+def _ms(s: float) -> str:
+    return f"{s * 1000:.1f} ms" if s < 10 else f"{s:.1f} s"
+
+
+def _num(v) -> str:
+    if isinstance(v, float):
+        return f"{v:.3g}"
+    return str(v)
+
+
+def report_markdown() -> str:
+    spans, counters = snapshot()
+    lines = ["**Perf** — this server process"]
+    if not ENABLED:
+        lines.append("Spans are off (`COSMOBOT_PERF=0`).")
+    elif spans:
+        lines += ["", "| span | calls | p50 | p95 | p99 | mean cpu |", "|---|---:|---:|---:|---:|---:|"]
+        for name, (calls, _, cpu, counts) in spans.items():
+            p50, p95, p99 = (_bucket_quantile(counts, q) for q in (0.5, 0.95, 0.99))
+            lines.append(f"| {name} | {calls} | {_ms(p50)} | {_ms(p95)} | {_ms(p99)} | {_ms(cpu / calls)} |")
+    else:
+        lines.append("No spans recorded yet.")
+    for prefix, values in counters.items():
+        if values:
+            lines.append(f"\n**{prefix}**: " + " · ".join(f"{k} {_num(v)}" for k, v in values.items()))
+    return "\n".join(lines)
+
+
+def _metric(name: str) -> str:
+    return "cosmobot_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_text() -> str:
+    spans, counters = snapshot()
+    out = [
+        "# HELP cosmobot_span_seconds Wall time per instrumented stage.",
+        "# TYPE cosmobot_span_seconds histogram",
+    ]
+    for name, (calls, wall, _, counts) in spans.items():
+        cum = 0
+        for le, c in zip((*map(repr, BUCKETS_S), "+Inf"), counts):
+            cum += c
+            out.append(f'cosmobot_span_seconds_bucket{{span="{name}",le="{le}"}} {cum}')
+        out.append(f'cosmobot_span_seconds_sum{{span="{name}"}} {wall!r}')
+        out.append(f'cosmobot_span_seconds_count{{span="{name}"}} {calls}')
+    out += [
+        "# HELP cosmobot_span_cpu_seconds_total Thread CPU time per instrumented stage.",
+        "# TYPE cosmobot_span_cpu_seconds_total counter",
+    ]
+    out += [f'cosmobot_span_cpu_seconds_total{{span="{name}"}} {cpu!r}' for name, (_, _, cpu, _) in spans.items()]
+    for prefix, values in counters.items():
+        for key, v in values.items():
+            metric = _metric(f"{prefix}_{key}")
+            out.append(f"# TYPE {metric} gauge")
+            if isinstance(v, str):
+                out.append(f'{metric}{{value="{v}"}} 1')  # e.g. breaker state
+            elif isinstance(v, (int, float)):
+                out.append(f"{metric} {float(v)!r}")
+    return "\n".join(out) + "\n"
+
+
+def write_prometheus(path: str):
+    # Atomic replace, so a scraper never reads half a file.
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        fp.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds; keep the server log clean
+
+
+def _write_forever(path: str):
+    while True:
+        try:
+            write_prometheus(path)
+        except OSError:
+            pass  # unwritable for now (full disk, missing dir); try again next round
+        time.sleep(METRICS_INTERVAL_S)
+
+
+def start_exporter():
+    # Once per process; a no-op unless COSMOBOT_METRICS_PORT/FILE are set.
+    global _exporter_started
+    with _LOCK:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        except OSError:
+            server = None  # port taken (another server process already exports)
+        if server is not None:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if METRICS_FILE:
+        threading.Thread(target=_write_forever, args=(METRICS_FILE,), name="metrics-file", daemon=True).start()
@@ -0,0 +1,96 @@
+# records.py — compact per-session message storage
+# History, events and the crew log are bounded deques (append is O(1) and the
+# oldest entry falls off; no list rebuild per message) of __slots__ records
+# with epoch-float timestamps. Timestamps are formatted only when something
+# is rendered or exported.
+
+import sys
+import time
+from collections import deque
+from itertools import count, islice
+
+HISTORY_MAX = 120
+EVENTS_MAX = 40
+CREW_LOG_MAX = 30  # lines: two per exchange
+
+
+_MESSAGE_IDS = count(1)
+
+
+class Message:
+    __slots__ = ("mid", "role", "content", "ts", "block", "packed")
+
+    def __init__(self, role: str, content: str, ts: float | None = None):
+        self.mid = next(_MESSAGE_IDS)  # process-unique and increasing
+        self.role = role
+        self.content = content
+        self.ts = time.time() if ts is None else ts
+        self.block = None  # rendered page markdown, built on first render
+        self.packed = None  # (clip limit, prompt content, tokens), built on first send (context.py)
+
+
+class Event:
+    __slots__ = ("text", "ts")
+
+    def __init__(self, text: str, ts: float | None = None):
+        self.text = text
+        self.ts = time.time() if ts is None else ts
+
+
+class CrewEntry:
+    __slots__ = ("speaker", "text", "ts")
+
+    def __init__(self, speaker: str, text: str, ts: float | None = None):
+        self.speaker = speaker
+        self.text = text
+        self.ts = time.time() if ts is None else ts
+
+
+def ring(maxlen: int, items=()) -> deque:
+    return deque(items, maxlen=maxlen)
+
+
+def tail(records: deque, n: int) -> list:
+    return list(islice(records, max(0, len(records) - n), None))
+
+
+def fmt_ts(ts: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def fmt_short_ts(ts: float) -> str:
+    return time.strftime("%H:%M:%S", time.localtime(ts))
+
+
+def event_line(e: Event) -> str:
+    return f"[{fmt_ts(e.ts)}] {e.text}"
+
+
+def crew_line(e: CrewEntry) -> str:
+    return f"[{fmt_short_ts(e.ts)}] {e.speaker}: {e.text}"
+
+
+# Older history renders as pages of static markdown (one element per page
+# instead of two per message). Messages never change once written, so each
+# one's block is built once and kept on the message itself, so it is reused
+# on every rerun and lives exactly as long as the message, however many
+# sessions share the process.
+def message_block(m: Message) -> str:
+    if m.block is None:
+        who = "🧑‍🚀 **Commander**" if m.role == "user" else "🤖 **CosmoBot**"
+        m.block = f"{who} · `{fmt_short_ts(m.ts)}`\n\n{m.content}"
+    return m.block
+
+
+def page_markdown(messages) -> str:
+    return "\n\n---\n\n".join(message_block(m) for m in messages)
+
+
+def memory_bytes(records: deque) -> int:
+    # Container + records + the objects they point at (strings, floats).
+    total = sys.getsizeof(records)
+    for rec in records:
+        total += sys.getsizeof(rec)
+        for slot in rec.__slots__:
+            total += sys.getsizeof(getattr(rec, slot))
+    return total
@@ -0,0 +1,164 @@
+# replay.py — batch transcript replay through the headless engine
+# Replays recorded Commander transcripts (JSONL) through engine.Session,
+# one session per worker task in a process pool, and reports throughput,
+# per-turn latency percentiles and, against a golden run, which replies
+# changed.
+#
+#   python replay.py transcripts/*.jsonl --out run.jsonl                 # record a golden run
+#   python replay.py transcripts/*.jsonl --golden run.jsonl [--diffs 5]  # compare against it
+#
+# Accepted input lines (anything else is skipped):
+#   {"sid": "...", "text": "..."}                        plain transcript
+#   {"type": "message", "role": "user", "content": ...}  sidebar .jsonl export
+#   {"sid": ..., "kind": "history"|"settings", "data": {...}}  export.py bulk export
+# Lines without a sid belong to a session named after their file. Settings
+# rows (bulk export) are applied in order, so mode switches replay too.
+#
+# Determinism: every session gets its own RNG seeded from --seed and its sid
+# (ship events and offline replies), a fake clock that puts turn n at
+# n * --turn-gap-s of ship time (ambient events and fuel burn, simulation.py),
+# and the LLM is off unless --llm.
+
+import argparse
+import difflib
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+
+def read_sessions(paths: list[str]) -> dict:
+    # sid -> list of ("turn", text) / ("settings", dict), in file order
+    sessions = {}
+    for path in paths:
+        default_sid = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                rec = json.loads(line)
+                sid = str(rec.get("sid") or default_sid)
+                if "text" in rec:
+                    step = ("turn", rec["text"])
+                elif rec.get("type") == "message" and rec.get("role") == "user":
+                    step = ("turn", rec["content"])
+                elif rec.get("kind") == "history" and rec["data"].get("role") == "user":
+                    step = ("turn", rec["data"]["content"])
+                elif rec.get("kind") == "settings":
+                    step = ("settings", rec["data"])
+                else:
+                    continue
+                sessions.setdefault(sid, []).append(step)
+    return sessions
+
+
+def replay_session(job: tuple) -> list[dict]:
+    # Runs in a worker process: one whole session, turn by turn.
+    sid, steps, seed, llm, turn_gap_s = job
+    from engine import Session
+    from reply_cache import REPLY_CACHE
+
+    # The reply cache is process-wide; start each session cold so a reply
+    # never depends on which sessions the same worker ran before it.
+    REPLY_CACHE.clear()
+    # Ship time comes from the turn index, never the wall clock, so the same
+    # ambient events fire between the same turns on every run.
+    now = [0.0]
+    session = Session(sid, rng=random.Random(seed ^ zlib.crc32(sid.encode())), llm=llm, stream=False,
+                      clock=lambda: now[0])
+    out = []
+    for kind, payload in steps:
+        if kind == "settings":
+            for k, v in payload.items():
+                if k in Session.SETTINGS:
+                    setattr(session, k, v)
+            continue
+        now[0] = len(out) * turn_gap_s
+        t0 = time.perf_counter()
+        event, reply = session.turn(payload)
+        out.append({
+            "sid": sid, "turn": len(out), "user": payload, "event": event, "reply": reply,
+            "latency_us": round((time.perf_counter() - t0) * 1e6, 1),
+        })
+    return out
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def compare(results: list[dict], golden_path: str, max_diffs: int) -> int:
+    golden = {}
+    with open(golden_path, encoding="utf-8") as fp:
+        for line in fp:
+            g = json.loads(line)
+            golden[(g["sid"], g["turn"])] = g
+
+    changed = missing = 0
+    shown = 0
+    for r in results:
+        g = golden.pop((r["sid"], r["turn"]), None)
+        if g is None:
+            missing += 1
+            continue
+        if (g["event"], g["reply"]) == (r["event"], r["reply"]):
+            continue
+        changed += 1
+        if shown < max_diffs:
+            shown += 1
+            print(f"\n--- {r['sid']} turn {r['turn']}: {r['user']!r}")
+            old = f"{g['event'] or ''}\n{g['reply']}".splitlines()
+            new = f"{r['event'] or ''}\n{r['reply']}".splitlines()
+            sys.stdout.writelines(line + "\n" for line in difflib.unified_diff(old, new, "golden", "replay", lineterm="", n=1))
+    print(f"\ngolden: {changed} changed, {missing} new, {len(golden)} missing turns "
+          f"(of {len(results)} replayed)")
+    return changed + missing + len(golden)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Replay Commander transcripts through the CosmoBot engine.")
+    p.add_argument("transcripts", nargs="+", help="JSONL transcript files")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--llm", action="store_true", help="use the configured LLM backend (non-deterministic)")
+    p.add_argument("--turn-gap-s", type=float, default=60.0, help="ship time between replayed turns")
+    p.add_argument("--out", help="write every replayed turn here (JSONL; use as a later --golden)")
+    p.add_argument("--golden", help="compare replies against a previous --out run")
+    p.add_argument("--diffs", type=int, default=10, help="changed turns to print in full")
+    args = p.parse_args()
+
+    sessions = read_sessions(args.transcripts)
+    jobs = [(sid, steps, args.seed, args.llm, args.turn_gap_s) for sid, steps in sorted(sessions.items())]
+    if not jobs:
+        p.error("no replayable turns found")
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Big sessions first so one long transcript doesn't finish last alone.
+        order = sorted(range(len(jobs)), key=lambda i: -len(jobs[i][1]))
+        chunks = dict(zip(order, pool.map(replay_session, [jobs[i] for i in order],
+                                           chunksize=max(1, len(jobs) // (8 * args.workers)))))
+    elapsed = time.perf_counter() - t0
+    results = [r for i in range(len(jobs)) for r in chunks[i]]
+
+    lat = sorted(r["latency_us"] for r in results)
+    print(f"{len(results)} turns, {len(jobs)} sessions, {args.workers} workers: "
+          f"{len(results) / elapsed:,.0f} turns/s ({elapsed:.2f}s wall)")
+    if lat:
+        print(f"per turn: p50 {percentile(lat, 0.50):.0f} us  p90 {percentile(lat, 0.90):.0f} us  "
+              f"p99 {percentile(lat, 0.99):.0f} us  max {lat[-1]:.0f} us")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fp:
+            for r in results:
+                fp.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if args.golden:
+        sys.exit(1 if compare(results, args.golden, args.diffs) else 0)
+
+
+if __name__ == "__main__":
+    main()
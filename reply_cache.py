@@ -0,0 +1,188 @@
+# reply_cache.py — process-wide LLM reply cache
+# Keyed on a normalized (mode, ship_state, user_text) fingerprint plus a
+# digest of the rest of the prompt (history, crew log, recall hits, last
+# event), so the same question in the same mode, ship state and context is
+# answered once per TTL for every session in the process. A reply that
+# depends on one Commander's conversation is never handed to another.
+# Bounded by entry count and approximate bytes, evicted LRU-first; expired
+# entries are dropped on access.
+#
+# Env:
+#   COSMOBOT_CACHE_MODES  comma list of modes that opt in (default: Standard,Science;
+#                         empty disables the cache)
+#   COSMOBOT_CACHE_TTL    seconds (default 600)
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Iterable, Iterator
+
+import perf
+
+_WS = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.…]+$")
+
+
+def normalize_text(text: str) -> str:
+    return _TRAILING_PUNCT.sub("", _WS.sub(" ", text.strip().lower()))
+
+
+def ship_fingerprint(ship: dict) -> tuple:
+    return tuple(sorted(ship.items()))
+
+
+def context_digest(messages) -> str:
+    # Everything the model sees besides the question, byte for byte.
+    h = hashlib.blake2b(digest_size=16)
+    for m in messages:
+        h.update(m["role"].encode("utf-8") + b"\0" + m["content"].encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+def cache_key(mode: str, ship: dict, user_text: str, context=()) -> tuple:
+    # context: the prompt's other messages (system, history, telemetry).
+    return (mode, ship_fingerprint(ship), normalize_text(user_text), context_digest(context))
+
+
+def _entry_bytes(key: tuple, value: str) -> int:
+    return sys.getsizeof(value) + sys.getsizeof(key[2]) + 64  # + rough per-entry overhead
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        modes: Iterable[str] = ("Standard", "Science"),
+        max_entries: int = 512,
+        max_bytes: int = 4 * 1024 * 1024,
+        ttl_s: float = 600.0,
+        clock=time.monotonic,
+    ):
+        self.modes = set(modes)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, value, nbytes)
+        self._bytes = 0
+        self._ship_refs = Counter()  # ship fingerprint -> sessions currently in that state
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def enabled_for(self, mode: str) -> bool:
+        return mode in self.modes
+
+    def get(self, key: tuple) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[0] <= self.clock():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: tuple, value: str):
+        nbytes = _entry_bytes(key, value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (self.clock() + self.ttl_s, value, nbytes)
+            self._bytes += nbytes
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def put_stream(self, key: tuple, deltas: Iterator[str]) -> Iterator[str]:
+        # Pass a token stream through untouched; cache the text once it ends,
+        # but only if the stream's return value says the reply was complete
+        # (llm/dispatch streams return True once the provider finished it).
+        # A reply cut off mid-stream would otherwise be served to everyone.
+        parts = []
+        deltas = iter(deltas)
+        while True:
+            try:
+                delta = next(deltas)
+            except StopIteration as stop:
+                complete = stop.value is True
+                break
+            parts.append(delta)
+            yield delta
+        text = "".join(parts)
+        if complete and text:  # a stream may carry only keep-alive "" deltas
+            self.put(key, text)
+
+    def ship_changed(self, old_fp: tuple | None, new_fp: tuple) -> int:
+        # Invalidation hook, called by a session whenever its ship_state changes
+        # (old_fp None for a new session). Entries for a state are dropped once
+        # no session is left in it; other sessions sharing it keep their hits.
+        with self._lock:
+            self._ship_refs[new_fp] += 1
+        return 0 if old_fp is None else self.ship_released(old_fp)
+
+    def ship_released(self, ship_fp: tuple) -> int:
+        # One session left that state (moved on, or ended: engine.Session's
+        # finalizer); its entries go with the last one.
+        with self._lock:
+            self._ship_refs[ship_fp] -= 1
+            if self._ship_refs[ship_fp] > 0:
+                return 0
+            del self._ship_refs[ship_fp]
+        return self.invalidate_ship(ship_fp)
+
+    def invalidate_ship(self, ship_fp: tuple) -> int:
+        with self._lock:
+            stale = [k for k in self._data if k[1] == ship_fp]
+            for k in stale:
+                self._drop(k)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _drop(self, key: tuple):
+        self._bytes -= self._data.pop(key)[2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def _modes_from_env() -> list[str]:
+    raw = os.getenv("COSMOBOT_CACHE_MODES", "Standard,Science")
+    return [m.strip() for m in raw.split(",") if m.strip()]
+
+
+REPLY_CACHE = ResponseCache(
+    modes=_modes_from_env(),
+    ttl_s=float(os.getenv("COSMOBOT_CACHE_TTL", "600")),
+)
+perf.register_collector("reply_cache", REPLY_CACHE.stats)
@@ -0,0 +1,183 @@
+# scheduler.py — process-wide admission control for LLM calls
+# Sits between the sessions and the provider (dispatch.py asks it before
+# every call) so bursts queue here instead of turning into provider 429s:
+#   - token buckets for requests/minute and tokens/minute (prompt estimate +
+#     expected completion, corrected with real usage when the call ends);
+#   - a cap on calls in flight;
+#   - fair queuing: one FIFO per session, served round-robin, so one chatty
+#     session can't starve the rest; Alert-mode sessions form a higher
+#     priority class that is always served first;
+#   - a provider 429 drains the request bucket for its Retry-After.
+# Pure bookkeeping with an injectable clock: the caller polls admit() and
+# sleeps until next_wakeup(), which makes it drivable by a simulated clock.
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+PRIORITY_HIGH = 0  # Alert mode
+PRIORITY_NORMAL = 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: float | None = None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.clock = clock
+        self.level = self.capacity
+        self._t = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._t) * self.rate)
+        self._t = now
+
+    def wait_s(self, n: float) -> float:
+        # Seconds until n units are available (a request bigger than the
+        # bucket waits for a full bucket, then overdraws it).
+        self._refill()
+        short = min(n, self.capacity) - self.level
+        return max(0.0, short / self.rate) if self.rate > 0 else (0.0 if short <= 0 else float("inf"))
+
+    def take(self, n: float):
+        # May go negative: an overdraft (or a usage correction) is paid back by refill.
+        self._refill()
+        self.level -= n
+
+    def drain(self, seconds: float):
+        self._refill()
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class Ticket:
+    __slots__ = ("session", "tokens", "priority", "enqueued", "admitted", "state")
+
+    def __init__(self, session: str, tokens: int, priority: int, now: float):
+        self.session = session
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued = now
+        self.admitted = None
+        self.state = "queued"  # queued -> running -> done | cancelled
+
+
+class FairScheduler:
+    def __init__(self, rpm: float = 500, tpm: float = 200_000, max_concurrency: int = 32,
+                 clock=time.monotonic, wait_window: int = 500):
+        self.clock = clock
+        self.requests = TokenBucket(rpm, clock=clock)
+        self.tokens = TokenBucket(tpm, clock=clock)
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        # priority -> OrderedDict(session -> deque[Ticket]); dict order is the round-robin
+        self._queues = {PRIORITY_HIGH: OrderedDict(), PRIORITY_NORMAL: OrderedDict()}
+        self._lock = threading.Lock()
+        self.waits = deque(maxlen=wait_window)  # (priority, seconds queued) of recent admissions
+        self.admitted = 0
+        self.withdrawn = 0  # tickets cancelled while still queued
+        self.throttled = 0  # provider 429s reported
+
+    def enqueue(self, session: str, tokens: int, priority: int = PRIORITY_NORMAL) -> Ticket:
+        with self._lock:
+            ticket = Ticket(session, tokens, priority, self.clock())
+            self._queues[priority].setdefault(session, deque()).append(ticket)
+            return ticket
+
+    def admit(self) -> list[Ticket]:
+        # Tickets that may start now, in fair order. Strict head-of-line: if
+        # the next ticket in turn doesn't fit the buckets, nothing behind it
+        # jumps ahead (that would starve large prompts).
+        out = []
+        with self._lock:
+            while self.running < self.max_concurrency:
+                ticket = self._next()
+                if ticket is None:
+                    break
+                if self.requests.wait_s(1) > 0 or self.tokens.wait_s(ticket.tokens) > 0:
+                    break
+                self._pop(ticket, rotate=True)
+                self.requests.take(1)
+                self.tokens.take(ticket.tokens)
+                self.running += 1
+                self.admitted += 1
+                ticket.admitted = self.clock()
+                ticket.state = "running"
+                self.waits.append((ticket.priority, ticket.admitted - ticket.enqueued))
+                out.append(ticket)
+        return out
+
+    def next_wakeup(self) -> float | None:
+        # Seconds until admit() could make progress on its own (buckets
+        # refilling); None if nothing is queued or only a release can help.
+        with self._lock:
+            ticket = self._next()
+            if ticket is None or self.running >= self.max_concurrency:
+                return None
+            return max(self.requests.wait_s(1), self.tokens.wait_s(ticket.tokens))
+
+    def release(self, ticket: Ticket, used_tokens: int | None = None):
+        # Call ends (any outcome). used_tokens corrects the estimate.
+        with self._lock:
+            if ticket.state != "running":
+                return
+            ticket.state = "done"
+            self.running -= 1
+            if used_tokens is not None:
+                self.tokens.take(used_tokens - ticket.tokens)
+
+    def cancel(self, ticket: Ticket):
+        with self._lock:
+            if ticket.state == "queued":
+                self._pop(ticket)
+                ticket.state = "cancelled"
+                self.withdrawn += 1
+        if ticket.state == "running":
+            self.release(ticket)
+
+    def throttle(self, retry_after_s: float):
+        # Provider said 429: nobody starts a call for retry_after_s.
+        with self._lock:
+            self.requests.drain(retry_after_s)
+            self.throttled += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth = {p: sum(len(q) for q in qs.values()) for p, qs in self._queues.items()}
+            waits = {p: sorted(w for q, w in self.waits if q == p) for p in self._queues}
+            return {
+                "queued": depth[PRIORITY_HIGH] + depth[PRIORITY_NORMAL],
+                "queued_alert": depth[PRIORITY_HIGH],
+                "sessions_waiting": sum(len(qs) for qs in self._queues.values()),
+                "running": self.running,
+                "admitted": self.admitted,
+                "withdrawn": self.withdrawn,
+                "throttled": self.throttled,
+                "wait_p50_s": _pct(sorted(waits[PRIORITY_NORMAL] + waits[PRIORITY_HIGH]), 0.5),
+                "wait_p95_s": _pct(sorted(waits[PRIORITY_NORMAL] + waits[PRIORITY_HIGH]), 0.95),
+                "wait_p95_alert_s": _pct(waits[PRIORITY_HIGH], 0.95),
+                "requests_available": self.requests.level,
+                "tokens_available": self.tokens.level,
+            }
+
+    def _next(self) -> Ticket | None:
+        for queues in self._queues.values():  # PRIORITY_HIGH first
+            for q in queues.values():  # oldest turn first
+                return q[0]
+        return None
+
+    def _pop(self, ticket: Ticket, rotate: bool = False):
+        queues = self._queues[ticket.priority]
+        q = queues[ticket.session]
+        q.remove(ticket)
+        # Round-robin: the session goes to the back of its class after each
+        # admission, and leaves the rotation when it has nothing queued.
+        if not q:
+            del queues[ticket.session]
+        elif rotate:
+            queues.move_to_end(ticket.session)
+
+
+def _pct(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
@@ -0,0 +1,169 @@
+# simulation.py — time-driven ship simulation
+# The ship keeps flying between messages: fuel burns, comms come back one
+# step at a time, the alert stands down after a quiet spell, and ambient
+# events arrive on a clock. Nothing sleeps or polls. Pending work sits in a
+# heap of timers, and advance(ship, now) catches up lazily on each rerun.
+# That costs O(timers due + log n), so an idle hour is a handful of heap
+# pops and a rerun with nothing due is one comparison.
+#
+# Ship events are declarative (SHIP_EVENTS); each is a dict:
+#   name      unique
+#   weight    relative odds of being picked (default 1)
+#   message   chat bubble text
+#   log       events-log line; {alert}, {comms}, {fuel} read the ship after the event
+#   alert     raise the alert to at least this level
+#   red_chance  odds of going straight to RED instead
+#   comms     "degrade" (ONLINE -> DEGRADED) or "drop" (-> OFFLINE; already OFFLINE -> DEGRADED)
+#   fuel      (lo, hi): burn a random whole percentage in this range
+#
+# Every draw comes from the rng handed in and every time from the caller,
+# so a seed plus a list of (time, action) replays a voyage exactly:
+#   sim = Simulation(random.Random(7), now=0.0, events_per_h=6)
+#   fired = sim.advance(ship, 30 * 86400.0)   # a month of flight, computed in milliseconds
+
+import heapq
+import os
+import random
+from bisect import bisect
+from itertools import accumulate
+
+ALERT_LEVELS = ("GREEN", "AMBER", "RED")
+COMMS_LEVELS = ("OFFLINE", "DEGRADED", "ONLINE")
+
+START_SHIP = {"alert": "GREEN", "sector": "Orion Drift", "fuel": 92, "comms": "ONLINE"}
+
+FUEL_BURN_PER_H = 2.0  # cruise burn, % of tank per hour
+COMMS_RECOVERY_S = (90.0, 240.0)  # per step back towards ONLINE
+ALERT_STAND_DOWN_S = 600.0  # quiet time before the alert drops one level
+AMBIENT_EVENTS_PER_H = float(os.getenv("COSMOBOT_SIM_EVENTS_PER_H", "2"))  # 0: only messages trigger events
+
+SHIP_EVENTS = [
+    {"name": "SOLAR_FLARE", "alert": "AMBER", "comms": "degrade", "fuel": (0, 2),
+     "message": "🌞 **Solar flare** detected. Radiation levels elevated. Switching sensors to hardened mode; comms may degrade.",
+     "log": "Solar flare detected; comms degraded; alert AMBER."},
+    {"name": "DEBRIS_FIELD", "alert": "AMBER", "fuel": (1, 4),
+     "message": "🛰️ **Debris field** ahead. Running evasive nav burn and tightening collision envelope.",
+     "log": "Debris field encountered; evasive burn executed."},
+    {"name": "COMMS_DROP", "comms": "drop", "alert": "AMBER",
+     "message": "📡 **Comms anomaly.** Signal lock lost. Attempting reacquisition via backup antenna array.",
+     "log": "Comms anomaly: {comms}."},
+    {"name": "MICROMETEOROIDS", "red_chance": 0.25, "alert": "AMBER", "fuel": (0, 3),
+     "message": "☄️ **Micro-meteoroid ping** on outer hull. Sealing microfractures; running structural integrity scan.",
+     "log": "Micro-meteoroid impact; alert now {alert}."},
+    {"name": "ION_DISTURBANCE", "comms": "degrade",
+     "message": "🧲 **Ion disturbance** in local space-time. Navigation filters retuned; expect minor sensor jitter.",
+     "log": "Ion disturbance; nav filters retuned."},
+]
+
+# Timer kinds
+AMBIENT, COMMS, ALERT = "ambient", "comms", "alert"
+
+
+def apply_event(ship: dict, event: dict, rng=random):
+    # One event's effects on the ship, in the order the old hand-written
+    # branches drew them.
+    if "red_chance" in event and rng.random() < event["red_chance"]:
+        ship["alert"] = "RED"
+    elif "alert" in event and ALERT_LEVELS.index(ship["alert"]) < ALERT_LEVELS.index(event["alert"]):
+        ship["alert"] = event["alert"]
+    comms = event.get("comms")
+    if comms == "degrade" and ship["comms"] == "ONLINE":
+        ship["comms"] = "DEGRADED"
+    elif comms == "drop":
+        ship["comms"] = "OFFLINE" if ship["comms"] != "OFFLINE" else "DEGRADED"
+    if "fuel" in event:
+        ship["fuel"] = max(0, ship["fuel"] - rng.randint(*event["fuel"]))
+
+
+class Simulation:
+    # Clock state for one ship. The ship dict itself is passed in on every
+    # call (the Session may swap it, the sidebar may edit it), so manual
+    # changes are picked up too: an alert set to RED by hand stands down
+    # like any other.
+    def __init__(self, rng: random.Random, now: float, events_per_h: float = AMBIENT_EVENTS_PER_H,
+                 events: list | None = None):
+        self.rng = rng
+        self.now = now
+        self.events = events or SHIP_EVENTS
+        self._cum_weights = list(accumulate(e.get("weight", 1) for e in self.events))
+        self.events_per_h = events_per_h
+        self.ambient_on = True  # the owner's switch (Session: event rate above 0)
+        self.fuel_debt = 0.0  # burn not yet taken off the whole-percent gauge
+        self.calm_until = now  # alert stand-down is pushed back by every hazard
+        self.timers = []  # heap of (due, seq, kind)
+        self.armed = set()  # kinds with a timer in the heap
+        self.seq = 0
+        self.fired = 0  # timers processed, for benchmarks
+        if events_per_h > 0:
+            self._schedule(AMBIENT, now + self._ambient_gap())
+
+    def _schedule(self, kind: str, due: float):
+        self.seq += 1
+        heapq.heappush(self.timers, (due, self.seq, kind))
+        self.armed.add(kind)
+
+    def _ambient_gap(self) -> float:
+        return self.rng.expovariate(self.events_per_h / 3600.0)
+
+    def _burn(self, ship: dict, t: float):
+        if t > self.now:
+            self.fuel_debt += FUEL_BURN_PER_H * (t - self.now) / 3600.0
+            self.now = t
+        if self.fuel_debt >= 1.0:
+            whole = int(self.fuel_debt)
+            self.fuel_debt -= whole
+            ship["fuel"] = max(0, int(ship["fuel"]) - whole)
+
+    def _arm(self, ship: dict):
+        # Recovery timers exist exactly while there is something to recover,
+        # and the ambient timer while ambient events are on.
+        if ship["comms"] != "ONLINE" and COMMS not in self.armed:
+            self._schedule(COMMS, self.now + self.rng.uniform(*COMMS_RECOVERY_S))
+        if ship["alert"] != "GREEN" and ALERT not in self.armed:
+            if self.calm_until <= self.now:
+                self.calm_until = self.now + ALERT_STAND_DOWN_S  # raised by hand: quiet spell starts now
+            self._schedule(ALERT, self.calm_until)
+        if self.ambient_on and self.events_per_h > 0 and AMBIENT not in self.armed:
+            self._schedule(AMBIENT, self.now + self._ambient_gap())
+
+    def pick(self) -> dict:
+        return self.events[bisect(self._cum_weights, self.rng.random() * self._cum_weights[-1])]
+
+    def trigger(self, ship: dict, event: dict | None = None) -> dict:
+        # An event now (a message rolled one, /event, or an ambient timer).
+        event = event or self.pick()
+        apply_event(ship, event, self.rng)
+        if "alert" in event or "red_chance" in event:
+            self.calm_until = self.now + ALERT_STAND_DOWN_S
+        self._arm(ship)
+        return event
+
+    def advance(self, ship: dict, now: float) -> list[tuple[float, dict]]:
+        # Runs every timer due by `now`, in time order; returns the ambient
+        # events that fired as (time, event) for the caller to log.
+        fired = []
+        self._arm(ship)
+        timers = self.timers
+        while timers and timers[0][0] <= now:
+            due, _, kind = heapq.heappop(timers)
+            self.armed.discard(kind)
+            self.fired += 1
+            self._burn(ship, due)
+            if kind == AMBIENT:
+                if not self.ambient_on:
+                    continue  # switched off: _arm schedules afresh once back on
+                fired.append((due, self.trigger(ship)))  # trigger re-arms the next one
+                continue
+            elif kind == COMMS:
+                level = COMMS_LEVELS.index(ship["comms"])
+                ship["comms"] = COMMS_LEVELS[min(level + 1, len(COMMS_LEVELS) - 1)]
+            elif kind == ALERT:
+                if due < self.calm_until:
+                    self._schedule(ALERT, self.calm_until)  # a newer hazard pushed it back
+                    continue
+                level = ALERT_LEVELS.index(ship["alert"])
+                ship["alert"] = ALERT_LEVELS[max(level - 1, 0)]
+                self.calm_until = due + ALERT_STAND_DOWN_S
+            self._arm(ship)
+        self._burn(ship, now)
+        return fired
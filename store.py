@@ -0,0 +1,189 @@
+# store.py — persistent session store (SQLite, WAL mode)
+# Every history message, ship event, crew-log exchange and settings change is
+# appended as one row; a session is rebuilt by replaying its rows in order,
+# lazily, the first time a reconnecting browser asks for it (?sid=...).
+#
+# Writes are buffered and committed in batches; durability is a knob:
+#   COSMOBOT_STORE_PATH      sqlite file (default: empty = persistence off)
+#   COSMOBOT_STORE_BATCH     rows per commit (default 8; 1 = commit every write)
+#   COSMOBOT_STORE_FLUSH_S   max age of buffered rows (default 1.0; a background
+#                            flusher commits them, so an idle session's last turns
+#                            survive a pod kill; 0: flush on batch size only)
+#   COSMOBOT_STORE_SYNC      PRAGMA synchronous: OFF | NORMAL | FULL (default NORMAL;
+#                            in WAL mode NORMAL fsyncs at checkpoints, FULL on every commit)
+
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+    sid  TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    ts   REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_sid ON records (sid, seq);
+"""
+
+SID_RE = re.compile(r"[0-9a-f]{32}")  # uuid4().hex, as the app mints them
+
+
+def valid_sid(sid) -> bool:
+    # Only ids the app minted become store keys: anything else from a URL is
+    # refused, not stored (and later turned into export file names).
+    return isinstance(sid, str) and SID_RE.fullmatch(sid) is not None
+
+
+# Replay bounds, mirroring what the live session keeps.
+HISTORY_KEEP = 120
+EVENTS_KEEP = 40
+
+
+class SessionStore:
+    def __init__(self, path: str, batch_size: int = 8, flush_interval_s: float = 1.0, synchronous: str = "NORMAL"):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()
+        self._pending = []
+        self._oldest_pending = 0.0
+        self.writes = 0
+        self.commits = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={synchronous}")
+        self._db.executescript(SCHEMA)
+        self._closed = threading.Event()
+        if flush_interval_s > 0:
+            threading.Thread(target=self._flush_loop, name="store-flush", daemon=True).start()
+        atexit.register(self.close)
+
+    def append(self, sid: str, kind: str, data: dict):
+        row = (sid, kind, time.time(), json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+        with self._lock:
+            if not self._pending:
+                self._oldest_pending = time.monotonic()
+            self._pending.append(row)
+            self.writes += 1
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._oldest_pending >= self.flush_interval_s:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_loop(self):
+        # append() only sees a row's age when the next row arrives; this
+        # catches the rows nothing follows. Ticks at half the interval, so a
+        # row waits at most ~1.5x flush_interval_s.
+        while not self._closed.wait(self.flush_interval_s / 2):
+            with self._lock:
+                if (not self._closed.is_set() and self._pending
+                        and time.monotonic() - self._oldest_pending >= self.flush_interval_s):
+                    self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        self._db.execute("BEGIN")
+        self._db.executemany("INSERT INTO records (sid, kind, ts, data) VALUES (?, ?, ?, ?)", self._pending)
+        self._db.execute("COMMIT")
+        self._pending.clear()
+        self.commits += 1
+
+    def load(self, sid: str) -> dict | None:
+        # Replays one session; None if the store has never seen it.
+        with self._lock:
+            self._flush_locked()
+            rows = self._db.execute(
+                "SELECT kind, data FROM records WHERE sid = ? ORDER BY seq", (sid,)
+            ).fetchall()
+        if not rows:
+            return None
+
+        session = {"history": [], "events": [], "exchanges": [], "settings": {}, "last_event": ""}
+        for kind, data in rows:
+            data = json.loads(data)
+            if kind == "history":
+                session["history"].append(data)
+                if len(session["history"]) > 2 * HISTORY_KEEP:
+                    session["history"] = session["history"][-HISTORY_KEEP:]
+            elif kind == "event":
+                session["events"].append(data)
+                session["last_event"] = data["text"]
+                if len(session["events"]) > 2 * EVENTS_KEEP:
+                    session["events"] = session["events"][-EVENTS_KEEP:]
+            elif kind == "exchange":
+                session["exchanges"].append(data)
+            elif kind == "settings":
+                session["settings"].update(data)
+            elif kind == "clear":
+                if data["what"] == "history":
+                    session["history"] = []
+                    session["last_event"] = ""
+                elif data["what"] == "crew":
+                    session["exchanges"] = []
+        session["history"] = session["history"][-HISTORY_KEEP:]
+        session["events"] = session["events"][-EVENTS_KEEP:]
+        return session
+
+    def close(self):
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            self._flush_locked()
+            self._db.close()
+
+
+# Bulk readers (export.py) use their own read-only connection: in WAL mode
+# they see committed rows without blocking the app's writer, and rows are
+# streamed off the cursor instead of fetched into a list.
+def _reader(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def session_ids(path: str) -> list[str]:
+    db = _reader(path)
+    try:
+        return [sid for (sid,) in db.execute("SELECT DISTINCT sid FROM records ORDER BY sid")]
+    finally:
+        db.close()
+
+
+def iter_records(path: str, sid: str):
+    # Yields (kind, ts, data_json) for one session, oldest first.
+    db = _reader(path)
+    try:
+        yield from db.execute("SELECT kind, ts, data FROM records WHERE sid = ? ORDER BY seq", (sid,))
+    finally:
+        db.close()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> SessionStore | None:
+    # Process-wide, shared by every session; None when persistence is off.
+    global _STORE
+    path = os.getenv("COSMOBOT_STORE_PATH", "").strip()
+    if not path:
+        return None
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = SessionStore(
+                    path,
+                    batch_size=int(os.getenv("COSMOBOT_STORE_BATCH", "8")),
+                    flush_interval_s=float(os.getenv("COSMOBOT_STORE_FLUSH_S", "1.0")),
+                    synchronous=os.getenv("COSMOBOT_STORE_SYNC", "NORMAL").upper(),
+                )
+    return _STORE
@@ -0,0 +1,273 @@
+# voyage.py — Monte Carlo voyages for tuning the event rate
+# Runs the ship event model (simulation.SHIP_EVENTS, the per-message roll in
+# Session.maybe_trigger_event, and simulation.py's fuel burn, comms recovery,
+# alert stand-down and ambient events between messages) over many simulated
+# sessions at once. The sessions are rows of NumPy arrays; the only Python
+# loop is over message numbers. It reports how a given event rate shapes
+# alert levels, fuel and comms outages over a session.
+#
+#   python voyage.py --rate 0.18 [--messages 200] [--sessions 1000000] [--gap-s 60] [--seed 0]
+#
+# The sidebar "Event rate" expander shows forecast_markdown() for the
+# slider's value (memoised per rate).
+#
+# Same model, different draws: simulation.py rolls its rng only for what
+# happens, this rolls a fixed set of uniforms per message for every row, so
+# the two agree in distribution, not sample by sample
+# (benchmarks/bench_voyage.py checks this). Two simplifications: at most one
+# ambient event between two messages, and timers due in the same gap run
+# before the message's own roll.
+
+import argparse
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from simulation import (
+    ALERT_LEVELS, ALERT_STAND_DOWN_S, AMBIENT_EVENTS_PER_H, COMMS_LEVELS, COMMS_RECOVERY_S,
+    FUEL_BURN_PER_H, SHIP_EVENTS, START_SHIP, apply_event,
+)
+
+CHUNK = 250_000  # rows per pass: bounds memory, keeps arrays cache-friendly
+UI_SESSIONS = 100_000
+UI_MESSAGES = 200
+UI_GAP_S = 60.0
+
+U16 = 1 << 16  # uniforms are 16-bit integers: chances resolve to 1/65536
+
+N_ALERTS = len(ALERT_LEVELS)
+GREEN, RED = ALERT_LEVELS.index("GREEN"), ALERT_LEVELS.index("RED")
+OFFLINE, ONLINE = COMMS_LEVELS.index("OFFLINE"), COMMS_LEVELS.index("ONLINE")
+
+
+class _Decided:
+    # Stands in for the rng in simulation.apply_event to tabulate one
+    # outcome: red roll won or lost, fuel left to the caller.
+    def __init__(self, red: bool):
+        self.red = red
+
+    def random(self) -> float:
+        return 0.0 if self.red else 1.0
+
+    def randint(self, lo: int, hi: int) -> int:
+        return 0
+
+
+def _state(alert: str, comms: str) -> int:
+    # comms-major, so "offline" and "online" are range checks (COMMS_LEVELS
+    # runs OFFLINE -> ONLINE)
+    return COMMS_LEVELS.index(comms) * N_ALERTS + ALERT_LEVELS.index(alert)
+
+
+def _outcome_table(shares: np.ndarray, p_hit: int, dt) -> np.ndarray:
+    # 16-bit uniform -> outcome: the first p_hit slots are cut by share, the
+    # rest are "no event".
+    edges = np.round(np.cumsum(shares) / shares.sum() * p_hit).astype(int)
+    table = np.full(U16, len(shares) - 1, dt)
+    table[:p_hit] = np.searchsorted(edges, np.arange(p_hit), side="right")
+    return table
+
+
+def _effect_tables(events: list) -> dict:
+    # The ship is one small int per session (_state), and a message is two
+    # table lookups: a 16-bit uniform -> outcome (event kind and, for events
+    # with a red_chance, whether it went RED; the last outcome is "no
+    # event"), then (outcome, state) -> next state. The transitions come
+    # from simulation.apply_event itself, so the two models cannot drift
+    # apart. Events that touch the alert come first, so "did this restart
+    # the stand-down clock" is one comparison.
+    events = sorted(events, key=lambda e: "alert" not in e and "red_chance" not in e)
+    weights = [e.get("weight", 1) for e in events]
+    if any(w != int(w) for w in weights):
+        raise ValueError("voyage.py needs whole-number event weights")
+    n_states = N_ALERTS * len(COMMS_LEVELS)
+    outcomes = [(e, red) for e in events for red in (False, True)] + [({}, False)]
+    dt = np.int8 if len(outcomes) * n_states <= 127 else np.int16
+
+    # Odds of each outcome given that an event happens.
+    shares = np.array([w * (e.get("red_chance", 0.0) if red else 1 - e.get("red_chance", 0.0))
+                       for (e, red), w in zip(outcomes, [*np.repeat(weights, 2), 0])], float)
+
+    trans = np.zeros(len(outcomes) * n_states, dt)
+    for i, (event, red) in enumerate(outcomes):
+        for alert in ALERT_LEVELS:
+            for comms in COMMS_LEVELS:
+                ship = {"alert": alert, "comms": comms, "fuel": 0}
+                apply_event(ship, event, _Decided(red))
+                trans[i * n_states + _state(alert, comms)] = _state(ship["alert"], ship["comms"])
+    return {
+        "shares": shares, "trans": trans, "dtype": dt, "n_states": n_states, "events": events,
+        "hazards": dt(2 * sum("alert" in e or "red_chance" in e for e in events)),
+        "red": np.arange(n_states) % N_ALERTS == RED,
+    }
+
+
+def _run_chunk(rng, n: int, rate: float, messages: int, gap_s: float, events_per_h: float,
+               start: dict, events: list) -> dict:
+    fx = _effect_tables(events)
+    dt, n_states, events = fx["dtype"], fx["n_states"], fx["events"]
+    message_outcome = _outcome_table(fx["shares"], round(rate * U16), dt)
+    # At most one ambient event per gap (two in a minute at a few per hour
+    # is a rounding error), applied just before the message.
+    p_ambient = round(-np.expm1(-events_per_h * gap_s / 3600.0) * U16)
+    ambient_outcome = _outcome_table(fx["shares"], p_ambient, dt)
+    offline_below, online_from = dt((OFFLINE + 1) * N_ALERTS), dt(ONLINE * N_ALERTS)
+    state = np.full(n, _state(start["alert"], start["comms"]), dt)
+    counts = np.zeros((len(events), n), np.int16)  # events per kind, for the fuel they burn
+    comms_due = np.full(n, np.inf, np.float32)  # next recovery step, as in Simulation's timer heap
+    calm_until = np.full(n, np.inf, np.float32)  # next stand-down; inf while GREEN
+    red_msgs = np.zeros(n, np.int16)
+    offline_msgs = np.zeros(n, np.int16)
+    outages = np.zeros(n, np.int16)
+    ever_red = np.take(fx["red"], state)
+
+    lo, hi = COMMS_RECOVERY_S
+    stand_down = np.float32(ALERT_STAND_DOWN_S)
+
+    def delays(k: int):
+        return rng.uniform(lo, hi, k).astype(np.float32)
+
+    def run_timers(now):
+        # Timers due by `now`, applied to just the rows they concern. A
+        # chain is at most two steps long.
+        for _ in range(2):
+            due = np.flatnonzero(comms_due <= now)
+            if len(due):
+                state[due] += N_ALERTS  # comms one level up
+                comms_due[due] = np.where(state[due] >= online_from, np.inf, comms_due[due] + delays(len(due)))
+            due = np.flatnonzero(calm_until <= now)
+            if len(due):
+                alerted = state[due] % N_ALERTS > GREEN  # a red_chance event can leave it GREEN
+                state[due] -= alerted  # alert one level down
+                calm_until[due] = np.where(alerted & (state[due] % N_ALERTS > GREEN), calm_until[due] + stand_down, np.inf)
+
+    for i in range(messages):
+        t = np.float32(i * gap_s)
+        was_offline = state < offline_below
+        if p_ambient and i:
+            # Ambient events land mid-gap, between the timers due before
+            # and after them.
+            mid = t - np.float32(gap_s / 2)
+            run_timers(mid)
+            u = rng.bit_generator.random_raw(-(-n // 4)).view(np.uint16)[:n]
+            rows = np.flatnonzero(u < p_ambient)
+            outcome = np.take(ambient_outcome, u[rows])
+            state[rows] = np.take(fx["trans"], outcome * dt(n_states) + state[rows])
+            calm_until[rows] = np.where(outcome < fx["hazards"], mid + stand_down, calm_until[rows])
+            for k in range(len(events)):
+                counts[k, rows] += (outcome >> 1) == k
+            idle = rows[(state[rows] < online_from) & np.isinf(comms_due[rows])]
+            comms_due[idle] = mid + delays(len(idle))
+        if gap_s:
+            run_timers(t)
+
+        u = rng.bit_generator.random_raw(-(-n // 4)).view(np.uint16)[:n]  # raw bits: half the cost of integers()
+        outcome = np.take(message_outcome, u)
+        state = np.take(fx["trans"], outcome * dt(n_states) + state)
+        calm_until = np.where(outcome < fx["hazards"], t + stand_down, calm_until)
+        kind = outcome >> 1
+        for k in range(len(events)):
+            counts[k] += kind == k
+        if gap_s:
+            idle = np.flatnonzero((state < online_from) & np.isinf(comms_due))
+            comms_due[idle] = t + delays(len(idle))
+
+        offline = state < offline_below
+        at_red = np.take(fx["red"], state)
+        ever_red |= at_red
+        red_msgs += at_red
+        offline_msgs += offline
+        outages += offline & ~was_offline
+
+    # Fuel: the sum of each session's event draws, sampled once at the end
+    # (clamping at zero along the way gives the same final gauge).
+    burned = np.zeros(n, np.int32)
+    for k, event in enumerate(events):
+        if "fuel" in event:
+            f_lo, f_hi = event["fuel"]
+            span = f_hi - f_lo + 1
+            draws = rng.multinomial(counts[k], [1 / span] * span)
+            burned += f_lo * counts[k] + draws @ np.arange(span)
+    cruise = int(FUEL_BURN_PER_H * (messages - 1) * gap_s / 3600.0)
+    fuel = np.maximum(0, start["fuel"] - cruise - burned)
+    return {"alert": state % N_ALERTS, "ever_red": ever_red, "red_msgs": red_msgs, "fuel": fuel,
+            "offline_msgs": offline_msgs, "outages": outages}
+
+
+def simulate(rate: float, messages: int = 200, sessions: int = 1_000_000, gap_s: float = UI_GAP_S,
+             events_per_h: float = AMBIENT_EVENTS_PER_H, seed: int = 0,
+             start: dict | None = None, events: list | None = None) -> dict:
+    # Per-session outcomes over all rows: {metric: array}.
+    rng = np.random.default_rng(seed)
+    parts = [
+        _run_chunk(rng, min(CHUNK, sessions - done), rate, messages, gap_s, events_per_h,
+                   start or START_SHIP, events or SHIP_EVENTS)
+        for done in range(0, sessions, CHUNK)
+    ]
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def summarize(out: dict) -> dict:
+    n = len(out["alert"])
+    p5, p50, p95 = np.percentile(out["fuel"], (5, 50, 95))
+    return {
+        "sessions": n,
+        "final_alert": {a: float(np.mean(out["alert"] == i)) for i, a in enumerate(ALERT_LEVELS)},
+        "ever_red": float(out["ever_red"].mean()),
+        "red_msgs_mean": float(out["red_msgs"].mean()),
+        "fuel_p5": float(p5), "fuel_p50": float(p50), "fuel_p95": float(p95),
+        "fuel_empty": float(np.mean(out["fuel"] == 0)),
+        "fuel_below_25": float(np.mean(out["fuel"] < 25)),
+        "outage_any": float(np.mean(out["outages"] > 0)),
+        "outages_mean": float(out["outages"].mean()),
+        "offline_msgs_p95": float(np.percentile(out["offline_msgs"], 95)),
+    }
+
+
+def report_lines(s: dict, rate: float, messages: int, gap_s: float, events_per_h: float) -> list[str]:
+    alert = " · ".join(f"{a} {p:.1%}" for a, p in s["final_alert"].items())
+    clock = (f"{gap_s:g} s between messages, {events_per_h:g} ambient events/h" if gap_s
+             else "no time between messages")
+    return [
+        f"**{s['sessions']:,} fresh ships × {messages} messages at {rate:.0%} per message** ({clock})",
+        f"- Alert at the end: {alert}",
+        f"- Reached RED: {s['ever_red']:.1%} of sessions (mean {s['red_msgs_mean']:.1f} messages at RED)",
+        f"- Fuel left: p5 {s['fuel_p5']:.0f}% · p50 {s['fuel_p50']:.0f}% · p95 {s['fuel_p95']:.0f}% "
+        f"(empty {s['fuel_empty']:.1%}, under 25% {s['fuel_below_25']:.1%})",
+        f"- Comms outages: {s['outage_any']:.1%} of sessions lose comms "
+        f"(mean {s['outages_mean']:.2f} outages; p95 {s['offline_msgs_p95']:.0f} messages offline)",
+    ]
+
+
+@lru_cache(maxsize=64)
+def forecast_markdown(rate: float, messages: int = UI_MESSAGES, gap_s: float = UI_GAP_S) -> str:
+    events_per_h = AMBIENT_EVENTS_PER_H if rate > 0 else 0.0  # as engine.Session: 0 stops every event
+    summary = summarize(simulate(rate, messages, UI_SESSIONS, gap_s, events_per_h))
+    return "  \n".join(report_lines(summary, rate, messages, gap_s, events_per_h))
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main():
+    p = argparse.ArgumentParser(description="Monte Carlo ship voyages for a given event rate.")
+    p.add_argument("--rate", type=float, action="append", help="event chance per message (repeatable; default 0.18)")
+    p.add_argument("--messages", type=int, default=200, help="messages per session")
+    p.add_argument("--sessions", type=int, default=1_000_000)
+    p.add_argument("--gap-s", type=float, default=UI_GAP_S, help="seconds between messages (0: events only)")
+    p.add_argument("--events-per-h", type=float, default=AMBIENT_EVENTS_PER_H, help="ambient events between messages")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    for rate in args.rate or [0.18]:
+        t0 = time.perf_counter()
+        out = simulate(rate, args.messages, args.sessions, args.gap_s, args.events_per_h, args.seed)
+        elapsed = time.perf_counter() - t0
+        lines = report_lines(summarize(out), rate, args.messages, args.gap_s, args.events_per_h)
+        print("\n".join(lines).replace("**", ""))
+        print(f"  ({elapsed:.2f}s)\n")
+
+
+if __name__ == "__main__":
+    main()